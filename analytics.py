@@ -0,0 +1,302 @@
+import argparse
+import os
+import time
+import warnings
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from consolidate import _read_frame, ticks_between_array
+from orderbook_summary import ASK_SIDES, TICK_BANDS, TOP_N_IMBALANCE
+
+SOURCES = ("ajaib", "ipot")
+DEFAULT_BUCKET = 900  # seconds per time slot, one scrape cycle
+DEFAULT_LEVELS = 10
+DEFAULT_IMPACT_LOTS = (100, 1000, 10000)
+SHARES_PER_LOT = 100
+BID, ASK = 0, 1
+
+
+# ============================================================
+# DENSE BOOK CUBE
+# ============================================================
+class BookCube:
+    """Orderbooks of one day as dense arrays.
+
+    price/lot have shape (2, tickers, slots, levels): side (BID/ASK) x
+    ticker x time slot x level, best level first, NaN where a level, slot
+    or ticker has no data. Each slot holds the last snapshot taken in it.
+    """
+
+    def __init__(self, kodes, slots, price, lot):
+        self.kodes = kodes
+        self.slots = slots
+        self.price = price
+        self.lot = lot
+
+    @property
+    def shape(self):
+        return self.price.shape[1:]
+
+    @classmethod
+    def from_levels(cls, levels, day, bucket=DEFAULT_BUCKET, max_levels=DEFAULT_LEVELS):
+        """Raw (kode, side, price, lot, timestamp) rows -> cube, without a per-row Python loop"""
+        df = levels[["kode", "side", "price", "lot", "timestamp"]].copy()
+        df["price"] = pd.to_numeric(df["price"], errors="coerce")
+        df["lot"] = pd.to_numeric(df["lot"], errors="coerce")
+        df = df.dropna(subset=["price", "timestamp"])
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        df["side"] = np.where(df["side"].isin(ASK_SIDES), ASK, np.where(df["side"] == "B", BID, -1))
+        df = df[df["side"] >= 0]
+
+        day_start = pd.Timestamp(datetime.combine(day, datetime.min.time()))
+        df["slot"] = ((df["timestamp"] - day_start).dt.total_seconds() // bucket).astype("int64")
+        # Keep only the last snapshot of each ticker inside a slot
+        last = df.groupby(["kode", "slot"])["timestamp"].transform("max")
+        df = df[df["timestamp"] == last]
+
+        # Level rank: bids by descending price, asks by ascending price
+        df["order"] = np.where(df["side"] == BID, -df["price"], df["price"])
+        df = df.sort_values(["kode", "slot", "side", "order"], kind="mergesort")
+        df["level"] = df.groupby(["kode", "slot", "side"]).cumcount()
+        df = df[df["level"] < max_levels]
+
+        k_idx, kodes = pd.factorize(df["kode"], sort=True)
+        s_idx, slots = pd.factorize(df["slot"], sort=True)
+        shape = (2, len(kodes), len(slots), max_levels)
+        price = np.full(shape, np.nan)
+        lot = np.full(shape, np.nan)
+        index = (df["side"].to_numpy(), k_idx, s_idx, df["level"].to_numpy())
+        price[index] = df["price"].to_numpy(dtype="float64")
+        lot[index] = df["lot"].to_numpy(dtype="float64")
+        slot_times = day_start + pd.to_timedelta(np.asarray(slots) * bucket, unit="s")
+        return cls(np.asarray(kodes), slot_times, price, lot)
+
+
+# ============================================================
+# METRICS (all vectorized over tickers x slots)
+# ============================================================
+def cumulative_depth(cube):
+    """Cumulative lots from the touch outwards, (2, tickers, slots, levels); NaN beyond the book"""
+    depth = np.nancumsum(cube.lot, axis=-1)
+    return np.where(np.isnan(cube.price), np.nan, depth)
+
+
+def best_prices(cube):
+    return cube.price[BID, :, :, 0], cube.price[ASK, :, :, 0]
+
+
+def book_weighted_mid(cube, levels=TOP_N_IMBALANCE):
+    """Mid weighted by resting size: leans towards the side with less depth in the top `levels`.
+
+    levels=1 is the classic microprice from the touch sizes.
+    """
+    bid, ask = best_prices(cube)
+    bid_depth = np.nansum(cube.lot[BID, :, :, :levels], axis=-1)
+    ask_depth = np.nansum(cube.lot[ASK, :, :, :levels], axis=-1)
+    total = bid_depth + ask_depth
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, (bid * ask_depth + ask * bid_depth) / total, np.nan)
+
+
+def price_impact(cube, lots, depth=None):
+    """Cost of a `lots`-sized market order walking the book, in bps from mid.
+
+    Returns (buy_bps, sell_bps), each (tickers, slots). NaN where the book
+    does not hold `lots` within the loaded levels.
+    """
+    depth = cumulative_depth(cube) if depth is None else depth
+    bid, ask = best_prices(cube)
+    mid = (bid + ask) / 2
+    out = []
+    for side, sign in ((ASK, 1), (BID, -1)):
+        price = cube.price[side]
+        level_lot = np.nan_to_num(cube.lot[side])
+        before = np.nan_to_num(depth[side]) - level_lot
+        filled = np.clip(lots - before, 0, level_lot)
+        fillable = np.nansum(filled, axis=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            vwap = np.nansum(filled * np.nan_to_num(price), axis=-1) / fillable
+            bps = sign * (vwap - mid) / mid * 1e4
+        out.append(np.where(fillable >= lots, bps, np.nan))
+    return out[0], out[1]
+
+
+def slot_metrics(cube, impact_lots=DEFAULT_IMPACT_LOTS):
+    """Long frame: one row per (kode, slot) with mid, weighted mids, spread, depth and impact"""
+    bid, ask = best_prices(cube)
+    depth = cumulative_depth(cube)
+    top = min(TOP_N_IMBALANCE, cube.price.shape[-1]) - 1
+    columns = {
+        "best_bid": bid,
+        "best_ask": ask,
+        "mid": (bid + ask) / 2,
+        "microprice": book_weighted_mid(cube, 1),
+        "weighted_mid": book_weighted_mid(cube),
+        "spread_ticks": ticks_between_array(bid, ask),
+        "bid_depth_top5": depth[BID, :, :, top],
+        "ask_depth_top5": depth[ASK, :, :, top],
+        "bid_value_top5": np.nansum((cube.price * cube.lot)[BID, :, :, :top + 1], axis=-1) * SHARES_PER_LOT,
+        "ask_value_top5": np.nansum((cube.price * cube.lot)[ASK, :, :, :top + 1], axis=-1) * SHARES_PER_LOT,
+    }
+    for lots in impact_lots:
+        columns[f"impact_buy_{lots}_bps"], columns[f"impact_sell_{lots}_bps"] = price_impact(cube, lots, depth)
+
+    n_k, n_s = cube.shape[:2]
+    frame = pd.DataFrame({
+        "kode": np.repeat(cube.kodes, n_s),
+        "timestamp": np.tile(np.asarray(cube.slots), n_k),
+        **{name: values.reshape(-1) for name, values in columns.items()},
+    })
+    return frame[~np.isnan(frame["mid"]) | ~np.isnan(frame["best_bid"]) | ~np.isnan(frame["best_ask"])]
+
+
+def depth_curves(cube):
+    """Long frame of cumulative depth per (kode, slot, side, level), only where the level exists"""
+    depth = cumulative_depth(cube)
+    side, k, s, level = np.nonzero(~np.isnan(depth))
+    return pd.DataFrame({
+        "kode": cube.kodes[k],
+        "timestamp": np.asarray(cube.slots)[s],
+        "side": np.where(side == BID, "B", "A"),
+        "level": level + 1,
+        "price": cube.price[side, k, s, level],
+        "cum_lot": depth[side, k, s, level],
+    })
+
+
+def liquidity_ranking(cube, impact_lots=DEFAULT_IMPACT_LOTS):
+    """Per-ticker day aggregates and a composite rank (1 = most liquid).
+
+    Composite = mean of the ranks on median spread (ticks), median top-5
+    value on both sides and median impact of the middle order size.
+    """
+    bid, ask = best_prices(cube)
+    depth = cumulative_depth(cube)
+    top = min(TOP_N_IMBALANCE, cube.price.shape[-1]) - 1
+    value = np.nansum((cube.price * cube.lot)[:, :, :, :top + 1], axis=-1).sum(axis=0) * SHARES_PER_LOT
+    present = ~(np.isnan(bid) & np.isnan(ask))
+    value = np.where(present, value, np.nan)
+    ref_lots = impact_lots[len(impact_lots) // 2]
+    buy, sell = price_impact(cube, ref_lots, depth)
+
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        # nanmedian of a ticker with no snapshot warns; NaN is the answer we want there
+        warnings.simplefilter("ignore", RuntimeWarning)
+        frame = pd.DataFrame({
+            "kode": cube.kodes,
+            "snapshots": present.sum(axis=1),
+            "median_spread_ticks": np.nanmedian(ticks_between_array(bid, ask), axis=1),
+            "median_value_top5": np.nanmedian(value, axis=1),
+            f"median_impact_{ref_lots}_bps": np.nanmedian((buy + sell) / 2, axis=1),
+            "impact_unfilled_share": np.mean(np.isnan(buy) | np.isnan(sell), axis=1, where=present),
+        })
+    ranks = pd.concat([
+        frame["median_spread_ticks"].rank(method="min"),
+        frame["median_value_top5"].rank(method="min", ascending=False),
+        frame[f"median_impact_{ref_lots}_bps"].rank(method="min", na_option="bottom"),
+    ], axis=1)
+    frame["liquidity_score"] = ranks.mean(axis=1)
+    frame["liquidity_rank"] = frame["liquidity_score"].rank(method="min").astype("int64")
+    return frame.sort_values("liquidity_rank", kind="mergesort").reset_index(drop=True)
+
+
+# ============================================================
+# LOADING
+# ============================================================
+def load_levels(source, day):
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source '{source}', expected one of {SOURCES}")
+    start = datetime.combine(day, datetime.min.time())
+    return _read_frame(
+        f"SELECT kode, side, price, lot, timestamp FROM orderbook_{source} "
+        f"WHERE timestamp >= %s AND timestamp < %s",
+        (start, start + timedelta(days=1)),
+        ["kode", "side", "price", "lot", "timestamp"],
+    )
+
+
+def synthetic_levels(n_tickers, snapshots, levels=DEFAULT_LEVELS, seed=0):
+    """Raw level rows for a fake trading day (for timing without a database)"""
+    rng = np.random.default_rng(seed)
+    kodes = np.array([f"T{i:03d}" for i in range(n_tickers)])
+    base = rng.integers(50, 20000, n_tickers)
+    n = n_tickers * snapshots
+    k = np.repeat(np.arange(n_tickers), snapshots)
+    step = np.tile(np.arange(snapshots), n_tickers)
+    ts = (np.datetime64(f"{date.today()}T09:00:00")
+          + (step * int(6.5 * 3600 // snapshots) + rng.integers(0, 60, n)).astype("timedelta64[s]"))
+    # Stay on the IDX tick grid so spreads/impact come out in whole ticks
+    tick = np.select([base[k] < end for _, end, _ in TICK_BANDS[:-1]],
+                     [t for _, _, t in TICK_BANDS[:-1]], TICK_BANDS[-1][2])
+    best_bid = np.maximum((base[k] // tick + rng.integers(-20, 20, n)) * tick, (levels + 1) * tick)
+
+    lvl = np.arange(levels)
+    frames = []
+    for side, sign, offset in (("B", -1, 0), ("A", 1, 1)):
+        price = best_bid[:, None] + (sign * lvl[None, :] + offset + (side == "A") * rng.integers(0, 3, (n, 1))) * tick[:, None]
+        frames.append(pd.DataFrame({
+            "kode": np.repeat(kodes[k], levels),
+            "side": side,
+            "price": price.reshape(-1),
+            "lot": rng.integers(1, 50000, n * levels),
+            "timestamp": np.repeat(ts, levels),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+# ============================================================
+# MAIN
+# ============================================================
+def write_parquet(df, path):
+    df.to_parquet(path, index=False)
+    print(f"[SAVED] {len(df)} rows to {path}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Depth curves, price impact and liquidity rankings for one day.")
+    parser.add_argument("-s", "--source", default="ajaib", choices=SOURCES)
+    parser.add_argument("-d", "--date", default=str(date.today()), help="Trading day YYYY-MM-DD")
+    parser.add_argument("-b", "--bucket", type=int, default=DEFAULT_BUCKET, help="Seconds per time slot (default: 900)")
+    parser.add_argument("-l", "--levels", type=int, default=DEFAULT_LEVELS, help="Levels per side kept (default: 10)")
+    parser.add_argument("--impact-lots", default=",".join(map(str, DEFAULT_IMPACT_LOTS)),
+                        help="Comma separated order sizes in lots for price impact")
+    parser.add_argument("-o", "--out", default="analytics", help="Output directory for the Parquet files")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="Time the pipeline on 955 synthetic tickers x N snapshots instead of the DB")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    impact_lots = tuple(int(x) for x in args.impact_lots.split(",") if x.strip())
+    day = date.today() if args.synthetic else date.fromisoformat(args.date)
+
+    start = time.perf_counter()
+    levels = synthetic_levels(955, args.synthetic, args.levels) if args.synthetic else load_levels(args.source, day)
+    loaded = time.perf_counter()
+    if levels.empty:
+        print(f"[WARN] No {args.source} rows on {day}")
+        return
+    cube = BookCube.from_levels(levels, day, args.bucket, args.levels)
+    built = time.perf_counter()
+    metrics = slot_metrics(cube, impact_lots)
+    curves = depth_curves(cube)
+    ranking = liquidity_ranking(cube, impact_lots)
+    done = time.perf_counter()
+
+    n_k, n_s, n_l = cube.shape
+    print(f"[INFO] {len(levels)} level rows -> cube {n_k} tickers x {n_s} slots x {n_l} levels")
+    print(f"[INFO] Load: {loaded - start:.2f}s | Cube: {built - loaded:.2f}s | Metrics: {done - built:.2f}s")
+    print("[INFO] Most liquid: " + ", ".join(ranking["kode"].head(10)))
+
+    os.makedirs(args.out, exist_ok=True)
+    prefix = os.path.join(args.out, f"{args.source}_{day}")
+    write_parquet(metrics, f"{prefix}_metrics.parquet")
+    write_parquet(curves, f"{prefix}_depth.parquet")
+    write_parquet(ranking, f"{prefix}_ranking.parquet")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import asyncio
+import base64
+import json
+import os
+import time
+
+AUTH_REFRESH_MARGIN = float(os.getenv("AUTH_REFRESH_MARGIN", "120"))  # seconds before exp to refresh
+AUTH_MARGIN_FRACTION = 0.25  # ...but never more than this share of the token's lifetime
+AUTH_MIN_REFRESH_INTERVAL = float(os.getenv("AUTH_MIN_REFRESH_INTERVAL", "10"))  # between two logins
+AUTH_FAILURE_COOLDOWN = 30.0  # after a failed login, doubled per consecutive failure
+AUTH_FAILURE_COOLDOWN_MAX = 300.0
+
+
+def jwt_expiry(authorization):
+    """`exp` (epoch seconds) of a 'Bearer <jwt>' header; None when it is not a readable JWT"""
+    if not authorization:
+        return None
+    token = authorization.split()[-1]
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+# ============================================================
+# AUTH MANAGER
+# ============================================================
+class AuthManager:
+    """Owns the API headers and refreshes the token once for everybody.
+
+    Requests read `headers()` per call instead of mutating the session's
+    defaults. A refresh runs ahead of the JWT's expiry in the background, and
+    any number of concurrent 401s share one login: the first caller starts it,
+    the others await the same task and see its result or its exception.
+    Logins are spaced by AUTH_MIN_REFRESH_INTERVAL, and by a growing cooldown
+    after failures, so a bad token or a broken login never loops.
+    """
+
+    def __init__(self, login, playwright=None, headers=None, margin=AUTH_REFRESH_MARGIN):
+        self.login = login
+        self.playwright = playwright
+        self.margin = margin
+        self.generation = 0
+        self.refreshes = 0
+        self.failures = 0
+        self._headers = {}
+        self.expires_at = None
+        self.refresh_at = None
+        self._inflight = None
+        self._not_before = 0.0  # monotonic time the next login may start
+        self._task = None
+        self._set_headers(dict(headers or {}))
+
+    def _set_headers(self, headers):
+        self._headers = headers
+        self.expires_at = jwt_expiry(headers.get("Authorization"))
+        self.refresh_at = None
+        if self.expires_at is None:
+            return
+        ttl = self.expires_at - time.time()
+        if ttl <= 0:
+            # Already expired by our clock (skew, or a stale token): only 401s can be trusted
+            print(f"[AUTH] Token exp is {-ttl:.0f}s in the past, refreshing on 401 only")
+            self.expires_at = None
+            return
+        self.refresh_at = self.expires_at - min(self.margin, ttl * AUTH_MARGIN_FRACTION)
+
+    def headers(self):
+        """(headers, generation) to send with one request"""
+        return self._headers, self.generation
+
+    async def current(self):
+        """Like headers(), but waits for a refresh in flight and renews an expired token"""
+        if self._inflight is not None:
+            try:
+                await asyncio.shield(self._inflight)
+            except Exception:
+                pass  # the request will get its 401 and ask again
+        elif self.expires_at is not None and time.time() >= self.expires_at:
+            await self.refresh(self.generation)
+        return self.headers()
+
+    async def refresh(self, seen_generation=None):
+        """Log in again unless someone already did since `seen_generation`; raises if the login failed"""
+        if seen_generation is not None and seen_generation != self.generation:
+            return
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._login())
+        # Shielded: one cancelled waiter must not cancel the login everybody else waits for
+        await asyncio.shield(self._inflight)
+
+    async def _login(self):
+        try:
+            wait = self._not_before - time.monotonic()
+            if wait > 0:
+                print(f"[AUTH] Next login allowed in {wait:.0f}s, waiting")
+                await asyncio.sleep(wait)
+            print("[AUTH] Refreshing token...")
+            try:
+                headers = await self.login(self.playwright)
+                if not headers.get("Authorization"):
+                    raise RuntimeError("Login returned no Authorization header")
+            except Exception as e:
+                self.failures += 1
+                cooldown = min(AUTH_FAILURE_COOLDOWN * 2 ** (self.failures - 1), AUTH_FAILURE_COOLDOWN_MAX)
+                self._not_before = time.monotonic() + cooldown
+                print(f"[AUTH] Login failed ({self.failures}x), next attempt in {cooldown:.0f}s or later: {e}")
+                raise
+            self.failures = 0
+            self._not_before = time.monotonic() + AUTH_MIN_REFRESH_INTERVAL
+            self._set_headers(dict(headers))
+            self.generation += 1
+            self.refreshes += 1
+            left = f", expires in {self.expires_at - time.time():.0f}s" if self.expires_at else ""
+            print(f"[AUTH] Token refreshed (generation {self.generation}{left})")
+        finally:
+            self._inflight = None
+
+    # ---------------- proactive refresh ----------------
+    async def _run(self):
+        while True:
+            if self.refresh_at is None:
+                # Not a JWT (or no usable exp): check again after the next reactive refresh
+                await asyncio.sleep(AUTH_MIN_REFRESH_INTERVAL)
+                continue
+            await asyncio.sleep(max(self.refresh_at - time.time(), AUTH_MIN_REFRESH_INTERVAL / 2))
+            if time.time() < self.refresh_at:
+                continue  # a reactive refresh moved refresh_at meanwhile
+            try:
+                await self.refresh(self.generation)
+            except Exception as e:
+                print(f"[AUTH] Background refresh failed: {e}")
+
+    def start(self):
+        if self.refresh_at is not None:
+            print(f"[AUTH] Token expires in {self.expires_at - time.time():.0f}s, "
+                  f"refreshing {self.expires_at - self.refresh_at:.0f}s ahead")
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+import main as client
+
+MOCK_HOST = "127.0.0.1"
+MOCK_PORT = 8765
+MOCK_PATH = "/api/v1/stock/bestquote/"
+
+
+# ============================================================
+# MOCK BESTQUOTE API
+# ============================================================
+class MockBestquote:
+    """Local stand-in for the bestquote endpoint with injected faults.
+
+    Tokens are issued by `login()` as unsigned JWTs carrying `exp` when there
+    is a `token_ttl`; a token stops working once it expires or a newer one exists. On top of that a request can be
+    answered with a spurious 401, a 429, a hang past the client timeout or a
+    slow 200, each with its configured probability.
+    """
+
+    def __init__(self, p401=0.0, p429=0.0, ptimeout=0.0, pslow=0.0, slow_s=1.0, hang_s=60.0,
+                 token_ttl=None, login_s=0.0, levels=10, seed=0):
+        self.p401 = p401
+        self.p429 = p429
+        self.ptimeout = ptimeout
+        self.pslow = pslow
+        self.slow_s = slow_s
+        self.hang_s = hang_s
+        self.token_ttl = token_ttl
+        self.login_s = login_s
+        self.levels = levels
+        self.rng = random.Random(seed)
+        self.generation = 0
+        self.issued_at = 0.0
+        self.token = None
+        self.logins = 0
+        self.requests = Counter()  # code -> requests
+        self.served = Counter()  # code -> 200 responses
+        self.statuses = Counter()
+
+    async def login(self, _playwright=None):
+        """Replacement for main.login_and_get_headers: a new token after `login_s`"""
+        await asyncio.sleep(self.login_s)
+        self.generation += 1
+        self.issued_at = time.time()
+        self.logins += 1
+        self.token = self._jwt()
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def _jwt(self):
+        claims = {"sub": "mock", "gen": self.generation}
+        if self.token_ttl is not None:
+            claims["exp"] = self.issued_at + self.token_ttl
+        part = lambda obj: base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+        return f"{part({'alg': 'none'})}.{part(claims)}.mock"
+
+    def _token_valid(self, auth):
+        if auth != f"Bearer {self.token}":
+            return False
+        return self.token_ttl is None or time.time() - self.issued_at < self.token_ttl
+
+    def _book(self, code):
+        mid = self.rng.randint(100, 10000)
+        now_ms = int(time.time() * 1000)
+        side = lambda sign: {"unix_time": now_ms, "items": [
+            {"price": mid + sign * (i + 1), "lot": self.rng.randint(1, 5000), "num": self.rng.randint(1, 50)}
+            for i in range(self.levels)]}
+        return {"code": code, "buy_side": side(-1), "sell_side": side(1)}
+
+    async def handle(self, request):
+        code = request.query.get("code", "")
+        self.requests[code] += 1
+        roll = self.rng.random()
+        if not self._token_valid(request.headers.get("Authorization")) or roll < self.p401:
+            status = 401
+        elif roll < self.p401 + self.p429:
+            status = 429
+        elif roll < self.p401 + self.p429 + self.ptimeout:
+            await asyncio.sleep(self.hang_s)
+            status = 504
+        else:
+            status = 200
+            if self.rng.random() < self.pslow:
+                await asyncio.sleep(self.slow_s)
+        self.statuses[status] += 1
+        if status != 200:
+            return web.Response(status=status)
+        self.served[code] += 1
+        return web.Response(body=json.dumps(self._book(code)), content_type="application/json")
+
+    async def start(self, host=MOCK_HOST, port=MOCK_PORT):
+        app = web.Application()
+        app.router.add_get(MOCK_PATH, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}{MOCK_PATH}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+# ============================================================
+# HARNESS
+# ============================================================
+async def run_load(codes, mock, concurrency, delay, retry_429_delay, timeout, verbose=False):
+    url = await mock.start()
+    # The client reads these module globals on every call
+    client.URL = url
+    client.REQUEST_TIMEOUT = timeout
+    client.DELAY_BETWEEN_REQUESTS = delay
+    client.RETRY_ON_429_DELAY = retry_429_delay
+    client.sem = asyncio.Semaphore(concurrency)
+    try:
+        headers = await mock.login()
+        start = time.perf_counter()
+        # The client prints a line per code; only the report matters here unless -v
+        with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+            results = await client.fetch_batch_with_relogin(None, codes, headers, login=mock.login)
+        elapsed = time.perf_counter() - start
+    finally:
+        await mock.stop()
+    return results, elapsed
+
+
+def report(codes, results, elapsed, mock):
+    got = {r["code"]: r for r in results if r and r.get("data") is not None}
+    lost = [c for c in codes if c not in got]
+    misaligned = sum(1 for code, r in zip(codes, results) if r and r.get("code") != code)
+    total_requests = sum(mock.requests.values())
+    duplicate_requests = total_requests - len(mock.requests)
+    duplicate_served = sum(n - 1 for n in mock.served.values() if n > 1)
+
+    print(f"\n{'='*60}")
+    print("BESTQUOTE LOAD TEST")
+    print(f"{'='*60}")
+    print(f"Codes        : {len(codes)} in {elapsed:.1f}s ({len(got) / elapsed:.1f} codes/s, "
+          f"{total_requests / elapsed:.1f} req/s)")
+    print(f"Requests     : {total_requests} ({duplicate_requests} beyond one per code)")
+    print("Statuses     : " + ", ".join(f"{s}={n}" for s, n in sorted(mock.statuses.items())))
+    print(f"Re-logins    : {mock.logins - 1}")
+    print(f"Duplicates   : {duplicate_served} codes served more than once")
+    print(f"Lost codes   : {len(lost)}" + (f" ({', '.join(lost[:10])}{' ...' if len(lost) > 10 else ''})"
+                                            if lost else ""))
+    if misaligned:
+        print(f"Misaligned   : {misaligned} results not at their code's position")
+    print(f"{'='*60}\n")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Drive main.py's bestquote client against a faulty mock API.")
+    parser.add_argument("-n", "--codes", type=int, default=955)
+    parser.add_argument("--p401", type=float, default=0.01, help="Spurious 401 rate")
+    parser.add_argument("--p429", type=float, default=0.05, help="429 rate")
+    parser.add_argument("--ptimeout", type=float, default=0.01, help="Share of requests that hang past the timeout")
+    parser.add_argument("--pslow", type=float, default=0.05, help="Share of slow 200s")
+    parser.add_argument("--slow", type=float, default=1.0, help="Seconds a slow response takes")
+    parser.add_argument("--token-ttl", type=float, default=None, help="Seconds until the token expires")
+    parser.add_argument("--login", type=float, default=2.0, help="Seconds a (mock) re-login takes")
+    parser.add_argument("-c", "--concurrency", type=int, default=client.MAX_CONCURRENT)
+    parser.add_argument("--delay", type=float, default=client.DELAY_BETWEEN_REQUESTS)
+    parser.add_argument("--retry-429", type=float, default=client.RETRY_ON_429_DELAY)
+    parser.add_argument("--timeout", type=float, default=5.0, help="Client request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the client's own output")
+    return parser.parse_args()
+
+
+async def amain():
+    args = parse_args()
+    codes = [f"T{i:04d}" for i in range(args.codes)]
+    mock = MockBestquote(args.p401, args.p429, args.ptimeout, args.pslow, args.slow,
+                         hang_s=args.timeout * 2, token_ttl=args.token_ttl, login_s=args.login, seed=args.seed)
+    results, elapsed = await run_load(codes, mock, args.concurrency, args.delay, args.retry_429, args.timeout,
+                                     args.verbose)
+    report(codes, results, elapsed, mock)
+
+
+if __name__ == "__main__":
+    asyncio.run(amain())
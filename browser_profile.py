@@ -0,0 +1,154 @@
+import json
+import os
+from datetime import datetime
+
+PERSISTENT_PROFILE = os.getenv("PERSISTENT_PROFILE") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "browser_profiles")
+PROFILE_CACHE_MB = int(os.getenv("PROFILE_CACHE_MB", "512"))
+# CACHE_MEASURE=1 meters fresh-profile runs too, as the baseline for the persistent one
+CACHE_MEASURE = os.getenv("CACHE_MEASURE") == "1"
+CACHE_STATS_FILE = "cache_stats.json"
+
+
+def profile_dir(site, slot):
+    """One user-data dir per browser slot; Chromium refuses to share one between processes"""
+    return os.path.abspath(os.path.join(PROFILE_DIR, f"{site}-{slot}"))
+
+
+def profile_args():
+    return [f"--disk-cache-size={PROFILE_CACHE_MB * 1024 * 1024}"]
+
+
+async def seed_storage_state(context, storage_state, overwrite=False):
+    """Load a storage_state (cookies + localStorage) into a persistent context.
+
+    localStorage is only filled where the key is missing so tokens the app
+    refreshed in the profile are not rolled back on every navigation; a
+    re-login after the session expired passes `overwrite` to replace them.
+    """
+    if not storage_state:
+        return
+    if storage_state.get("cookies"):
+        await context.add_cookies(storage_state["cookies"])
+    origins = {
+        o["origin"]: {item["name"]: item["value"] for item in o.get("localStorage", [])}
+        for o in storage_state.get("origins", []) if o.get("localStorage")
+    }
+    if origins:
+        await context.add_init_script(
+            "((origins, overwrite) => { const items = origins[location.origin]; if (!items) return;"
+            " for (const [k, v] of Object.entries(items))"
+            " if (overwrite || localStorage.getItem(k) === null) localStorage.setItem(k, v); })"
+            f"({json.dumps(origins)}, {json.dumps(overwrite)})"
+        )
+
+
+class SharedContext:
+    """Looks like a fresh browser context but opens its pages in a persistent one.
+
+    Closing it closes only the pages it opened, so the profile (and its disk
+    cache) stays alive for the next ticker.
+    """
+
+    def __init__(self, context):
+        self._context = context
+        self._pages = []
+
+    async def new_page(self):
+        page = await self._context.new_page()
+        self._pages.append(page)
+        return page
+
+    async def close(self):
+        for page in self._pages:
+            try:
+                await page.close()
+            except Exception:
+                pass
+        self._pages.clear()
+
+
+# ============================================================
+# CACHE ACCOUNTING
+# ============================================================
+class CacheMeter:
+    """Cache hit ratio and bytes on the wire per page, read from CDP Network events.
+
+    Every metered page pays for an extra CDP session and Network events, so
+    the meter only attaches with a persistent profile or CACHE_MEASURE=1.
+    """
+
+    def __init__(self, site, mode, enabled=None):
+        self.site = site
+        self.mode = mode
+        self.enabled = (PERSISTENT_PROFILE or CACHE_MEASURE) if enabled is None else enabled
+        self.pages = 0
+        self.responses = 0
+        self.disk_hits = 0
+        self.memory_hits = 0
+        self.bytes = 0
+
+    async def attach(self, page):
+        if not self.enabled:
+            return
+        try:
+            cdp = await page.context.new_cdp_session(page)
+            cdp.on("Network.responseReceived", self._on_response)
+            cdp.on("Network.requestServedFromCache", self._on_memory_hit)
+            cdp.on("Network.loadingFinished", self._on_finished)
+            await cdp.send("Network.enable")
+        except Exception as e:
+            print(f"[CACHE] meter not attached: {e}")
+            return
+        self.pages += 1
+
+    def _on_response(self, event):
+        self.responses += 1
+        if event["response"].get("fromDiskCache"):
+            self.disk_hits += 1
+
+    def _on_memory_hit(self, event):
+        self.memory_hits += 1
+
+    def _on_finished(self, event):
+        self.bytes += int(event.get("encodedDataLength", 0))
+
+    @property
+    def hit_ratio(self):
+        return (self.disk_hits + self.memory_hits) / self.responses if self.responses else 0.0
+
+    @property
+    def bytes_per_page(self):
+        return self.bytes / self.pages if self.pages else 0.0
+
+    def report(self):
+        """Print this cycle's numbers next to the previous cycle and the other mode, then save them"""
+        if not self.pages:
+            return
+        path = os.path.join(PROFILE_DIR, CACHE_STATS_FILE)
+        try:
+            with open(path, encoding="utf-8") as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            history = {}
+        site_stats = history.setdefault(self.site, {})
+        current = {
+            "pages": self.pages,
+            "hit_ratio": round(self.hit_ratio, 4),
+            "kb_per_page": round(self.bytes_per_page / 1024, 1),
+            "at": datetime.now().isoformat(timespec="seconds"),
+        }
+        print(f"[CACHE] {self.site} ({self.mode}): hit ratio {current['hit_ratio']:.1%} "
+              f"(disk {self.disk_hits}, memory {self.memory_hits} of {self.responses}), "
+              f"{current['kb_per_page']:.1f} KB/ticker over {self.pages} tickers")
+        other = "fresh" if self.mode == "persistent" else "persistent"
+        for label, key in (("previous cycle", self.mode), (f"{other} mode", other)):
+            before = site_stats.get(key)
+            if before and before.get("kb_per_page"):
+                delta = current["kb_per_page"] - before["kb_per_page"]
+                print(f"[CACHE]   vs {label}: {delta:+.1f} KB/ticker "
+                      f"({delta / before['kb_per_page']:+.0%})")
+        site_stats[self.mode] = current
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(history, f, indent=2)
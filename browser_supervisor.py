@@ -0,0 +1,288 @@
+import asyncio
+import os
+import statistics
+import time
+from contextlib import asynccontextmanager
+
+from browser_profile import SharedContext, profile_args, seed_storage_state
+
+try:
+    import psutil
+except ImportError:  # optional, falls back to /proc on Linux
+    psutil = None
+
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "200"))
+BROWSER_MAX_RSS_MB = float(os.getenv("BROWSER_MAX_RSS_MB", "1500"))
+LATENCY_DRIFT_FACTOR = float(os.getenv("BROWSER_LATENCY_DRIFT", "2.5"))
+LATENCY_BASELINE_PAGES = 20  # pages after launch that define "normal" latency
+RSS_CHECK_EVERY = 10  # pages between RSS samples
+MAX_PAGE_CRASHES = 3
+
+
+def _process_table():
+    """(pid, ppid, argv) for every visible process"""
+    if psutil is not None:
+        return [(p.info["pid"], p.info["ppid"], p.info["cmdline"] or [])
+                for p in psutil.process_iter(["pid", "ppid", "cmdline"])]
+    table = []
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                argv = f.read().decode("utf-8", errors="replace").split("\0")
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        table.append((int(entry), ppid, argv))
+    return table
+
+
+def _profile_pids(user_data_dir):
+    """Chromium started with this --user-data-dir plus its children (persistent contexts expose no Browser)"""
+    flag = f"--user-data-dir={user_data_dir}"
+    table = _process_table()
+    pids = {pid for pid, _, argv in table if flag in argv}
+    grew = True
+    while grew:
+        children = {pid for pid, ppid, _ in table if ppid in pids} - pids
+        pids |= children
+        grew = bool(children)
+    return sorted(pids)
+
+
+def _rss_bytes(pid):
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except Exception:
+            return 0
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
+class PageSlot:
+    def __init__(self, supervisor, browser, generation):
+        self.supervisor = supervisor
+        self.browser = browser
+        self.generation = generation
+        # Set by the caller: only successful pages count towards latency, since a
+        # timeout or an error page says nothing about how fast the browser is
+        self.succeeded = False
+
+    @property
+    def lost(self):
+        """True if the browser crashed or was replaced while this slot was in use"""
+        return self.supervisor.generation != self.generation or self.supervisor.crashed
+
+    async def new_context(self, **kwargs):
+        if self.supervisor.persistent is not None:
+            # storage_state was seeded once at launch; pages share the profile and its cache
+            return SharedContext(self.supervisor.persistent)
+        context = await self.browser.new_context(**kwargs)
+        context.on("page", lambda page: page.on("crash", lambda _: self.supervisor.record_page_crash()))
+        return context
+
+
+# ============================================================
+# SUPERVISOR
+# ============================================================
+class BrowserSupervisor:
+    """Owns one Chromium: tracks RSS, page crashes and latency drift, and recycles it.
+
+    Work runs inside `async with supervisor.slot() as slot`. When a recycle is
+    due the supervisor stops handing out slots, waits for in-flight pages to
+    finish, then relaunches. If the browser crashes, every in-flight slot
+    reports `slot.lost` so callers can requeue instead of failing the ticker.
+    Callers set `slot.succeeded` so only successful pages feed latency drift.
+
+    With `user_data_dir` the browser is a persistent context on that profile,
+    so the HTTP and code caches survive tickers, recycles and cycles.
+    """
+
+    def __init__(self, playwright, name, launch_kwargs=None, max_pages=BROWSER_MAX_PAGES,
+                 max_rss_mb=BROWSER_MAX_RSS_MB, drift_factor=LATENCY_DRIFT_FACTOR,
+                 user_data_dir=None, storage_state=None):
+        self.playwright = playwright
+        self.name = name
+        self.launch_kwargs = launch_kwargs or {"headless": True}
+        self.max_pages = max_pages
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.drift_factor = drift_factor
+        self.user_data_dir = user_data_dir
+        self.storage_state = storage_state
+        self.renewed_states = []  # re-logins during the run, seeded over the launch login
+        self.browser = None
+        self.persistent = None
+        self.generation = 0
+        self.crashed = False
+        self.stats = {"launches": 0, "recycles": 0, "crashes": 0, "page_crashes": 0, "max_rss_mb": 0.0}
+        self._cond = asyncio.Condition()
+        self._in_flight = 0
+        self._recycle_reason = None
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.pages = 0
+        self.page_crashes = 0
+        self.rss_bytes = 0
+        self._latencies = []
+        self._baseline = None
+        self._ewma = None
+
+    # ---------------- lifecycle ----------------
+    async def start(self):
+        if self.user_data_dir:
+            kwargs = dict(self.launch_kwargs)
+            kwargs["args"] = list(kwargs.get("args", [])) + profile_args()
+            self.persistent = await self.playwright.chromium.launch_persistent_context(self.user_data_dir, **kwargs)
+            self.persistent.on("close", self._on_disconnected)
+            self.persistent.on("page", lambda page: page.on("crash", lambda _: self.record_page_crash()))
+            await seed_storage_state(self.persistent, self.storage_state)
+            for state in self.renewed_states:
+                await seed_storage_state(self.persistent, state, overwrite=True)
+            # The profile opens with a blank tab; it is not ours to track
+            for page in self.persistent.pages:
+                await page.close()
+        else:
+            self.browser = await self.playwright.chromium.launch(**self.launch_kwargs)
+            self.browser.on("disconnected", self._on_disconnected)
+        self.generation += 1
+        self.crashed = False
+        self.stats["launches"] += 1
+        self._reset_counters()
+        return self
+
+    async def reseed(self, storage_state):
+        """Replace the profile's login after a re-login (no-op without a persistent profile)"""
+        if self.user_data_dir is None:
+            return
+        self.renewed_states.append(storage_state)
+        if self.persistent is not None:
+            await seed_storage_state(self.persistent, storage_state, overwrite=True)
+
+    @property
+    def _handle(self):
+        return self.persistent or self.browser
+
+    def _on_disconnected(self, handle):
+        if handle is self._handle and self._recycle_reason != "closing":
+            self.crashed = True
+            self.stats["crashes"] += 1
+            print(f"[SUPERVISOR] {self.name} browser disconnected (crash)")
+
+    async def close(self):
+        self._recycle_reason = "closing"
+        if self._handle:
+            try:
+                await self._handle.close()
+            except Exception as e:
+                print(f"[WARN] Error closing {self.name}: {e}")
+        self.browser = None
+        self.persistent = None
+
+    async def _relaunch(self, reason):
+        print(f"[SUPERVISOR] {self.name} recycling after {self.pages} pages "
+              f"(rss={self.rss_bytes/1024/1024:.0f}MB): {reason}")
+        old = self._handle
+        self._recycle_reason = "closing"
+        if old:
+            try:
+                await old.close()
+            except Exception:
+                pass
+        self._recycle_reason = None
+        self.stats["recycles"] += 1
+        await self.start()
+
+    @property
+    def accepting(self):
+        """False while draining for a recycle or after a crash"""
+        return not self.crashed and not self._recycle_reason
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    # ---------------- slots ----------------
+    @asynccontextmanager
+    async def slot(self):
+        async with self._cond:
+            while True:
+                if self.crashed and self._in_flight == 0:
+                    await self._relaunch("browser crashed")
+                    self._cond.notify_all()
+                elif self._recycle_reason and self._in_flight == 0:
+                    await self._relaunch(self._recycle_reason)
+                    self._cond.notify_all()
+                if not self.crashed and not self._recycle_reason:
+                    break
+                await self._cond.wait()
+            self._in_flight += 1
+            slot = PageSlot(self, self.browser, self.generation)
+
+        start = time.perf_counter()
+        try:
+            yield slot
+        finally:
+            elapsed = time.perf_counter() - start
+            async with self._cond:
+                self._in_flight -= 1
+                self.pages += 1
+                if slot.succeeded and not slot.lost:
+                    self._record_latency(elapsed)
+                await self._check_health()
+                self._cond.notify_all()
+
+    # ---------------- health ----------------
+    def record_page_crash(self):
+        self.page_crashes += 1
+        self.stats["page_crashes"] += 1
+        if self.page_crashes >= MAX_PAGE_CRASHES and not self._recycle_reason:
+            self._recycle_reason = f"{self.page_crashes} page crashes"
+
+    def _record_latency(self, seconds):
+        if self._baseline is None:
+            self._latencies.append(seconds)
+            if len(self._latencies) >= LATENCY_BASELINE_PAGES:
+                self._baseline = statistics.median(self._latencies)
+            return
+        self._ewma = seconds if self._ewma is None else 0.9 * self._ewma + 0.1 * seconds
+
+    async def _sample_rss(self):
+        if self.persistent is not None:
+            pids = await asyncio.to_thread(_profile_pids, self.user_data_dir)
+        else:
+            try:
+                cdp = await self.browser.new_browser_cdp_session()
+                info = await cdp.send("SystemInfo.getProcessInfo")
+                await cdp.detach()
+            except Exception:
+                return
+            pids = [p["id"] for p in info.get("processInfo", [])]
+        self.rss_bytes = sum(_rss_bytes(pid) for pid in pids)
+        self.stats["max_rss_mb"] = max(self.stats["max_rss_mb"], self.rss_bytes / 1024 / 1024)
+
+    async def _check_health(self):
+        if self._recycle_reason or self.crashed:
+            return
+        if self.pages >= self.max_pages:
+            self._recycle_reason = f"page budget {self.max_pages} reached"
+            return
+        if self.pages % RSS_CHECK_EVERY == 0:
+            await self._sample_rss()
+            if self.rss_bytes > self.max_rss_bytes:
+                self._recycle_reason = f"rss {self.rss_bytes/1024/1024:.0f}MB over budget"
+                return
+        if self._baseline and self._ewma and self._ewma > self._baseline * self.drift_factor:
+            self._recycle_reason = (f"latency drift {self._ewma:.1f}s vs baseline "
+                                    f"{self._baseline:.1f}s")
+
+    def format_stats(self):
+        s = self.stats
+        return (f"launches={s['launches']} recycles={s['recycles']} crashes={s['crashes']} "
+                f"page_crashes={s['page_crashes']} max_rss={s['max_rss_mb']:.0f}MB")
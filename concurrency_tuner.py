@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import statistics
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+try:
+    import psutil
+except ImportError:  # optional, falls back to loadavg and /proc/meminfo
+    psutil = None
+
+TUNER_STATE_FILE = os.getenv("TUNER_STATE_FILE", "tuner_state.json")
+TUNER_ERROR_CEILING = float(os.getenv("TUNER_ERROR_CEILING", "0.10"))  # max failed share per window
+TUNER_CPU_CEILING = float(os.getenv("TUNER_CPU_CEILING", "90"))
+TUNER_MEM_CEILING = float(os.getenv("TUNER_MEM_CEILING", "90"))
+MIN_WINDOW = 10  # completions before the first decision
+DECREASE_FACTOR = 0.7
+
+
+def host_load():
+    """(cpu %, memory %) of the host, without blocking"""
+    if psutil is not None:
+        return psutil.cpu_percent(None), psutil.virtual_memory().percent
+    try:
+        cpu = os.getloadavg()[0] / (os.cpu_count() or 1) * 100
+    except OSError:
+        cpu = 0.0
+    mem = 0.0
+    try:
+        info = {}
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                info[key] = int(value.split()[0])
+        mem = 100 * (1 - info["MemAvailable"] / info["MemTotal"])
+    except (OSError, KeyError, ValueError):
+        pass
+    return cpu, mem
+
+
+def load_state(key, path=TUNER_STATE_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get(key, {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(key, state, path=TUNER_STATE_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[key] = state
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+# ============================================================
+# TUNER
+# ============================================================
+class ConcurrencyTuner:
+    """Adjusts the number of pages in flight to maximise tickers/second.
+
+    Every window of completions it compares throughput with the previous
+    window and hill-climbs: a step that paid off is repeated, a step that did
+    not is reversed, so the limit settles around the knee. A window over the
+    error/timeout ceiling, or a host over its CPU/memory ceiling, cuts the
+    limit multiplicatively and climbing restarts upwards from there.
+    """
+
+    def __init__(self, key, initial, min_limit=1, max_limit=None, error_ceiling=TUNER_ERROR_CEILING):
+        self.key = key
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit or initial)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.error_ceiling = error_ceiling
+        self.in_flight = 0
+        self.history = []  # one dict per decision window
+        self.best = None
+        self._direction = 1
+        self._cond = asyncio.Condition()
+        self._start_window()
+        host_load()  # prime psutil's cpu_percent
+
+    @classmethod
+    def from_state(cls, key, default, min_limit=1, max_limit=None):
+        """Start where the last cycle's best window was"""
+        previous = load_state(key).get("in_flight")
+        initial = previous if previous else default
+        if previous:
+            print(f"[TUNER] {key}: starting at {previous} in flight (from last cycle)")
+        return cls(key, initial, min_limit, max_limit)
+
+    def _start_window(self):
+        self._window_started = time.monotonic()
+        self._latencies = []
+        self._failures = 0
+        self._timeouts = 0
+
+    # ---------------- slots ----------------
+    @asynccontextmanager
+    async def slot(self):
+        async with self._cond:
+            while self.in_flight >= self.limit:
+                await self._cond.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def record(self, seconds, ok, timeout=False):
+        """Feed one finished attempt into the current window"""
+        self._latencies.append(seconds)
+        if not ok:
+            self._failures += 1
+        if timeout:
+            self._timeouts += 1
+        if len(self._latencies) >= max(MIN_WINDOW, 2 * self.limit):
+            self._decide()
+
+    # ---------------- control ----------------
+    def _decide(self):
+        n = len(self._latencies)
+        elapsed = max(time.monotonic() - self._window_started, 1e-6)
+        cpu, mem = host_load()
+        window = {
+            "limit": self.limit,
+            "tickers_per_s": n / elapsed,
+            "error_rate": self._failures / n,
+            "timeout_rate": self._timeouts / n,
+            "p50_s": statistics.median(self._latencies),
+            "cpu": cpu,
+            "mem": mem,
+        }
+        previous = self.history[-1] if self.history else None
+        self.history.append(window)
+
+        if window["error_rate"] <= self.error_ceiling and (
+                self.best is None or window["tickers_per_s"] > self.best["tickers_per_s"]):
+            self.best = window
+
+        if window["error_rate"] > self.error_ceiling or window["timeout_rate"] > self.error_ceiling:
+            new, reason = int(self.limit * DECREASE_FACTOR), f"error rate {window['error_rate']:.0%}"
+            self._direction = 1
+        elif cpu > TUNER_CPU_CEILING or mem > TUNER_MEM_CEILING:
+            new, reason = int(self.limit * DECREASE_FACTOR), f"host cpu {cpu:.0f}% mem {mem:.0f}%"
+            self._direction = 1
+        else:
+            if previous and window["tickers_per_s"] < previous["tickers_per_s"] * 1.02:
+                # The last step did not pay off: climb the other way
+                self._direction = -self._direction
+            new = self.limit + self._direction
+            reason = "probing wider" if self._direction > 0 else "probing narrower"
+        new = min(max(new, self.min_limit), self.max_limit)
+
+        if new != self.limit:
+            print(f"[TUNER] {self.key}: {self.limit} -> {new} in flight ({reason}; "
+                  f"{window['tickers_per_s']:.2f} tickers/s, p50 {window['p50_s']:.1f}s, "
+                  f"timeouts {window['timeout_rate']:.0%})")
+            self.limit = new
+            asyncio.ensure_future(self._wake())
+        self._start_window()
+
+    async def _wake(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+    def suggest_browsers(self, browsers, pages_per_browser, max_browsers):
+        """Browser count for the next cycle, from how the best window used the fleet"""
+        if not self.best:
+            return browsers
+        capacity = browsers * pages_per_browser
+        if (self.best["limit"] >= 0.9 * capacity and self.best["cpu"] < 70
+                and self.best["mem"] < 75 and browsers < max_browsers):
+            return browsers + 1
+        if self.best["limit"] <= 0.5 * capacity and browsers > 1:
+            return browsers - 1
+        return browsers
+
+    def save(self, browsers):
+        """Persist the best window's settings for the next cycle"""
+        if not self.best:
+            return
+        state = {
+            "in_flight": self.best["limit"],
+            "browsers": browsers,
+            "tickers_per_s": round(self.best["tickers_per_s"], 3),
+            "error_rate": round(self.best["error_rate"], 3),
+            "p50_s": round(self.best["p50_s"], 2),
+            "updated": datetime.now().isoformat(timespec="seconds"),
+        }
+        save_state(self.key, state)
+        print(f"[TUNER] {self.key}: best {state['tickers_per_s']} tickers/s at {state['in_flight']} in flight; "
+              f"next cycle uses {browsers} browsers")
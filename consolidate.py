@@ -0,0 +1,233 @@
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from db_pool import get_pool
+from orderbook_summary import ASK_SIDES, TICK_BANDS
+
+SOURCES = ("ajaib", "ipot")
+DEFAULT_TOLERANCE = 60.0  # seconds
+DISCREPANCY_TICKS = 2  # |mid difference| at or above this many ticks is reported
+BOOK_COLUMNS = ["kode", "timestamp", "best_bid", "best_ask", "bid_lot_total", "ask_lot_total"]
+
+
+# ============================================================
+# VECTORIZED HELPERS
+# ============================================================
+def ticks_between_array(low, high):
+    """Vectorized orderbook_summary.ticks_between (NaN where either side is missing)"""
+    low = np.asarray(low, dtype="float64")
+    high = np.asarray(high, dtype="float64")
+    lo = np.minimum(low, high)
+    hi = np.maximum(low, high)
+    ticks = np.zeros_like(lo)
+    for start, end, tick in TICK_BANDS:
+        a = np.maximum(lo, start)
+        b = hi if end is None else np.minimum(hi, end)
+        ticks += np.clip(b - a, 0, None) / tick
+    ticks = np.rint(ticks) * np.sign(high - low)
+    return np.where(np.isnan(low) | np.isnan(high), np.nan, ticks)
+
+
+def books_from_levels(levels):
+    """Per-snapshot best bid/ask and depth from raw level rows, without a Python loop"""
+    if levels.empty:
+        return pd.DataFrame(columns=BOOK_COLUMNS)
+    side = levels["side"].where(~levels["side"].isin(ASK_SIDES), "A")
+    keys = ["kode", "timestamp"]
+    bids = (levels[side == "B"].groupby(keys)
+            .agg(best_bid=("price", "max"), bid_lot_total=("lot", "sum")))
+    asks = (levels[side == "A"].groupby(keys)
+            .agg(best_ask=("price", "min"), ask_lot_total=("lot", "sum")))
+    return bids.join(asks, how="outer").reset_index()[BOOK_COLUMNS]
+
+
+# ============================================================
+# LOADING
+# ============================================================
+def _read_frame(query, params, columns):
+    with get_pool().connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+    return pd.DataFrame(rows, columns=columns)
+
+
+def load_books(source, day):
+    """One row per snapshot for `source` on `day`, preferring the ingest-time summary table"""
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    df = _read_frame(
+        "SELECT kode, timestamp, best_bid, best_ask, bid_lot_total, ask_lot_total "
+        "FROM orderbook_summary WHERE source = %s AND timestamp >= %s AND timestamp < %s",
+        (source, start, end),
+        BOOK_COLUMNS,
+    )
+    if df.empty:
+        # Days ingested before the summary table existed
+        levels = _read_frame(
+            f"SELECT kode, side, price, lot, timestamp FROM orderbook_{source} "
+            f"WHERE timestamp >= %s AND timestamp < %s",
+            (start, end),
+            ["kode", "side", "price", "lot", "timestamp"],
+        )
+        df = books_from_levels(levels)
+    return df
+
+
+def normalize(df, offset_seconds=0.0):
+    """Common schema: float prices, int-like depth, datetime timestamps, sorted for merge_asof"""
+    df = df.copy()
+    for col in ("best_bid", "best_ask", "bid_lot_total", "ask_lot_total"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    df["kode"] = df["kode"].astype(str).str.strip().str.upper()
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    if offset_seconds:
+        df["timestamp"] += pd.Timedelta(seconds=offset_seconds)
+    df = df.dropna(subset=["timestamp"])
+    return df.sort_values("timestamp", kind="mergesort").reset_index(drop=True)
+
+
+# ============================================================
+# CONSOLIDATION
+# ============================================================
+def consolidate(ajaib, ipot, tolerance=DEFAULT_TOLERANCE):
+    """As-of join every Ajaib snapshot with the nearest IPOT snapshot of the same ticker.
+
+    Both frames must already be normalized. Returns one row per Ajaib snapshot with
+    both venues' books, the consolidated BBO and discrepancy columns.
+    """
+    ipot = ipot.rename(columns={c: f"{c}_ipot" for c in ipot.columns if c != "kode"})
+    ipot["timestamp"] = ipot["timestamp_ipot"]
+    ajaib = ajaib.rename(columns={c: f"{c}_ajaib" for c in ajaib.columns if c not in ("kode", "timestamp")})
+
+    merged = pd.merge_asof(
+        ajaib, ipot,
+        on="timestamp", by="kode",
+        tolerance=pd.Timedelta(seconds=tolerance),
+        direction="nearest",
+    )
+    merged = merged.rename(columns={"timestamp": "timestamp_ajaib"})
+
+    bid_a = merged["best_bid_ajaib"].to_numpy()
+    bid_i = merged["best_bid_ipot"].to_numpy()
+    ask_a = merged["best_ask_ajaib"].to_numpy()
+    ask_i = merged["best_ask_ipot"].to_numpy()
+
+    merged["matched"] = merged["timestamp_ipot"].notna().to_numpy()
+    merged["lag_s"] = (merged["timestamp_ipot"] - merged["timestamp_ajaib"]).dt.total_seconds()
+
+    with np.errstate(invalid="ignore"):
+        merged["best_bid"] = np.fmax(bid_a, bid_i)
+        merged["best_ask"] = np.fmin(ask_a, ask_i)
+        merged["bid_venue"] = np.select(
+            [~np.isnan(bid_a) & (np.isnan(bid_i) | (bid_a > bid_i)),
+             ~np.isnan(bid_i) & (np.isnan(bid_a) | (bid_i > bid_a)),
+             bid_a == bid_i],
+            ["ajaib", "ipot", "both"], default="",
+        )
+        merged["ask_venue"] = np.select(
+            [~np.isnan(ask_a) & (np.isnan(ask_i) | (ask_a < ask_i)),
+             ~np.isnan(ask_i) & (np.isnan(ask_a) | (ask_i < ask_a)),
+             ask_a == ask_i],
+            ["ajaib", "ipot", "both"], default="",
+        )
+        merged["spread_ticks"] = ticks_between_array(merged["best_bid"], merged["best_ask"])
+
+        mid_a = (bid_a + ask_a) / 2
+        mid_i = (bid_i + ask_i) / 2
+        merged["mid_diff_ticks"] = ticks_between_array(mid_i, mid_a)
+        # One venue's bid at or through the other's ask
+        merged["crossed"] = (bid_a >= ask_i) | (bid_i >= ask_a)
+    merged["discrepancy"] = merged["matched"] & (
+        merged["crossed"] | (np.abs(merged["mid_diff_ticks"]) >= DISCREPANCY_TICKS)
+    )
+    return merged
+
+
+# ============================================================
+# SYNTHETIC DAY (for timing without a database)
+# ============================================================
+def synthetic_day(n_tickers, snapshots, seed=0):
+    rng = np.random.default_rng(seed)
+    kodes = np.array([f"T{i:03d}" for i in range(n_tickers)])
+    base = rng.integers(50, 20000, n_tickers).astype("float64")
+    start = np.datetime64(f"{date.today()}T09:00:00")
+
+    def venue(jitter_s):
+        k = np.repeat(np.arange(n_tickers), snapshots)
+        step = np.tile(np.arange(snapshots), n_tickers)
+        ts = start + (step * int(6.5 * 3600 // snapshots)).astype("timedelta64[s]")
+        ts = ts + rng.integers(0, jitter_s + 1, k.size).astype("timedelta64[s]")
+        bid = np.maximum(base[k] + rng.integers(-20, 20, k.size), 1)
+        return pd.DataFrame({
+            "kode": kodes[k],
+            "timestamp": ts,
+            "best_bid": bid,
+            "best_ask": bid + rng.integers(1, 4, k.size),
+            "bid_lot_total": rng.integers(1, 100000, k.size),
+            "ask_lot_total": rng.integers(1, 100000, k.size),
+        })
+
+    return venue(5), venue(30)
+
+
+# ============================================================
+# MAIN
+# ============================================================
+def write_output(df, path):
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    print(f"[SAVED] {len(df)} rows to {path}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Consolidate Ajaib and IPOT books for one trading day.")
+    parser.add_argument("-d", "--date", default=str(date.today()), help="Trading day YYYY-MM-DD")
+    parser.add_argument("-t", "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="As-of join tolerance in seconds (default: 60)")
+    parser.add_argument("--ipot-offset", type=float, default=0.0,
+                        help="Seconds added to IPOT timestamps to align clocks")
+    parser.add_argument("-o", "--out", default=None, help="Consolidated output (.parquet or .csv)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="Time the join on 955 synthetic tickers x N snapshots instead of the DB")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    if args.synthetic:
+        ajaib, ipot = synthetic_day(955, args.synthetic)
+    else:
+        day = date.fromisoformat(args.date)
+        ajaib = load_books("ajaib", day)
+        ipot = load_books("ipot", day)
+    loaded = time.perf_counter()
+
+    result = consolidate(normalize(ajaib), normalize(ipot, args.ipot_offset), args.tolerance)
+    done = time.perf_counter()
+
+    matched = int(result["matched"].sum())
+    discrepancies = result[result["discrepancy"]]
+    print(f"[INFO] Ajaib snapshots: {len(ajaib)} | IPOT snapshots: {len(ipot)}")
+    print(f"[INFO] Matched within {args.tolerance:.0f}s: {matched}/{len(result)}")
+    print(f"[INFO] Discrepancies: {len(discrepancies)} ({int(result['crossed'].sum())} crossed)")
+    print(f"[INFO] Load: {loaded - start:.2f}s | Consolidate: {done - loaded:.2f}s")
+
+    if args.out:
+        write_output(result, args.out)
+        stem, dot, ext = args.out.rpartition(".")
+        write_output(discrepancies, f"{stem}_discrepancies.{ext}" if dot else f"{args.out}_discrepancies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from dotenv import load_dotenv
+
+load_dotenv()
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections idle for less than this are handed out without a ping
+PING_AFTER_IDLE = float(os.getenv("DB_PING_AFTER_IDLE", "5"))
+
+
+def db_config_from_env():
+    """Read MySQL connection parameters from the environment"""
+    return {
+        "host": os.getenv("DB_HOST"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "database": os.getenv("DB_NAME"),
+    }
+
+
+# ============================================================
+# CONNECTION POOL
+# ============================================================
+class ConnectionPool:
+    """Small thread-safe pool of reusable MySQL connections.
+
+    Connections are created lazily up to `size`, pinged before reuse when they
+    have been idle for a while, and transparently replaced when the ping fails.
+    """
+
+    def __init__(self, config=None, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.config = config or db_config_from_env()
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._stats = {
+            "acquired": 0,
+            "created": 0,
+            "reused": 0,
+            "reconnects": 0,
+            "discarded": 0,
+            "pings": 0,
+            "wait_total_s": 0.0,
+            "wait_max_s": 0.0,
+        }
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.config)
+        with self._lock:
+            self._stats["created"] += 1
+        return conn
+
+    def _healthy(self, conn, idle_for):
+        """Cheap liveness check, reconnecting in place if the server went away"""
+        if idle_for < PING_AFTER_IDLE:
+            return True
+        with self._lock:
+            self._stats["pings"] += 1
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            pass
+        try:
+            conn.reconnect(attempts=1, delay=0)
+            with self._lock:
+                self._stats["reconnects"] += 1
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Take a connection from the pool, opening a new one if allowed"""
+        start = time.perf_counter()
+        conn = None
+        while conn is None:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._open < self.size
+                    if can_open:
+                        self._open += 1
+                if can_open:
+                    try:
+                        conn = self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._open -= 1
+                        raise
+                    break
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    raise TimeoutError(f"No database connection available after {self.timeout}s")
+                try:
+                    conn, released_at = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+            if self._healthy(conn, time.monotonic() - released_at):
+                with self._lock:
+                    self._stats["reused"] += 1
+            else:
+                self._discard(conn)
+                conn = None
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._stats["acquired"] += 1
+            self._stats["wait_total_s"] += waited
+            self._stats["wait_max_s"] = max(self._stats["wait_max_s"], waited)
+        return conn
+
+    def release(self, conn, broken=False):
+        """Return a connection to the pool (or drop it if it is broken)"""
+        if broken:
+            self._discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+            self._stats["discarded"] += 1
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._open -= 1
+
+    def stats(self):
+        """Snapshot of pool counters; `created` vs `acquired` shows handshake savings"""
+        with self._lock:
+            s = dict(self._stats)
+            s["open"] = self._open
+        s["idle"] = self._idle.qsize()
+        s["wait_avg_s"] = s["wait_total_s"] / s["acquired"] if s["acquired"] else 0.0
+        s["handshakes_saved"] = s["acquired"] - s["created"]
+        return s
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"acquired={s['acquired']} created={s['created']} reused={s['reused']} "
+                f"reconnects={s['reconnects']} discarded={s['discarded']} "
+                f"wait_avg={s['wait_avg_s']*1000:.1f}ms wait_max={s['wait_max_s']*1000:.1f}ms")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide shared pool built from the DB_* environment variables"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
@@ -0,0 +1,572 @@
+import argparse
+import asyncio
+import math
+import os
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+from playwright.async_api import async_playwright
+
+from db_pool import get_pool
+from network_policy import get_policy, install_policy
+from failure_artifacts import ArtifactCollector
+from retry_queue import DEFER, CircuitBreaker, run_queue
+from browser_supervisor import BrowserSupervisor
+from browser_profile import PERSISTENT_PROFILE, CacheMeter, profile_dir
+from concurrency_tuner import ConcurrencyTuner, load_state
+from spool import Drainer, drain, get_spool
+from schedule import CyclePlan
+import profiling
+
+load_dotenv()
+
+STOCK_FILE = os.getenv("STOCK_FILE", "daftar 10 saham.xlsx")
+ENGINE_SOURCES = os.getenv("ENGINE_SOURCES", "ajaib,ipot")
+# Global fleet size shared by every source (was 2 browsers per scraper process)
+ENGINE_BROWSERS = int(os.getenv("ENGINE_BROWSERS", "4"))
+ENGINE_PAGES_PER_BROWSER = int(os.getenv("ENGINE_PAGES_PER_BROWSER", "5"))
+# ENGINE_AUTOTUNE=1: pages in flight follow throughput/error rate, browsers carry over between cycles
+# (unless a browser count is passed explicitly, e.g. -b)
+ENGINE_AUTOTUNE = os.getenv("ENGINE_AUTOTUNE", "1") == "1"
+ENGINE_MAX_BROWSERS = int(os.getenv("ENGINE_MAX_BROWSERS", "8"))
+ENGINE_MAX_PAGES_PER_BROWSER = int(os.getenv("ENGINE_MAX_PAGES_PER_BROWSER", "10"))
+HEADLESS = os.getenv("HEADLESS", "1") != "0"
+# Distinct tickers failing structurally, with no success in between, before a source is aborted:
+# at least STRUCTURAL_ABORT_TICKERS, and at least this share of the pages that can be in flight
+STRUCTURAL_ABORT_TICKERS = int(os.getenv("STRUCTURAL_ABORT_TICKERS", "3"))
+STRUCTURAL_ABORT_SHARE = float(os.getenv("STRUCTURAL_ABORT_SHARE", "0.5"))
+# Re-logins after a session-expired trip, with no success in between, before a source gives up
+SESSION_MAX_RELOGINS = int(os.getenv("SESSION_MAX_RELOGINS", "2"))
+
+
+# ============================================================
+# EXTRACTION FAILURES
+# ============================================================
+class EmptyMarket(Exception):
+    """The orderbook rendered but there is nothing to read (suspended stock, empty pre-open book)"""
+
+
+class StructuralChange(Exception):
+    """The page no longer looks like the source expects (DOM / class-hash change): every ticker will fail"""
+
+    def __init__(self, message, selector=None):
+        super().__init__(message)
+        self.selector = selector
+
+
+def failure_kind(error):
+    """empty / structural / transient; only transient failures are worth a retry"""
+    if isinstance(error, EmptyMarket):
+        return "empty"
+    if isinstance(error, StructuralChange):
+        return "structural"
+    return "transient"
+
+
+class StructuralGuard:
+    """Aborts a source once several tickers fail structurally with no success in between.
+
+    Sources only report a structural failure after reloading the page once.
+    Even so, a burst of slow pages can finish together, so the threshold
+    grows with the number of pages in flight (see `scale`); that many
+    different tickers in a row means the DOM changed, and the rest of the
+    cycle would only burn retries against it.
+    """
+
+    def __init__(self, name, threshold=STRUCTURAL_ABORT_TICKERS):
+        self.name = name
+        self.threshold = threshold
+        self.failures = {}  # kode -> failed result since the last success
+        self.aborted = None
+
+    def scale(self, concurrency):
+        self.threshold = max(STRUCTURAL_ABORT_TICKERS, math.ceil(concurrency * STRUCTURAL_ABORT_SHARE))
+
+    def record_success(self):
+        self.failures.clear()
+
+    def abort(self, reason):
+        """Stop the source for the rest of the cycle for a reason other than the DOM"""
+        if not self.aborted:
+            self.aborted = reason
+            print(f"\n[ABORT] {self.name}: {reason}, skipping the rest of this cycle\n")
+
+    def record(self, kode, result, artifact_dir):
+        self.failures[kode] = result
+        if self.aborted or len(self.failures) < self.threshold:
+            return
+        self.aborted = result["error"]
+        selectors = sorted({r.get("selector") for r in self.failures.values() if r.get("selector")})
+        print(f"\n[ABORT] {self.name}: {len(self.failures)} tickers failed structurally with no success "
+              f"in between, skipping the rest of this cycle")
+        print(f"[ABORT]   last error : {result['error']}")
+        if selectors:
+            print(f"[ABORT]   selector   : {', '.join(selectors)}")
+        print(f"[ABORT]   tickers    : {', '.join(self.failures)}")
+        print(f"[ABORT]   artifacts  : {artifact_dir} (screenshot + HTML of the first failures)")
+        print(f"[ABORT]   check the selectors in source_{self.name}.py against the live page\n")
+
+
+# ============================================================
+# SOURCE PLUGIN
+# ============================================================
+class Source:
+    """A broker plugin: how to log in, open a ticker and read its orderbook.
+
+    The engine owns browsers, scheduling, retries and writing; a source only
+    fills in `login`, `extract` and `to_rows`.
+    """
+
+    name = None
+    table = None
+    max_retries = 3
+
+    def __init__(self):
+        self.policy = get_policy(self.name)
+        self.context_kwargs = {}
+        self.spool = None  # set by run(); successful tickers are spooled as they finish
+        # Sampled, quota-bounded screenshot/HTML/console capture for failed attempts
+        self.artifacts = ArtifactCollector(self.name)
+        # Pauses this source only; the other keeps the fleet busy
+        self.breaker = CircuitBreaker(self.name)
+        self.cache_meter = CacheMeter(self.name, "persistent" if PERSISTENT_PROFILE else "fresh")
+        self.guard = StructuralGuard(self.name)
+        # Set when an attempt finds the login gone; the next attempt (the breaker's probe) logs in again
+        self.session_expired = False
+        self.logins = 0
+        self.relogins = 0  # since the last success
+        self._login_lock = asyncio.Lock()
+
+    async def login(self, playwright):
+        """Prepare `context_kwargs` (e.g. a storage_state) before the run"""
+
+    async def extract(self, page, kode):
+        """Open `kode` on `page` and return its orderbook.
+
+        Raise EmptyMarket when the book is legitimately empty and
+        StructuralChange when the page layout is not what the source expects;
+        anything else is treated as transient and retried.
+        """
+        raise NotImplementedError
+
+    def is_success(self, data):
+        return bool(data)
+
+    def session_lost(self, error):
+        """True when `error` means the login no longer works (the engine trips the breaker and re-logs in)"""
+        return False
+
+    def on_failure(self, kode, error):
+        """Hook for source-wide reactions to a failed attempt"""
+
+    def to_rows(self, results):
+        """Successful results -> (orderbook rows, summaries)"""
+        raise NotImplementedError
+
+
+def load_codes(path=STOCK_FILE):
+    df = pd.read_excel(path)
+    if "Kode" not in df.columns:
+        raise ValueError(f"Column 'Kode' not found in {path}")
+    codes = df["Kode"].dropna().astype(str).str.strip().tolist()
+    if not codes:
+        raise ValueError(f"No codes found in column 'Kode' of {path}")
+    print(f"[INFO] Loaded {len(codes)} codes from {path}")
+    return codes
+
+
+def load_priorities(path=STOCK_FILE):
+    """Optional 'Priority' column (higher scrapes first, never deferred early); {} without one"""
+    df = pd.read_excel(path)
+    if "Priority" not in df.columns:
+        return {}
+    df = df.dropna(subset=["Kode"])
+    return {str(k).strip(): int(p) for k, p in zip(df["Kode"], df["Priority"]) if pd.notna(p)}
+
+
+def split_list(lst, n):
+    """Split list into n chunks"""
+    k, m = divmod(len(lst), n)
+    return [lst[i*k+min(i, m):(i+1)*k+min(i+1, m)] for i in range(n)]
+
+
+# ============================================================
+# WRITER
+# ============================================================
+def push_rows(table_name, rows, summaries=None, spool_name="engine"):
+    """Spool rows (and their per-snapshot summaries) durably, then drain what MySQL will take now"""
+    if not rows:
+        print(f"[WARN] No rows to insert into '{table_name}'")
+        return
+
+    spool = get_spool(spool_name)
+    spool.append(table_name, rows, summaries)
+    stats = drain(spool, seal=True)
+    if stats["error"]:
+        print(f"[WARN] DB unavailable, {len(rows)} rows for '{table_name}' kept in spool: {stats['error']} "
+              f"({spool.format_backlog()})")
+    else:
+        print(f"[SUCCESS] Inserted {stats['rows']} rows into DB (+{len(summaries or [])} summaries), "
+              f"{spool.format_backlog()}")
+
+
+def spool_result(source, data):
+    """Durably queue one ticker's rows for the background drainer"""
+    try:
+        rows, summaries = source.to_rows([data])
+        if rows:
+            source.spool.append(source.table, rows, summaries)
+    except Exception as e:
+        print(f"[ERROR] [{source.name}] could not spool rows: {e}")
+
+
+# ============================================================
+# BROWSER FLEET
+# ============================================================
+def _merge_storage_states(states):
+    cookies, origins = [], []
+    for state in states:
+        cookies.extend(state.get("cookies", []))
+        origins.extend(state.get("origins", []))
+    return {"cookies": cookies, "origins": origins}
+
+
+class Fleet:
+    """Supervised browsers shared by all sources, with a global page budget"""
+
+    def __init__(self, playwright, browsers=ENGINE_BROWSERS, pages_per_browser=ENGINE_PAGES_PER_BROWSER,
+                 tuner_key=None):
+        self.playwright = playwright
+        self.size = max(1, browsers)
+        self.pages_per_browser = max(1, pages_per_browser)
+        self.supervisors = []
+        default = self.size * self.pages_per_browser
+        if tuner_key:
+            self.tuner = ConcurrencyTuner.from_state(
+                tuner_key, default, max_limit=self.size * max(ENGINE_MAX_PAGES_PER_BROWSER, self.pages_per_browser))
+        else:
+            self.tuner = ConcurrencyTuner("fixed", default, min_limit=default, max_limit=default)
+        self.tuner_key = tuner_key
+        # Upper bound of pages in flight; the tuner decides how much of it is used
+        self.capacity = self.tuner.max_limit
+
+    async def start(self, storage_states=()):
+        # Persistent profiles cannot take a per-context storage_state, so every login is seeded once
+        storage_state = _merge_storage_states(storage_states) if PERSISTENT_PROFILE else None
+        for i in range(self.size):
+            supervisor = BrowserSupervisor(
+                self.playwright, f"Browser-{i+1}", {"headless": HEADLESS},
+                user_data_dir=profile_dir("engine", i + 1) if PERSISTENT_PROFILE else None,
+                storage_state=storage_state,
+            )
+            self.supervisors.append(await supervisor.start())
+        print(f"[BROWSER] Fleet: {self.size} browsers x {self.pages_per_browser} pages")
+        return self
+
+    async def reseed(self, storage_state):
+        """Hand a re-login to persistent profiles; fresh contexts read context_kwargs per ticker"""
+        if not storage_state:
+            return
+        for supervisor in self.supervisors:
+            await supervisor.reseed(storage_state)
+
+    def _pick(self):
+        # Least loaded browser that is not draining for a recycle
+        return min(self.supervisors, key=lambda s: (not s.accepting, s.in_flight))
+
+    async def attempt(self, fn):
+        """Run `fn(slot)` on the least loaded browser; returns (result, lost)"""
+        async with self.tuner.slot():
+            supervisor = self._pick()
+            start = time.perf_counter()
+            async with supervisor.slot() as slot:
+                result = await fn(slot)
+                lost = slot.lost
+                slot.succeeded = result["success"]
+            if not lost:
+                error = result.get("error") or ""
+                # An empty market is not a sign of overload
+                ok = result["success"] or result.get("kind") == "empty"
+                self.tuner.record(time.perf_counter() - start, ok, timeout="Timeout" in error)
+            return result, lost
+
+    async def close(self):
+        if self.tuner_key:
+            self.tuner.save(self.tuner.suggest_browsers(self.size, self.pages_per_browser, ENGINE_MAX_BROWSERS))
+        for supervisor in self.supervisors:
+            print(f"[SUPERVISOR] {supervisor.name}: {supervisor.format_stats()}")
+            await supervisor.close()
+
+
+# ============================================================
+# SCHEDULER
+# ============================================================
+async def scrape_in_slot(source, slot, kode):
+    """Single attempt on a fresh context (or page of the shared profile)"""
+    context = None
+    page = None
+    console = None
+    traced = False
+    ok = False
+    try:
+        context = await slot.new_context(**source.context_kwargs)
+        # A persistent profile's context is shared by concurrent pages, so only fresh ones are traced
+        traced = not PERSISTENT_PROFILE and await profiling.start_trace(context, kode)
+        page = await context.new_page()
+        console = source.artifacts.watch_console(page)
+        if source.cache_meter.enabled:
+            await source.cache_meter.attach(page)
+        await install_policy(page, source.policy, keep_cache=PERSISTENT_PROFILE)
+        data = await source.extract(page, kode)
+        if not source.is_success(data):
+            raise Exception("Extraction returned no orderbook rows")
+        ok = True
+        return {"success": True, "kode": kode, "data": data, "error": None}
+    except Exception as e:
+        kind = failure_kind(e)
+        if kind != "empty":
+            try:
+                await source.artifacts.capture(page, kode, e, console)
+            except Exception as art_err:
+                print(f"[WARN] {kode} failed to capture artifacts: {art_err}")
+        return {"success": False, "kode": kode, "data": None, "error": str(e), "kind": kind,
+                "selector": getattr(e, "selector", None)}
+    finally:
+        if traced:
+            await profiling.stop_trace(context, kode, ok)
+        if context:
+            try:
+                await context.close()
+            except Exception:
+                pass
+
+
+async def login_source(playwright, source):
+    await source.login(playwright)
+    source.logins += 1
+
+
+async def renew_session(fleet, source):
+    """Log in again after a session-expired trip; False if the login failed or the source gave up"""
+    async with source._login_lock:
+        if not source.session_expired:
+            return True  # renewed by another attempt while this one waited
+        if source.relogins >= SESSION_MAX_RELOGINS:
+            source.guard.abort(f"session still expired after {source.relogins} re-logins")
+            return False
+        source.relogins += 1
+        print(f"[AUTH] [{source.name}] session expired, logging in again "
+              f"({source.relogins}/{SESSION_MAX_RELOGINS})")
+        try:
+            await login_source(fleet.playwright, source)
+            await fleet.reseed(source.context_kwargs.get("storage_state"))
+        except Exception as e:
+            print(f"[AUTH] [{source.name}] re-login failed: {e}")
+            return False
+        source.session_expired = False
+        return True
+
+
+def _aborted(source, kode):
+    return DEFER, {"success": False, "kode": kode, "data": None, "aborted": True,
+                   "error": f"Skipped: {source.name} aborted ({source.guard.aborted})"}
+
+
+async def scrape_attempt(fleet, source, kode, attempt, plan=None):
+    """One attempt for the retry queue; backoff happens outside the page slot"""
+    if source.guard.aborted:
+        return _aborted(source, kode)
+    if source.session_expired and not await renew_session(fleet, source):
+        if source.guard.aborted:
+            return _aborted(source, kode)
+        # Fails the breaker's probe, so it waits another cooldown before the next login
+        return False, {"success": False, "kode": kode, "data": None, "kind": "transient",
+                       "error": "Session expired and re-login failed"}
+    reason = plan.should_defer(kode) if plan else None
+    if reason:
+        return DEFER, {"success": False, "kode": kode, "data": None, "error": reason, "deferred": True}
+    logins = source.logins
+    result, lost = await fleet.attempt(lambda slot: scrape_in_slot(source, slot, kode))
+    if result["success"]:
+        source.relogins = 0
+        source.guard.record_success()
+        if plan:
+            plan.record_success(source.name, kode)
+        if source.spool is not None:
+            # Local fsync'd append; MySQL latency never holds up the next ticker
+            await asyncio.to_thread(spool_result, source, result["data"])
+        if attempt > 1:
+            print(f"[SUCCESS] [{source.name}] {kode} succeeded on attempt {attempt}")
+        return True, result
+    if lost:
+        # Browser crashed under this page: requeue without spending a retry
+        print(f"[SUPERVISOR] [{source.name}] {kode} requeued, browser was lost mid-scrape")
+        return None, result
+    if result["kind"] == "empty":
+        # Nothing to retry: a suspended or not-yet-open book stays empty for the whole cycle
+        print(f"[INFO] [{source.name}] {kode} empty market, recorded without retry: {result['error']}")
+        return DEFER, dict(result, empty=True)
+    if result["kind"] == "structural":
+        source.guard.record(kode, result, source.artifacts.root)
+        if source.guard.aborted:
+            return DEFER, dict(result, aborted=True)
+    # Attempts that started on an older login say nothing about the current one
+    if source.session_lost(result["error"]) and logins == source.logins:
+        source.session_expired = True
+        source.breaker.trip("session expired")
+    source.on_failure(kode, result["error"])
+    if attempt >= source.max_retries:
+        print(f"[ERROR] [{source.name}] {kode} failed after {source.max_retries} attempts: {result['error']}")
+    return False, result
+
+
+async def run_source(fleet, source, codes, plan=None):
+    """Scrape every code of one source on the shared fleet"""
+    if plan:
+        # Highest priority, then stalest first: what a late cycle defers leads the next one
+        codes = plan.order(source.name, codes)
+    print(f"[INFO] [{source.name}] {len(codes)} tickers queued")
+    source.guard.scale(fleet.capacity)
+    # Concurrency is bounded by the fleet's page budget, not per source
+    results = await run_queue(
+        codes,
+        lambda kode, attempt: scrape_attempt(fleet, source, kode, attempt, plan),
+        concurrency=fleet.capacity,
+        max_retries=source.max_retries,
+        breaker=source.breaker,
+        label=source.name,
+    )
+    success, failed = [], []
+    for r in results:
+        if isinstance(r, Exception):
+            failed.append({"kode": "unknown", "error": str(r)})
+        elif r["success"]:
+            success.append(r["data"])
+        else:
+            failed.append({"kode": r["kode"], "error": r["error"], "deferred": r.get("deferred", False),
+                           "empty": r.get("empty", False), "aborted": r.get("aborted", False)})
+    empty = sum(f.get("empty", False) for f in failed)
+    print(f"[SUCCESS] [{source.name}] done: {len(success)}/{len(codes)} success"
+          + (f", {empty} empty markets" if empty else "")
+          + (f", ABORTED: {source.guard.aborted}" if source.guard.aborted else ""))
+    return success, failed
+
+
+async def run(playwright, sources, codes, browsers=None, pages_per_browser=ENGINE_PAGES_PER_BROWSER,
+              write=True, plan=None):
+    """Scrape `codes` for every source concurrently on one fleet.
+
+    `codes` is a list shared by all sources or a {source name: codes} dict.
+    With a `plan` (schedule.CyclePlan) tickers are ordered and deferred
+    against its deadline. An explicit `browsers` is always honoured; with
+    None the autotuner's saved count is used (ENGINE_BROWSERS without one).
+    Returns {source name: (success, failed)}.
+    """
+    run_key = "+".join(s.name for s in sources)
+    tuner_key = None
+    if ENGINE_AUTOTUNE:
+        tuner_key = run_key
+        if browsers is None:
+            # Browser count is fixed within a run, so the tuner's suggestion applies from the next cycle
+            browsers = min(load_state(tuner_key).get("browsers", ENGINE_BROWSERS), ENGINE_MAX_BROWSERS)
+    if browsers is None:
+        browsers = ENGINE_BROWSERS
+    for source in sources:
+        await login_source(playwright, source)
+    drainer = None
+    if write:
+        # Spooled batches (including any left over from a previous cycle) drain while we scrape
+        spool = get_spool(run_key)
+        for source in sources:
+            source.spool = spool
+        drainer = Drainer(spool).start()
+    async with profiling.profile_run(run_key):
+        fleet = await Fleet(playwright, browsers, pages_per_browser, tuner_key).start(
+            [s.context_kwargs["storage_state"] for s in sources if s.context_kwargs.get("storage_state")]
+        )
+        try:
+            per_source = await asyncio.gather(*(
+                run_source(fleet, s, codes[s.name] if isinstance(codes, dict) else codes, plan) for s in sources
+            ))
+        finally:
+            await fleet.close()
+            if drainer:
+                await drainer.stop()
+
+    outcome = {}
+    for source, (success, failed) in zip(sources, per_source):
+        source.cache_meter.report()
+        await source.artifacts.close()
+        outcome[source.name] = (success, failed)
+    if write:
+        print(f"[INFO] DB pool: {get_pool().format_stats()}")
+    if plan:
+        plan.report(outcome)
+    return outcome
+
+
+def load_sources(names):
+    from source_ajaib import AjaibSource
+    from source_ipot import IpotSource
+
+    registry = {"ajaib": AjaibSource, "ipot": IpotSource}
+    unknown = [n for n in names if n not in registry]
+    if unknown:
+        raise ValueError(f"Unknown source(s) {unknown}, expected some of {list(registry)}")
+    return [registry[n]() for n in names]
+
+
+# ============================================================
+# MAIN
+# ============================================================
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape orderbooks for several brokers on one browser fleet.")
+    parser.add_argument("-s", "--sources", default=ENGINE_SOURCES, help="Comma separated sources (default: %(default)s)")
+    parser.add_argument("-b", "--browsers", type=int, default=None,
+                        help=f"Total browsers in the fleet (default: autotuned, or {ENGINE_BROWSERS})")
+    parser.add_argument("-p", "--pages", type=int, default=ENGINE_PAGES_PER_BROWSER, help="Concurrent pages per browser")
+    parser.add_argument("-f", "--stock-file", default=STOCK_FILE, help="Excel file with a 'Kode' column")
+    parser.add_argument("-d", "--deadline", type=float, default=None,
+                        help="Epoch seconds by which the cycle should be done (set by worker.py)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample stacks into a flame graph, log loop lag and trace a sample of tickers "
+                             "(same as PROFILE=1)")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    if args.profile:
+        profiling.enable()
+    sources = load_sources([s.strip() for s in args.sources.split(",") if s.strip()])
+    codes = load_codes(args.stock_file)
+    plan = CyclePlan(args.deadline, load_priorities(args.stock_file))
+
+    print(f"{'='*60}")
+    print(f"Orderbook Engine - {', '.join(s.name for s in sources)}")
+    print(f"Targets: {len(codes)} | Browsers: {args.browsers or 'auto'} | Pages/browser: {args.pages}")
+    print(f"{'='*60}\n")
+
+    start = time.time()
+    async with async_playwright() as p:
+        outcome = await run(p, sources, codes, args.browsers, args.pages, plan=plan)
+    elapsed = time.time() - start
+
+    print(f"\n{'='*60}")
+    print("SUMMARY")
+    print(f"Time: {elapsed:.2f}s ({elapsed/60:.2f} min)")
+    for name, (success, failed) in outcome.items():
+        print(f"[{name}] Success: {len(success)}/{len(codes)} | Failed: {len(failed)}")
+        if failed:
+            sample = ", ".join(f["kode"] for f in failed[:10])
+            extra = f" ... +{len(failed) - 10} more" if len(failed) > 10 else ""
+            print(f"   Failed samples: {sample}{extra}")
+    print(f"{'='*60}\n")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n[STOPPED] Stopped by user")
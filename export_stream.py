@@ -0,0 +1,124 @@
+import csv
+import gzip
+import time
+from decimal import Decimal
+
+EXPORT_CHUNK_SIZE = 50000
+EXPORT_FORMATS = ("csv", "csv.gz", "parquet")
+
+
+def _open_text(path, fmt):
+    if fmt == "csv.gz":
+        return gzip.open(path, "wt", newline="", encoding="utf-8", compresslevel=6)
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+def _write_csv(cursor, path, fmt, columns, chunk_size, progress):
+    total = 0
+    with _open_text(path, fmt) as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            writer.writerows(chunk)
+            total += len(chunk)
+            if progress:
+                progress(total)
+    return total
+
+
+def _parquet_schema(pa, description, columns):
+    """Arrow schema from the cursor's column metadata, so every chunk (and an empty result) agrees"""
+    from mysql.connector import FieldType
+
+    int_types = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.INT24,
+                 FieldType.LONGLONG, FieldType.YEAR}
+    # DECIMAL columns (prices) are exported as float64
+    float_types = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+    fields = []
+    for name, col in zip(columns, description):
+        type_code = col[1]
+        if type_code in int_types:
+            arrow_type = pa.int64()
+        elif type_code in float_types:
+            arrow_type = pa.float64()
+        elif type_code in (FieldType.DATETIME, FieldType.TIMESTAMP):
+            arrow_type = pa.timestamp("us")
+        elif type_code in (FieldType.DATE, FieldType.NEWDATE):
+            arrow_type = pa.date32()
+        elif type_code == FieldType.TIME:
+            arrow_type = pa.duration("us")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _write_parquet(cursor, path, columns, chunk_size, progress):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from e
+
+    schema = _parquet_schema(pa, cursor.description, columns)
+    total = 0
+    # Opened before the first fetch, so an empty result still produces a valid (empty) file
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            arrays = []
+            for field, values in zip(schema, zip(*chunk)):
+                if pa.types.is_floating(field.type):
+                    values = [float(v) if isinstance(v, Decimal) else v for v in values]
+                elif pa.types.is_string(field.type):
+                    values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+                arrays.append(pa.array(values, field.type))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            total += len(chunk)
+            if progress:
+                progress(total)
+    return total
+
+
+def stream_query_to_file(conn, query, params, path, columns, fmt="csv",
+                         chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """Run `query` on an unbuffered cursor and stream the result to `path` in chunks.
+
+    Only one chunk is held in memory at a time, so the export size is bounded by
+    disk, not RAM. `progress(rows_written)` is called after every chunk.
+    Returns (rows_written, elapsed_seconds).
+
+    If the export fails mid-stream the unread rows are still pending on
+    `conn`, so it is closed before the error is re-raised; a pool must discard
+    it rather than hand out a connection stuck on "Unread result found".
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {EXPORT_FORMATS}")
+
+    start = time.perf_counter()
+    # buffered=False keeps rows on the server until fetched
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(query, params)
+        if fmt == "parquet":
+            total = _write_parquet(cursor, path, columns, chunk_size, progress)
+        else:
+            total = _write_csv(cursor, path, fmt, columns, chunk_size, progress)
+    except BaseException:
+        # Draining the rest of a large result could take longer than the export itself
+        try:
+            conn.close()
+        except Exception:
+            pass
+        raise
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+    return total, time.perf_counter() - start
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import random
+import re
+import stat
+import threading
+import uuid
+from datetime import datetime
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "error_screenshots")
+ARTIFACT_QUOTA_MB = float(os.getenv("ARTIFACT_QUOTA_MB", "200"))
+ARTIFACT_PER_CLASS = int(os.getenv("ARTIFACT_PER_CLASS", "3"))  # always kept per error class per run
+ARTIFACT_SAMPLE_RATE = float(os.getenv("ARTIFACT_SAMPLE_RATE", "0.01"))  # beyond that
+CONSOLE_BUFFER = 200
+INDEX_FILE = "index.jsonl"
+QUOTA_CHECK_EVERY = 20  # writes between in-run quota checks
+# Index appends (worker threads of every source's collector) vs. the quota's rewrite
+_index_lock = threading.Lock()
+
+
+def classify_error(error):
+    """Collapse an error message into a stable class ('timeout #ms exceeded', ...)"""
+    text = str(error).splitlines()[0] if str(error) else type(error).__name__
+    text = re.sub(r"https?://\S+", "<url>", text.lower())
+    text = re.sub(r"\d+", "#", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text[:80] or "unknown"
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text).strip("-")[:40] or "error"
+
+
+# ============================================================
+# COLLECTOR
+# ============================================================
+class ArtifactCollector:
+    """Sampled screenshot/HTML/console capture with async writes and a disk quota.
+
+    The first `per_class` failures of each error class in a run are captured,
+    later ones only with probability `sample_rate`. Files are written off the
+    event loop and the oldest artifacts are rotated out once `quota_mb` is hit;
+    the index counts towards the quota and forgets rotated-out artifacts.
+    """
+
+    def __init__(self, source, root=ARTIFACT_DIR, quota_mb=ARTIFACT_QUOTA_MB,
+                 per_class=ARTIFACT_PER_CLASS, sample_rate=ARTIFACT_SAMPLE_RATE):
+        self.source = source
+        self.root = root
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        self.per_class = per_class
+        self.sample_rate = sample_rate
+        self.run_id = f"{source}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.counts = {}  # error class -> {"seen", "captured"}
+        self._writes = set()
+        self._written = 0
+
+    def watch_console(self, page):
+        """Start buffering console messages of `page`; returns the buffer"""
+        buffer = []
+
+        def on_console(msg):
+            if len(buffer) < CONSOLE_BUFFER:
+                buffer.append(f"[{msg.type}] {msg.text}")
+
+        page.on("console", on_console)
+        page.on("pageerror", lambda err: buffer.append(f"[pageerror] {err}") if len(buffer) < CONSOLE_BUFFER else None)
+        return buffer
+
+    def _should_capture(self, error_class):
+        c = self.counts.setdefault(error_class, {"seen": 0, "captured": 0})
+        c["seen"] += 1
+        if c["captured"] < self.per_class or random.random() < self.sample_rate:
+            c["captured"] += 1
+            return True
+        return False
+
+    async def capture(self, page, kode, error, console=None):
+        """Grab artifacts for a failed attempt if this error class is sampled"""
+        error_class = classify_error(error)
+        if page is None or not self._should_capture(error_class):
+            return
+        try:
+            png = await page.screenshot(timeout=5000)
+        except Exception:
+            png = None
+        try:
+            html = await page.content()
+        except Exception:
+            html = None
+        record = {
+            "run": self.run_id,
+            "source": self.source,
+            "kode": kode,
+            "class": error_class,
+            "error": str(error)[:500],
+            "url": page.url if not page.is_closed() else None,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        }
+        task = asyncio.ensure_future(asyncio.to_thread(self._write, record, png, html, list(console or [])))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    # ---------------- worker thread ----------------
+    def _write(self, record, png, html, console):
+        os.makedirs(self.root, exist_ok=True)
+        # Format: KODE_HHMMSS_<id>_<class>; the id keeps same-second failures of one class apart
+        stem = f"{record['kode']}_{datetime.now().strftime('%H%M%S')}_{uuid.uuid4().hex[:8]}_{_slug(record['class'])}"
+        files = []
+        if png:
+            files.append(self._dump(f"{stem}.png", png))
+        if html:
+            files.append(self._dump(f"{stem}.html", html.encode("utf-8", errors="replace")))
+        if console:
+            files.append(self._dump(f"{stem}.console.txt", "\n".join(console).encode("utf-8", errors="replace")))
+        record["files"] = files
+        with _index_lock, open(os.path.join(self.root, INDEX_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        self._written += 1
+        if self._written % QUOTA_CHECK_EVERY == 0:
+            self._enforce_quota()
+
+    def _dump(self, name, data):
+        with open(os.path.join(self.root, name), "wb") as f:
+            f.write(data)
+        return name
+
+    def _enforce_quota(self):
+        if not os.path.isdir(self.root):
+            return 0
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            # Another collector's temp index: about to replace index.jsonl, not an artifact
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # rotated out by another source's collector since listdir
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            total += st.st_size
+            if name != INDEX_FILE:
+                entries.append((st.st_mtime, st.st_size, path))
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.quota_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                total -= size  # another collector rotated it out first
+            except OSError:
+                pass
+        self._trim_index()
+        return removed
+
+    def _trim_index(self):
+        """Drop index records whose artifacts are all gone, so the index shrinks with them"""
+        path = os.path.join(self.root, INDEX_FILE)
+        with _index_lock:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    lines = f.readlines()
+            except OSError:
+                return
+            kept = []
+            for line in lines:
+                try:
+                    files = json.loads(line).get("files") or []
+                except ValueError:
+                    continue
+                if any(os.path.exists(os.path.join(self.root, name)) for name in files):
+                    kept.append(line)
+            if len(kept) == len(lines):
+                return
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+            os.replace(tmp, path)
+
+    async def close(self):
+        """Flush pending writes, rotate old artifacts and print the run summary"""
+        if self._writes:
+            await asyncio.gather(*list(self._writes), return_exceptions=True)
+        removed = await asyncio.to_thread(self._enforce_quota)
+        if not self.counts:
+            return
+        summary = {
+            "run": self.run_id,
+            "classes": self.counts,
+            "rotated_out": removed,
+        }
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, f"run_{self.run_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"[ARTIFACT] {self.run_id}: failures by class (captured/seen):")
+        for error_class, c in sorted(self.counts.items(), key=lambda kv: -kv[1]["seen"]):
+            print(f"   {c['captured']:>3}/{c['seen']:<5} {error_class}")
+        if removed:
+            print(f"[ARTIFACT] Rotated out {removed} old files to stay under {self.quota_bytes // 1024 // 1024}MB")
@@ -1,26 +1,44 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import mysql.connector
 import pandas as pd
 from dotenv import load_dotenv
-import os
 from datetime import datetime
 
+from db_pool import get_pool
+from export_stream import EXPORT_FORMATS, stream_query_to_file
+
 load_dotenv()
 
+# (query column, tree column id, heading, width, anchor)
+LEVEL_COLUMNS = [
+    ("kode", "Code", "Stock Code", 80, tk.CENTER),
+    ("side", "Side", "Side", 60, tk.CENTER),
+    ("price", "Price", "Price", 100, tk.E),
+    ("lot", "Lot", "Lot", 100, tk.E),
+    ("num", "Num", "Number", 80, tk.CENTER),
+    ("timestamp", "Timestamp", "Timestamp", 180, tk.CENTER),
+]
+SUMMARY_COLUMNS = [
+    ("kode", "Code", "Stock Code", 80, tk.CENTER),
+    ("best_bid", "BestBid", "Best Bid", 90, tk.E),
+    ("best_ask", "BestAsk", "Best Ask", 90, tk.E),
+    ("spread_ticks", "SpreadTicks", "Spread (ticks)", 90, tk.CENTER),
+    ("bid_lot_total", "BidLots", "Bid Lots", 100, tk.E),
+    ("ask_lot_total", "AskLots", "Ask Lots", 100, tk.E),
+    ("imbalance_top5", "Imbalance", "Top-5 Imbalance", 100, tk.E),
+    ("reported_bid_lot", "RepBid", "Reported Bid Lot", 110, tk.E),
+    ("reported_ask_lot", "RepAsk", "Reported Ask Lot", 110, tk.E),
+    ("timestamp", "Timestamp", "Timestamp", 160, tk.CENTER),
+]
+
 class StockFilterGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Stock Price Filter")
         self.root.geometry("1200x700")
         
-        # Database connection parameters
-        self.db_config = {
-            'host': os.getenv('DB_HOST'),
-            'user': os.getenv('DB_USER'),
-            'password': os.getenv('DB_PASSWORD'),
-            'database': os.getenv('DB_NAME')
-        }
+        # Shared connection pool (reused across filters instead of reconnecting)
+        self.pool = get_pool()
         
         self.create_widgets()
         
@@ -54,6 +72,16 @@ class StockFilterGUI:
         ttk.Radiobutton(source_frame, text="IPOT", variable=self.source_var, 
                        value="ipot").pack(side=tk.LEFT, padx=5)
         
+        # View selection (raw levels or per-snapshot summary)
+        ttk.Label(filter_frame, text="View:").grid(row=0, column=2, sticky=tk.W, padx=5)
+        self.view_var = tk.StringVar(value="levels")
+        view_frame = ttk.Frame(filter_frame)
+        view_frame.grid(row=0, column=3, sticky=tk.W, padx=5)
+        ttk.Radiobutton(view_frame, text="Levels", variable=self.view_var, value="levels",
+                        command=self.on_view_change).pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(view_frame, text="Summary", variable=self.view_var, value="summary",
+                        command=self.on_view_change).pack(side=tk.LEFT, padx=5)
+        
         # Stock code filter
         ttk.Label(filter_frame, text="Stock Code:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
         self.code_var = tk.StringVar()
@@ -103,9 +131,18 @@ class StockFilterGUI:
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=2, column=0, columnspan=3, pady=10)
         
-        ttk.Button(button_frame, text="Apply Filter", command=self.apply_filter).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="Clear Filter", command=self.clear_filter).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="Export to CSV", command=self.export_csv).pack(side=tk.LEFT, padx=5)
+        # Disabled while a streaming export runs (its progress updates keep the UI clickable)
+        self.action_widgets = []
+        for text, command in (("Apply Filter", self.apply_filter), ("Clear Filter", self.clear_filter),
+                              ("Export to CSV", self.export_csv), ("Export Full (Stream)", self.export_stream)):
+            button = ttk.Button(button_frame, text=text, command=command)
+            button.pack(side=tk.LEFT, padx=5)
+            self.action_widgets.append(button)
+        self.export_format_var = tk.StringVar(value="csv")
+        format_combo = ttk.Combobox(button_frame, textvariable=self.export_format_var,
+                                    values=list(EXPORT_FORMATS), width=8, state="readonly")
+        format_combo.pack(side=tk.LEFT, padx=5)
+        self.action_widgets.append(format_combo)
         
         # Results frame
         results_frame = ttk.LabelFrame(main_frame, text="Results", padding="10")
@@ -118,7 +155,6 @@ class StockFilterGUI:
         tree_scroll_x = ttk.Scrollbar(results_frame, orient=tk.HORIZONTAL)
         
         self.tree = ttk.Treeview(results_frame, 
-                                 columns=("Code", "Side", "Price", "Lot", "Num", "Timestamp"),
                                  show="headings",
                                  yscrollcommand=tree_scroll_y.set,
                                  xscrollcommand=tree_scroll_x.set)
@@ -127,19 +163,7 @@ class StockFilterGUI:
         tree_scroll_x.config(command=self.tree.xview)
         
         # Define columns
-        self.tree.heading("Code", text="Stock Code")
-        self.tree.heading("Side", text="Side")
-        self.tree.heading("Price", text="Price")
-        self.tree.heading("Lot", text="Lot")
-        self.tree.heading("Num", text="Number")
-        self.tree.heading("Timestamp", text="Timestamp")
-        
-        self.tree.column("Code", width=80, anchor=tk.CENTER)
-        self.tree.column("Side", width=60, anchor=tk.CENTER)
-        self.tree.column("Price", width=100, anchor=tk.E)
-        self.tree.column("Lot", width=100, anchor=tk.E)
-        self.tree.column("Num", width=80, anchor=tk.CENTER)
-        self.tree.column("Timestamp", width=180, anchor=tk.CENTER)
+        self.configure_tree_columns()
         
         self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         tree_scroll_y.grid(row=0, column=1, sticky=(tk.N, tk.S))
@@ -154,17 +178,90 @@ class StockFilterGUI:
         # Store current data for export
         self.current_data = None
         
+    def current_columns(self):
+        """Column spec for the selected view"""
+        return SUMMARY_COLUMNS if self.view_var.get() == "summary" else LEVEL_COLUMNS
+    
+    def configure_tree_columns(self):
+        """(Re)build the result grid columns for the selected view"""
+        columns = self.current_columns()
+        self.tree["columns"] = [c[1] for c in columns]
+        for _, col_id, heading, width, anchor in columns:
+            self.tree.heading(col_id, text=heading)
+            self.tree.column(col_id, width=width, anchor=anchor)
+    
+    def on_view_change(self):
+        """Switch between raw levels and summary rows"""
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        self.current_data = None
+        self.configure_tree_columns()
+        self.status_var.set(f"View: {self.view_var.get()}")
+    
     def get_connection(self):
-        """Create database connection"""
+        """Borrow a pooled database connection (give it back with release_connection)"""
         try:
-            conn = mysql.connector.connect(**self.db_config)
-            return conn
+            return self.pool.acquire()
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to connect to database:\n{str(e)}")
             return None
     
-    def build_query(self):
+    def release_connection(self, conn, broken=False):
+        """Return a connection to the pool"""
+        self.pool.release(conn, broken=broken)
+    
+    def build_summary_query(self, apply_limit=True):
+        """Build SQL query against orderbook_summary.
+        
+        Price range applies to both best bid and best ask, lot range to total
+        depth (bid + ask lots). The side filter does not apply to summaries.
+        """
+        cols = ", ".join(c[0] for c in SUMMARY_COLUMNS)
+        query = f"SELECT {cols} FROM orderbook_summary WHERE source = %s"
+        params = [self.source_var.get()]
+        
+        code = self.code_var.get().strip().upper()
+        if code:
+            query += " AND kode = %s"
+            params.append(code)
+        
+        for var, clause, cast in (
+            (self.price_min_var, " AND best_bid >= %s AND best_ask >= %s", float),
+            (self.price_max_var, " AND best_bid <= %s AND best_ask <= %s", float),
+        ):
+            try:
+                value = var.get().strip()
+                if value:
+                    query += clause
+                    params.extend([cast(value)] * 2)
+            except ValueError:
+                pass
+        
+        for var, clause in (
+            (self.lot_min_var, " AND bid_lot_total + ask_lot_total >= %s"),
+            (self.lot_max_var, " AND bid_lot_total + ask_lot_total <= %s"),
+        ):
+            try:
+                value = var.get().strip()
+                if value:
+                    query += clause
+                    params.append(int(value))
+            except ValueError:
+                pass
+        
+        query += " ORDER BY timestamp DESC"
+        
+        limit = self.limit_var.get()
+        if apply_limit and limit != "ALL":
+            query += f" LIMIT {limit}"
+        
+        return query, params
+    
+    def build_query(self, apply_limit=True):
         """Build SQL query based on filters"""
+        if self.view_var.get() == "summary":
+            return self.build_summary_query(apply_limit)
+        
         source = self.source_var.get()
         table = f"orderbook_{source}"
         
@@ -223,7 +320,7 @@ class StockFilterGUI:
         
         # Limit
         limit = self.limit_var.get()
-        if limit != "ALL":
+        if apply_limit and limit != "ALL":
             query += f" LIMIT {limit}"
         
         return query, params
@@ -241,6 +338,8 @@ class StockFilterGUI:
         if not conn:
             return
         
+        cursor = None
+        broken = False
         try:
             query, params = self.build_query()
             cursor = conn.cursor()
@@ -252,28 +351,46 @@ class StockFilterGUI:
             
             # Display results
             for row in results:
-                # Format the data
-                kode, side, price, lot, num, timestamp = row
-                side_text = "BID" if side == "B" else "ASK"
-                price_str = f"{float(price):,.2f}" if price else "N/A"
-                lot_str = f"{lot:,}" if lot else "N/A"
-                timestamp_str = timestamp.strftime("%Y-%m-%d %H:%M:%S") if timestamp else "N/A"
-                
-                self.tree.insert("", tk.END, values=(
-                    kode, side_text, price_str, lot_str, num, timestamp_str
-                ))
+                self.tree.insert("", tk.END, values=self.format_row(row))
             
-            self.status_var.set(f"Found {len(results)} records")
+            self.status_var.set(f"Found {len(results)} records | DB pool: {self.pool.format_stats()}")
             
             if len(results) == 0:
                 messagebox.showinfo("No Results", "No records found matching the filter criteria.")
             
         except Exception as e:
+            broken = not conn.is_connected()
             messagebox.showerror("Query Error", f"Failed to execute query:\n{str(e)}")
             self.status_var.set("Error occurred")
         finally:
-            cursor.close()
-            conn.close()
+            if cursor:
+                cursor.close()
+            self.release_connection(conn, broken=broken)
+    
+    def format_row(self, row):
+        """Format a result row for display"""
+        if self.view_var.get() == "summary":
+            (kode, best_bid, best_ask, spread_ticks, bid_lots, ask_lots,
+             imbalance, rep_bid, rep_ask, timestamp) = row
+            return (
+                kode,
+                f"{float(best_bid):,.2f}" if best_bid is not None else "N/A",
+                f"{float(best_ask):,.2f}" if best_ask is not None else "N/A",
+                spread_ticks if spread_ticks is not None else "N/A",
+                f"{bid_lots:,}" if bid_lots is not None else "N/A",
+                f"{ask_lots:,}" if ask_lots is not None else "N/A",
+                f"{imbalance:+.3f}" if imbalance is not None else "N/A",
+                f"{rep_bid:,}" if rep_bid is not None else "N/A",
+                f"{rep_ask:,}" if rep_ask is not None else "N/A",
+                timestamp.strftime("%Y-%m-%d %H:%M:%S") if timestamp else "N/A",
+            )
+        
+        kode, side, price, lot, num, timestamp = row
+        side_text = "BID" if side == "B" else "ASK"
+        price_str = f"{float(price):,.2f}" if price else "N/A"
+        lot_str = f"{lot:,}" if lot else "N/A"
+        timestamp_str = timestamp.strftime("%Y-%m-%d %H:%M:%S") if timestamp else "N/A"
+        return (kode, side_text, price_str, lot_str, num, timestamp_str)
     
     def clear_filter(self):
         """Clear all filters"""
@@ -300,12 +417,13 @@ class StockFilterGUI:
         
         # Create DataFrame
         df = pd.DataFrame(self.current_data, 
-                         columns=["kode", "side", "price", "lot", "num", "timestamp"])
+                         columns=[c[0] for c in self.current_columns()])
         
         # Generate filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         source = self.source_var.get()
-        filename = f"stock_filter_{source}_{timestamp}.csv"
+        view = "_summary" if self.view_var.get() == "summary" else ""
+        filename = f"stock_filter_{source}{view}_{timestamp}.csv"
         
         try:
             df.to_csv(filename, index=False)
@@ -314,10 +432,50 @@ class StockFilterGUI:
         except Exception as e:
             messagebox.showerror("Export Error", f"Failed to export data:\n{str(e)}")
 
+    def set_actions_enabled(self, enabled):
+        for widget in self.action_widgets:
+            widget.state(["!disabled"] if enabled else ["disabled"])
+
+    def export_stream(self):
+        """Re-run the current filter (without the result limit) and stream it to a file"""
+        fmt = self.export_format_var.get()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        source = self.source_var.get()
+        filename = f"stock_filter_{source}_{timestamp}.{fmt}"
+        
+        conn = self.get_connection()
+        if not conn:
+            return
+        
+        def progress(rows_written):
+            self.status_var.set(f"Exporting... {rows_written:,} rows written to {filename}")
+            self.root.update()
+        
+        broken = False
+        self.set_actions_enabled(False)
+        try:
+            query, params = self.build_query(apply_limit=False)
+            total, elapsed = stream_query_to_file(
+                conn, query, params, filename,
+                columns=[c[0] for c in self.current_columns()],
+                fmt=fmt, progress=progress,
+            )
+            messagebox.showinfo("Export Success", f"{total:,} rows exported to:\n{filename}")
+            self.status_var.set(f"Exported {total:,} rows to {filename} in {elapsed:.1f}s")
+        except Exception as e:
+            # stream_query_to_file closes the connection when it fails mid-stream
+            broken = True
+            messagebox.showerror("Export Error", f"Failed to export data:\n{str(e)}")
+            self.status_var.set("Export failed")
+        finally:
+            self.set_actions_enabled(True)
+            self.release_connection(conn, broken=broken)
+
 def main():
     root = tk.Tk()
     app = StockFilterGUI(root)
     root.mainloop()
+    get_pool().close_all()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
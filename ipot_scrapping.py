@@ -1,13 +1,17 @@
 import asyncio
-import json
 import os
 import time
-from datetime import datetime
 
-import mysql.connector
-import pandas as pd
 from dotenv import load_dotenv
-from playwright.async_api import TimeoutError, async_playwright
+from playwright.async_api import async_playwright
+
+import engine
+from network_policy import get_policy, install_policy, measure_policies
+from readiness import wait_for_book_ready
+from live_stream import BookStreamer, parse_watchlist
+from ipot_ws import capture
+from orderbook_model import rows_from_snapshots, snapshot_from_ipot, snapshot_from_text, summaries_from_snapshots
+from source_ipot import BOOK_URL, PAGE_TIMEOUT, STREAM_SELECTORS, IpotSource, scrape_orderbook
 
 load_dotenv()
 
@@ -17,220 +21,85 @@ STOCK_FILE = os.getenv("STOCK_FILE", "daftar 10 saham.xlsx")
 # Parallel config
 NUM_BROWSERS = 2
 MAX_CONCURRENT_PER_BROWSER = 5
-MAX_RETRIES = 3
-PAGE_TIMEOUT = 30000  # ms
 HEADLESS = True
 
-def load_stock_list():
-    df = pd.read_excel(STOCK_FILE)
-    if "Kode" not in df.columns:
-        raise ValueError(f"Column 'Kode' not found in {STOCK_FILE}")
-    codes = df["Kode"].dropna().astype(str).str.strip().tolist()
-    if not codes:
-        raise ValueError(f"No codes found in column 'Kode' of {STOCK_FILE}")
-    print(f"[INFO] Loaded {len(codes)} codes from {STOCK_FILE}")
-    return codes
+# Network resource policy (see network_policy.py); NETWORK_POLICY_MEASURE=1 compares them all
+NETWORK_POLICY = get_policy("ipot")
+POLICY_MEASURE = os.getenv("NETWORK_POLICY_MEASURE") == "1"
+POLICY_MEASURE_SAMPLE = int(os.getenv("NETWORK_POLICY_SAMPLE", "5"))
 
-STOCK_LIST = load_stock_list()
+# Live streaming mode: keep these tickers open and write on every book change
+STREAM_WATCHLIST = parse_watchlist(os.getenv("STREAM_WATCHLIST"))
+# WebSocket capture mode: record + decode the live feed instead of parsing the DOM
+WS_CAPTURE = os.getenv("WS_CAPTURE") == "1"
 
-def _to_int(text: str | None):
-    if not text:
-        return None
-    cleaned = text.replace(',', '').replace('.', '').strip()
-    if not cleaned:
-        return None
-    try:
-        return int(cleaned)
-    except ValueError:
-        return None
+STOCK_LIST = engine.load_codes(STOCK_FILE)
 
-def flatten_rows(results):
-    rows = []
-    for res in results:
-        if res.get("error"):
-            continue
-        ts = datetime.fromisoformat(res.get("timestamp"))
-        code = res.get("stock_code")
-        for i, bid in enumerate(res.get("bids", []), start=1):
-            rows.append((code, "B", _to_int(bid.get("price")), _to_int(bid.get("volume")), i, ts))
-        for i, ask in enumerate(res.get("asks", []), start=1):
-            rows.append((code, "A", _to_int(ask.get("price")), _to_int(ask.get("volume")), i, ts))
-    return rows
+async def scrape_all(playwright, codes):
+    # Retries, browsers and the DB write are owned by the engine (see engine.py)
+    outcome = await engine.run(playwright, [IpotSource()], codes, NUM_BROWSERS, MAX_CONCURRENT_PER_BROWSER)
+    return outcome["ipot"]
 
-def push_to_database(rows):
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-    )
-    try:
-        cur = conn.cursor()
-        cur.executemany(
-            "INSERT INTO orderbook_ipot (kode, side, price, lot, num, timestamp) VALUES (%s, %s, %s, %s, %s, %s)",
-            rows,
-        )
-        conn.commit()
-        print(f"[SUCCESS] Inserted {len(rows)} rows into DB")
-    finally:
-        cur.close()
-        conn.close()
+def write_stream_batch(snapshots):
+    """Writer path for streamed snapshots (runs in a worker thread)"""
+    books = [snapshot_from_text(s["kode"], s["timestamp"], s["bids"], s["asks"]) for s in snapshots]
+    engine.push_rows("orderbook_ipot", rows_from_snapshots(books), summaries_from_snapshots(books, "ipot"),
+                     spool_name="ipot-stream")
 
-async def scrape_orderbook(page, stock_code):
-    url = f"https://indopremier.com/#ipot/app/ipotbuzz/home/{stock_code}"
+async def open_stream_page(page, stock_code):
     page.set_default_timeout(PAGE_TIMEOUT)
-    await page.goto(url, wait_until="domcontentloaded")
-
-    # Ensure the orderbook container appears
-    for _ in range(3):
-        try:
-            await page.wait_for_selector(".bidoff", timeout=10000)
-            break
-        except TimeoutError:
-            await page.reload()
-    else:
-        raise Exception("Timeout: .bidoff not found after retries")
-
-    data = {
-        "stock_code": stock_code,
-        "timestamp": datetime.now().isoformat(),
-        "market_info": {},
-        "bids": [],
-        "asks": [],
-        "total_bid_lot": None,
-        "total_ask_lot": None,
-    }
-
-    # Market info
-    try:
-        mi_labels = await page.query_selector_all(".container-mi .mi .ob-mi-label")
-        mi_values = await page.query_selector_all(".container-mi .mi .ob-mi-value")
-        for label, value in zip(mi_labels, mi_values):
-            ltext = (await label.inner_text()).strip()
-            vtext = (await value.inner_text()).strip()
-            data["market_info"][ltext] = vtext
-    except Exception as e:
-        print(f"[{stock_code}] Market info error: {e}")
-
-    # Bids
-    try:
-        bid_container = await page.query_selector(".bidoff .col-50:first-child")
-        if bid_container:
-            bid_prices = await bid_container.query_selector_all(".ob-price")
-            bid_vols = await bid_container.query_selector_all(".ob-value.padding-right-half-half")
-            for i in range(len(bid_prices)):
-                price = (await bid_prices[i].inner_text()).strip()
-                volume = (await bid_vols[i].inner_text()).strip() if i < len(bid_vols) else ""
-                data["bids"].append({"price": price, "volume": volume})
-    except Exception as e:
-        print(f"[{stock_code}] Bid error: {e}")
-
-    # Asks
-    try:
-        ask_container = await page.query_selector(".bidoff .col-50:last-child")
-        if ask_container:
-            ask_prices = await ask_container.query_selector_all(".ob-price")
-            ask_vols = await ask_container.query_selector_all(".ob-value.padding-right-half-half")
-            for i in range(len(ask_prices)):
-                price = (await ask_prices[i].inner_text()).strip()
-                volume = (await ask_vols[i].inner_text()).strip() if i < len(ask_vols) else ""
-                data["asks"].append({"price": price, "volume": volume})
-    except Exception as e:
-        print(f"[{stock_code}] Ask error: {e}")
+    await page.goto(BOOK_URL.format(stock_code), wait_until="domcontentloaded")
+    await wait_for_book_ready(
+        page,
+        bid_selector=STREAM_SELECTORS["bid_price"],
+        ask_selector=STREAM_SELECTORS["ask_price"],
+        container_selector=".bidoff",
+    )
 
-    # Totals
+async def stream_watchlist(playwright, watchlist):
+    print(f"[STREAM] IPOT watchlist ({len(watchlist)}): {', '.join(watchlist)}")
+    browsers = []
     try:
-        totals = await page.query_selector_all(".ob-mi-value.padding-right-half-half")
-        if len(totals) >= 2:
-            data["total_bid_lot"] = (await totals[0].inner_text()).strip()
-            data["total_ask_lot"] = (await totals[1].inner_text()).strip()
-    except Exception as e:
-        print(f"[{stock_code}] Totals error: {e}")
-
-    if not data["bids"] and not data["asks"]:
-        raise Exception("No bid/ask rows found")
-    return data
-
-async def scrape_with_retry(browser, stock_code, semaphore, max_retries=MAX_RETRIES):
-    async with semaphore:
-        error = None
-        for attempt in range(1, max_retries + 1):
-            context = None
-            page = None
+        contexts = []
+        for _ in range(min(NUM_BROWSERS, len(watchlist))):
+            browser = await playwright.chromium.launch(headless=HEADLESS)
+            browsers.append(browser)
+            context = await browser.new_context()
+            await install_policy(context, NETWORK_POLICY)
+            contexts.append(context)
+        streamer = BookStreamer("ipot", STREAM_SELECTORS, open_stream_page, write_stream_batch)
+        await streamer.run(contexts, watchlist)
+    finally:
+        for browser in browsers:
             try:
-                context = await browser.new_context()
-                page = await context.new_page()
-                # Skip heavy resources
-                await page.route(
-                    "**/*",
-                    lambda route: route.abort()
-                    if route.request.resource_type in {"image", "font", "media", "stylesheet"}
-                    else route.continue_(),
-                )
-                data = await scrape_orderbook(page, stock_code)
-                if attempt > 1:
-                    print(f"[SUCCESS] {stock_code} succeeded on attempt {attempt}")
-                return {"success": True, "stock_code": stock_code, "data": data, "error": None}
-            except Exception as e:
-                error = str(e)
-                if attempt < max_retries:
-                    await asyncio.sleep(attempt * 2)  # backoff
-            finally:
-                if context:
-                    try:
-                        await context.close()
-                    except Exception:
-                        pass
-        print(f"[FAILED] {stock_code} failed after {max_retries} attempts: {error}")
-        return {"success": False, "stock_code": stock_code, "data": {}, "error": error}
-
-def split_list(lst, n):
-    k, m = divmod(len(lst), n)
-    return [lst[i * k + min(i, m):(i + 1) * k + min(i + 1, m)] for i in range(n)]
+                await browser.close()
+            except Exception:
+                pass
 
-async def scrape_with_one_browser(playwright, browser_id, codes):
-    print(f"[BROWSER-{browser_id}] Handling {len(codes)} stocks")
-    browser = None
+async def capture_websocket(playwright, codes):
+    """Decode orderbook frames from the IPOT feed and write them like a normal run"""
+    print(f"[WS] Capturing IPOT feed for {len(codes)} stocks")
+    browsers, snapshots = [], []
     try:
-        browser = await playwright.chromium.launch(headless=HEADLESS)
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_PER_BROWSER)
-        tasks = [scrape_with_retry(browser, code, semaphore) for code in codes]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        success, failed = [], []
-        for r in results:
-            if isinstance(r, Exception):
-                failed.append({"stock_code": "unknown", "error": str(r)})
-            elif r["success"]:
-                success.append(r["data"])
-            else:
-                failed.append({"stock_code": r["stock_code"], "error": r["error"]})
-        print(f"[BROWSER-{browser_id}] Done: {len(success)}/{len(codes)} success")
-        return success, failed
+        contexts = []
+        for _ in range(min(NUM_BROWSERS, len(codes))):
+            browser = await playwright.chromium.launch(headless=HEADLESS)
+            browsers.append(browser)
+            context = await browser.new_context()
+            await install_policy(context, NETWORK_POLICY)
+            contexts.append(context)
+        await capture(contexts, codes, open_stream_page, snapshots.append)
     finally:
-        if browser:
+        for browser in browsers:
             try:
-                await asyncio.sleep(0.2)
                 await browser.close()
             except Exception:
                 pass
 
-async def scrape_all(playwright, codes):
-    chunks = split_list(codes, NUM_BROWSERS)
-    for i, chunk in enumerate(chunks, 1):
-        print(f"   Browser-{i}: {len(chunk)} stocks")
-    tasks = [scrape_with_one_browser(playwright, i + 1, chunk) for i, chunk in enumerate(chunks)]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    all_success, all_failed = [], []
-    for i, res in enumerate(results):
-        if isinstance(res, Exception):
-            print(f"[FAILED] Browser-{i+1} fatal: {res}")
-        else:
-            s, f = res
-            all_success.extend(s)
-            all_failed.extend(f)
-    return all_success, all_failed
+    books = [snapshot_from_ipot(snap) for snap in snapshots]
+    rows = rows_from_snapshots(books)
+    if rows:
+        engine.push_rows("orderbook_ipot", rows, summaries_from_snapshots(books, "ipot"), spool_name="ipot-stream")
 
 async def main():
     print(f"{'='*60}")
@@ -240,6 +109,23 @@ async def main():
 
     start = time.time()
     async with async_playwright() as p:
+        if POLICY_MEASURE:
+            browser = await p.chromium.launch(headless=HEADLESS)
+            try:
+                await measure_policies(browser, "ipot", STOCK_LIST[:POLICY_MEASURE_SAMPLE], scrape_orderbook)
+            finally:
+                await browser.close()
+            return
+        if WS_CAPTURE:
+            # One open page per ticker for the whole capture: never the full stock list
+            if not STREAM_WATCHLIST:
+                print("[WS] WS_CAPTURE=1 needs STREAM_WATCHLIST (the tickers to capture)")
+                return
+            await capture_websocket(p, STREAM_WATCHLIST)
+            return
+        if STREAM_WATCHLIST:
+            await stream_watchlist(p, STREAM_WATCHLIST)
+            return
         success, failed = await scrape_all(p, STOCK_LIST)
 
     # NOTE: disabled saving to json since now we use MySQL
@@ -247,13 +133,6 @@ async def main():
     # with open(output_file, "w", encoding="utf-8") as f:
     #     json.dump(success + failed, f, indent=2, ensure_ascii=False)
 
-    rows = flatten_rows(success)
-    if rows:
-        try:
-            push_to_database(rows)
-        except Exception as e:
-            print(f"[ERROR] DB insert failed: {e}")
-
     elapsed = time.time() - start
     success_count = len(success)
     failed_count = len(failed)
@@ -265,7 +144,7 @@ async def main():
     print(f"{'='*60}\n")
 
     if failed:
-        sample = ", ".join(f["stock_code"] for f in failed[:10])
+        sample = ", ".join(f["kode"] for f in failed[:10])
         extra = f" ... +{len(failed) - 10} more" if len(failed) > 10 else ""
         print(f"Failed samples: {sample}{extra}")
 
@@ -273,4 +152,4 @@ if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("\n[STOPPED] Stopped by user")
\ No newline at end of file
+        print("\n[STOPPED] Stopped by user")
@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+WS_CAPTURE_DIR = os.getenv("WS_CAPTURE_DIR", "ws_captures")
+WS_CAPTURE_SECONDS = float(os.getenv("WS_CAPTURE_SECONDS", "60"))
+# Every ticker keeps a page (and its feed) open for the whole capture
+WS_CAPTURE_MAX_PAGES = int(os.getenv("WS_CAPTURE_MAX_PAGES", "20"))
+
+# An orderbook message is a JSON object with a ticker code and at least one side as a
+# list of levels; each level is {price, volume} or a [price, volume] pair of numbers.
+# Only full key names: single letters ("s", "b", "p", ...) also appear in trade/index frames.
+CODE_KEYS = ("stock_code", "stockCode", "code", "kode", "symbol")
+BID_KEYS = ("bids", "bid")
+ASK_KEYS = ("asks", "offers", "offer", "ask")
+PRICE_KEYS = ("price", "prc")
+VOLUME_KEYS = ("volume", "vol", "lot", "lots")
+TOTAL_BID_KEYS = ("total_bid_lot", "totalBid", "tbid", "total_bid")
+TOTAL_ASK_KEYS = ("total_ask_lot", "totalOffer", "totalAsk", "toff", "total_offer")
+TICKER = re.compile(r"^[A-Z]{4}$")
+
+# socket.io / engine.io framing ("42[...]") in front of the JSON body
+_PREFIX = re.compile(r"^\d+")
+
+
+def _first(d, keys):
+    for k in keys:
+        if k in d:
+            return d[k]
+    return None
+
+
+def _is_number(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    return isinstance(value, str) and re.fullmatch(r"\d[\d,.]*", value.strip()) is not None
+
+
+def _as_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+# ============================================================
+# DECODER
+# ============================================================
+class IpotFrameDecoder:
+    """Turns raw websocket payloads into scrape_orderbook()-shaped snapshots.
+
+    Frames that carry a full side replace that side of the cached book, so
+    feeds that only push the changed side still yield complete snapshots.
+    """
+
+    def __init__(self, codes=None):
+        self.codes = {c.upper() for c in codes} if codes else None
+        self.books = {}
+        self.frames = 0
+        self.undecoded = 0
+
+    def _parse(self, payload):
+        if isinstance(payload, bytes):
+            try:
+                payload = payload.decode("utf-8")
+            except UnicodeDecodeError:
+                return None
+        body = _PREFIX.sub("", payload.strip(), count=1)
+        if not body or body[0] not in "[{":
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    def _levels(self, raw):
+        """[{price, volume}] or None when `raw` is not a list of orderbook levels"""
+        levels = []
+        if not isinstance(raw, list):
+            return None
+        for lvl in raw:
+            if isinstance(lvl, dict):
+                price, volume = _first(lvl, PRICE_KEYS), _first(lvl, VOLUME_KEYS)
+            elif isinstance(lvl, (list, tuple)) and len(lvl) == 2:
+                price, volume = lvl
+            else:
+                return None
+            if not _is_number(price) or not (volume is None or _is_number(volume)):
+                return None
+            levels.append({"price": _as_text(price), "volume": _as_text(volume)})
+        return levels
+
+    def _books_in(self, node):
+        """Depth-first search for dicts that look like an orderbook message"""
+        if isinstance(node, dict):
+            code = _first(node, CODE_KEYS)
+            bids = self._levels(_first(node, BID_KEYS))
+            asks = self._levels(_first(node, ASK_KEYS))
+            if isinstance(code, str) and TICKER.match(code.upper()) and (bids is not None or asks is not None):
+                yield code.upper(), node, bids, asks
+                return
+            for value in node.values():
+                yield from self._books_in(value)
+        elif isinstance(node, list):
+            for value in node:
+                yield from self._books_in(value)
+
+    def feed(self, payload, received_at=None):
+        """Decode one frame; returns the list of snapshots it produced"""
+        self.frames += 1
+        message = self._parse(payload)
+        if message is None:
+            self.undecoded += 1
+            return []
+
+        ts = datetime.fromtimestamp(received_at or time.time()).isoformat()
+        snapshots = []
+        for code, node, bids, asks in self._books_in(message):
+            if self.codes is not None and code not in self.codes:
+                continue
+            book = self.books.setdefault(code, {
+                "stock_code": code, "timestamp": ts, "market_info": {},
+                "bids": [], "asks": [], "total_bid_lot": None, "total_ask_lot": None,
+            })
+            if bids is not None:
+                book["bids"] = bids
+            if asks is not None:
+                book["asks"] = asks
+            total_bid, total_ask = _first(node, TOTAL_BID_KEYS), _first(node, TOTAL_ASK_KEYS)
+            if total_bid is not None:
+                book["total_bid_lot"] = _as_text(total_bid)
+            if total_ask is not None:
+                book["total_ask_lot"] = _as_text(total_ask)
+            book["timestamp"] = ts
+            snapshots.append({**book, "bids": list(book["bids"]), "asks": list(book["asks"])})
+        if not snapshots:
+            self.undecoded += 1
+        return snapshots
+
+
+# ============================================================
+# RECORDING
+# ============================================================
+class FrameRecorder:
+    """Appends every websocket frame to a JSONL file for offline replay"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._f = open(path, "a", encoding="utf-8")
+        self.count = 0
+
+    def write(self, direction, url, payload, received_at):
+        binary = isinstance(payload, bytes)
+        self._f.write(json.dumps({
+            "t": received_at,
+            "dir": direction,
+            "url": url,
+            "binary": binary,
+            "payload": base64.b64encode(payload).decode("ascii") if binary else payload,
+        }) + "\n")
+        self.count += 1
+
+    def close(self):
+        self._f.close()
+
+
+def attach_capture(page, decoder, on_snapshot, recorder=None):
+    """Record and decode every websocket the page opens"""
+    def on_websocket(ws):
+        print(f"[WS] opened {ws.url}")
+
+        def received(payload):
+            now = time.time()
+            if recorder:
+                recorder.write("recv", ws.url, payload, now)
+            for snap in decoder.feed(payload, now):
+                on_snapshot(snap)
+
+        def sent(payload):
+            if recorder:
+                recorder.write("sent", ws.url, payload, time.time())
+
+        ws.on("framereceived", received)
+        ws.on("framesent", sent)
+        ws.on("close", lambda _: print(f"[WS] closed {ws.url}"))
+
+    page.on("websocket", on_websocket)
+
+
+async def capture(contexts, codes, open_page, on_snapshot, seconds=WS_CAPTURE_SECONDS, path=None):
+    """Open each ticker, capture its feed for `seconds`, and save the raw frames to `path`.
+
+    Every ticker holds an open page for the whole capture, so at most
+    WS_CAPTURE_MAX_PAGES tickers are accepted.
+    """
+    if len(codes) > WS_CAPTURE_MAX_PAGES:
+        raise ValueError(f"{len(codes)} tickers for a websocket capture, at most {WS_CAPTURE_MAX_PAGES} "
+                         f"(WS_CAPTURE_MAX_PAGES) pages may stay open")
+    path = path or os.path.join(WS_CAPTURE_DIR, f"ipot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    recorder = FrameRecorder(path)
+    decoder = IpotFrameDecoder(codes)
+    pages = []
+    try:
+        for i, code in enumerate(codes):
+            page = await contexts[i % len(contexts)].new_page()
+            # Listener must be attached before navigation or the socket is missed
+            attach_capture(page, decoder, on_snapshot, recorder)
+            try:
+                await open_page(page, code)
+                pages.append(page)
+            except Exception as e:
+                print(f"[WS] {code} could not be opened: {e}")
+        await asyncio.sleep(seconds)
+    finally:
+        recorder.close()
+        for page in pages:
+            try:
+                await page.close()
+            except Exception:
+                pass
+    print(f"[WS] frames={decoder.frames} undecoded={decoder.undecoded} "
+          f"books={len(decoder.books)} saved={recorder.count} -> {path}")
+    return path
+
+
+# ============================================================
+# REPLAY
+# ============================================================
+def replay(path, codes=None):
+    """Yield decoded snapshots from a recorded frame file, in recorded order"""
+    decoder = IpotFrameDecoder(codes)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            frame = json.loads(line)
+            if frame["dir"] != "recv":
+                continue
+            payload = base64.b64decode(frame["payload"]) if frame["binary"] else frame["payload"]
+            yield from decoder.feed(payload, frame["t"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded IPOT websocket capture.")
+    parser.add_argument("path", help="Recorded .jsonl frame file")
+    parser.add_argument("-c", "--codes", default="", help="Comma separated stock codes to keep")
+    args = parser.parse_args()
+    codes = [c.strip().upper() for c in args.codes.split(",") if c.strip()] or None
+
+    count = 0
+    for snap in replay(args.path, codes):
+        count += 1
+        best_bid = snap["bids"][0]["price"] if snap["bids"] else "-"
+        best_ask = snap["asks"][0]["price"] if snap["asks"] else "-"
+        print(f"{snap['timestamp']} {snap['stock_code']} bid={best_bid} ask={best_ask} "
+              f"levels={len(snap['bids'])}/{len(snap['asks'])}")
+    print(f"[WS] {count} snapshots decoded from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
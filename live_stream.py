@@ -0,0 +1,226 @@
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime
+
+STREAM_FLUSH_SECONDS = float(os.getenv("STREAM_FLUSH_SECONDS", "5"))
+STREAM_DURATION = float(os.getenv("STREAM_DURATION", "0"))  # seconds, 0 = until stopped
+PAGE_HEAP_BUDGET_MB = float(os.getenv("STREAM_PAGE_HEAP_MB", "150"))
+PAGE_CPU_BUDGET_PCT = float(os.getenv("STREAM_PAGE_CPU_PCT", "50"))
+BUDGET_CHECK_SECONDS = 15
+BUDGET_STRIKES = 2  # consecutive over-budget checks before a page is reloaded
+EMIT_DEBOUNCE_MS = 50
+
+
+def parse_watchlist(value):
+    """'BBRI, tlkm' -> ['BBRI', 'TLKM']"""
+    return [c.strip().upper() for c in (value or "").split(",") if c.strip()]
+
+
+# Watches the book container and calls window.__bookUpdate only when the
+# extracted levels actually change. `changed_at` is the page clock at the
+# first mutation of the burst, so Python can measure end-to-end latency.
+_WATCH_JS = """
+([kode, sel, debounceMs]) => {
+    if (window.__bookWatch) window.__bookWatch.disconnect();
+    const texts = (s) => Array.from(document.querySelectorAll(s), (el) => el.innerText.trim());
+    let last = null;
+    let timer = null;
+    let firstChange = null;
+    const emit = () => {
+        timer = null;
+        const book = {
+            bid_prices: texts(sel.bid_price), bid_lots: texts(sel.bid_lot),
+            ask_prices: texts(sel.ask_price), ask_lots: texts(sel.ask_lot),
+        };
+        const signature = JSON.stringify(book);
+        const changedAt = firstChange || Date.now();
+        firstChange = null;
+        if (signature === last) return;
+        if (book.bid_prices.length + book.ask_prices.length === 0) return;
+        last = signature;
+        window.__bookUpdate({kode, changed_at: changedAt, ...book});
+    };
+    const observer = new MutationObserver(() => {
+        if (firstChange === null) firstChange = Date.now();
+        if (timer === null) timer = setTimeout(emit, debounceMs);
+    });
+    observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+    window.__bookWatch = observer;
+    emit();
+}
+"""
+
+
+# ============================================================
+# STREAMER
+# ============================================================
+class BookStreamer:
+    """Keeps one open page per watchlist ticker and emits snapshots on change.
+
+    `open_page(page, kode)` navigates a fresh page to the ticker (and handles any
+    login checks). `write_batch(snapshots)` is the normal writer path; it runs in
+    a worker thread every STREAM_FLUSH_SECONDS with everything emitted since.
+    """
+
+    def __init__(self, site, selectors, open_page, write_batch):
+        self.site = site
+        self.selectors = selectors
+        self.open_page = open_page
+        self.write_batch = write_batch
+        self.queue = asyncio.Queue()
+        self.pages = {}
+        self.latencies_ms = []
+        self.stats = {"updates": 0, "written": 0, "reloads": 0, "write_errors": 0}
+        self._stop = asyncio.Event()
+
+    # ---------------- page lifecycle ----------------
+    async def _watch(self, kode, page):
+        await self.open_page(page, kode)
+        await page.evaluate(_WATCH_JS, [kode, self.selectors, EMIT_DEBOUNCE_MS])
+
+    async def _open(self, context, kode):
+        page = await context.new_page()
+        try:
+            await page.expose_function("__bookUpdate", self._on_update)
+            cdp = await context.new_cdp_session(page)
+            await cdp.send("Performance.enable")
+            await self._watch(kode, page)
+        except Exception:
+            try:
+                await page.close()
+            except Exception:
+                pass
+            raise
+        self.pages[kode] = {"context": context, "page": page, "cdp": cdp, "last": None, "strikes": 0}
+
+    async def add_page(self, context, kode):
+        await self._open(context, kode)
+        print(f"[STREAM] {self.site} {kode} pinned")
+
+    async def _reload(self, kode, reason):
+        """Replace the ticker's page with a fresh one.
+
+        Navigating the same page again is not enough: IPOT's book URL only
+        differs in its #hash, so goto() stays in the same document and the JS
+        heap is never released.
+        """
+        entry = self.pages[kode]
+        print(f"[STREAM] {kode} reloading ({reason})")
+        self.stats["reloads"] += 1
+        entry["strikes"] = 0
+        entry["last"] = None
+        try:
+            await entry["cdp"].detach()
+        except Exception:
+            pass
+        try:
+            await entry["page"].close()
+        except Exception:
+            pass
+        try:
+            await self._open(entry["context"], kode)
+        except Exception as e:
+            # The entry keeps the closed page, so the next budget check retries
+            print(f"[STREAM] {kode} reload failed: {e}")
+
+    # ---------------- updates ----------------
+    def _on_update(self, update):
+        received = time.time()
+        self.latencies_ms.append(received * 1000 - update["changed_at"])
+        if len(self.latencies_ms) > 10000:
+            del self.latencies_ms[:5000]
+        self.stats["updates"] += 1
+        self.queue.put_nowait({
+            "kode": update["kode"],
+            "timestamp": datetime.fromtimestamp(update["changed_at"] / 1000),
+            "bids": list(zip(update["bid_prices"], update["bid_lots"])),
+            "asks": list(zip(update["ask_prices"], update["ask_lots"])),
+        })
+
+    async def _writer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=STREAM_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            batch = []
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if batch:
+                try:
+                    await asyncio.to_thread(self.write_batch, batch)
+                    self.stats["written"] += len(batch)
+                except Exception as e:
+                    self.stats["write_errors"] += 1
+                    print(f"[STREAM] write failed for {len(batch)} snapshots: {e}")
+            # Final flush happens above before exiting
+            if self._stop.is_set():
+                break
+
+    # ---------------- budgets ----------------
+    async def _check_budgets(self):
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=BUDGET_CHECK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            for kode, entry in list(self.pages.items()):
+                try:
+                    raw = await entry["cdp"].send("Performance.getMetrics")
+                except Exception as e:
+                    await self._reload(kode, f"metrics unavailable: {e}")
+                    continue
+                metrics = {m["name"]: m["value"] for m in raw["metrics"]}
+                now = time.monotonic()
+                heap_mb = metrics.get("JSHeapUsedSize", 0) / 1024 / 1024
+                cpu_pct = 0.0
+                if entry["last"] is not None:
+                    last_t, last_task = entry["last"]
+                    cpu_pct = (metrics.get("TaskDuration", 0) - last_task) / max(now - last_t, 1e-6) * 100
+                entry["last"] = (now, metrics.get("TaskDuration", 0))
+                entry["heap_mb"], entry["cpu_pct"] = heap_mb, cpu_pct
+
+                if heap_mb > PAGE_HEAP_BUDGET_MB or cpu_pct > PAGE_CPU_BUDGET_PCT:
+                    entry["strikes"] += 1
+                    if entry["strikes"] >= BUDGET_STRIKES:
+                        await self._reload(kode, f"heap={heap_mb:.0f}MB cpu={cpu_pct:.0f}%")
+                else:
+                    entry["strikes"] = 0
+
+    # ---------------- run ----------------
+    def report(self):
+        lat = sorted(self.latencies_ms)
+        if lat:
+            p50 = statistics.median(lat)
+            p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+            lat_text = f"latency p50={p50:.0f}ms p95={p95:.0f}ms"
+        else:
+            lat_text = "latency n/a"
+        heaps = [e.get("heap_mb", 0) for e in self.pages.values()]
+        print(f"[STREAM] {self.site}: pages={len(self.pages)} updates={self.stats['updates']} "
+              f"written={self.stats['written']} reloads={self.stats['reloads']} "
+              f"write_errors={self.stats['write_errors']} {lat_text} "
+              f"max_heap={max(heaps, default=0):.0f}MB")
+
+    async def run(self, contexts, watchlist, duration=STREAM_DURATION):
+        """Pin `watchlist` round-robin across `contexts` (one per browser) and stream"""
+        for i, kode in enumerate(watchlist):
+            try:
+                await self.add_page(contexts[i % len(contexts)], kode)
+            except Exception as e:
+                print(f"[STREAM] {kode} could not be pinned: {e}")
+
+        writer = asyncio.create_task(self._writer())
+        budgets = asyncio.create_task(self._check_budgets())
+        try:
+            deadline = time.monotonic() + duration if duration else None
+            while deadline is None or time.monotonic() < deadline:
+                remaining = deadline - time.monotonic() if deadline else 60
+                await asyncio.sleep(max(0, min(60, remaining)))
+                self.report()
+        finally:
+            self._stop.set()
+            await asyncio.gather(writer, budgets, return_exceptions=True)
+            self.report()
@@ -2,13 +2,14 @@
 import asyncio
 import aiohttp
 import pandas as pd
-from datetime import datetime
 from playwright.async_api import async_playwright
 from dotenv import load_dotenv
 import os
 import random
-import time
-import mysql.connector
+
+from auth_manager import AuthManager
+from spool import drain, get_spool
+from orderbook_model import parse_bestquote, rows_from_snapshots
 
 load_dotenv()
 
@@ -19,8 +20,10 @@ PASSWORD = os.getenv("PASSWORD")
 PIN_CODE = os.getenv("PINCODE")
 PIN_CHECK_INTERVAL = 3000
 
-CODES = pd.read_excel("daftar saham.xlsx")["Kode"].tolist()
-URL = "https://ht2.ajaib.co.id/api/v1/stock/bestquote/"
+CODES_FILE = "daftar saham.xlsx"
+CSV_FILE = "saham_idx.csv"
+URL = os.getenv("BESTQUOTE_URL", "https://ht2.ajaib.co.id/api/v1/stock/bestquote/")
+REQUEST_TIMEOUT = float(os.getenv("BESTQUOTE_TIMEOUT", "15"))  # detik; tanpa ini request yang hang nunggu 5 menit
 
 # Config Rate Limiting
 MAX_CONCURRENT = 5  # Turunkan drastis untuk avoid 429
@@ -33,37 +36,23 @@ playwright_instance = None
 sem = asyncio.Semaphore(MAX_CONCURRENT)
 
 
-def push_to_database(df):
-    """Push DataFrame ke MySQL Database"""
-    try:
-        connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME")
-        )
-
-        cursor = connection.cursor()
-
-        for _, row in df.iterrows():
-            sql = """
-                INSERT INTO orderbook_ajaib (kode, side, price, lot, num, timestamp)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            values = (row['kode'], row['side'], row['price'],
-                      row['lot'], row['num'], row['timestamp'])
-            cursor.execute(sql, values)
-
-        connection.commit()
-        print(f"✅ Inserted {len(df)} rows into database")
-
-    except mysql.connector.Error as err:
-        print(f"❌ Database error: {err}")
+ROW_COLUMNS = ["kode", "side", "price", "lot", "num", "timestamp"]
 
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+
+def load_codes(path=CODES_FILE):
+    """Dibaca saat run, bukan saat import, supaya modul ini bisa dipakai harness/load test"""
+    return pd.read_excel(path)["Kode"].tolist()
+
+
+def push_to_database(rows):
+    """Spool rows ke disk (fsync), lalu drain ke MySQL; kalau DB down data tetap di spool"""
+    spool = get_spool("bestquote")
+    spool.append("orderbook_ajaib", rows)
+    stats = drain(spool, seal=True)
+    if stats["error"]:
+        print(f"❌ Database error: {stats['error']} - {len(rows)} rows kept in spool ({spool.format_backlog()})")
+    else:
+        print(f"✅ Inserted {stats['rows']} rows into database ({spool.format_backlog()})")
 
 
 async def login_and_get_headers(playwright):
@@ -155,41 +144,8 @@ async def login_and_get_headers(playwright):
         await browser.close()
 
 
-def parse_orderbook(json_data):
-    rows = []
-    kode = json_data["code"]
-
-    ts = datetime.fromtimestamp(
-        json_data["buy_side"]["unix_time"] / 1000
-    )
-
-    # BID
-    for item in json_data["buy_side"]["items"]:
-        rows.append({
-            "kode": kode,
-            "side": "B",
-            "price": item["price"],
-            "lot": item["lot"],
-            "num": item["num"],
-            "timestamp": ts
-        })
-
-    # ASK
-    for item in json_data["sell_side"]["items"]:
-        rows.append({
-            "kode": kode,
-            "side": "S",
-            "price": item["price"],
-            "lot": item["lot"],
-            "num": item["num"],
-            "timestamp": ts
-        })
-
-    return rows
-
-
-async def fetch(session, code, headers_ref):
-    """Fetch dengan retry untuk 401 dan 429"""
+async def fetch(session, code, auth):
+    """Ambil bestquote 1 kode; 401 -> tunggu refresh token (sekali untuk semua request) lalu retry"""
     async with sem:
         # Random delay untuk avoid rate limit
         await asyncio.sleep(DELAY_BETWEEN_REQUESTS + random.uniform(0, 0.1))
@@ -197,16 +153,17 @@ async def fetch(session, code, headers_ref):
         max_retries = 3
         for attempt in range(1, max_retries + 1):
             try:
-                # Update headers dari reference (bisa berubah jika re-login)
-                session._default_headers.update(headers_ref)
+                # Headers per request dari AuthManager (tidak mengubah default session)
+                headers, generation = await auth.current()
 
-                async with session.get(URL, params={"code": code}) as r:
+                async with session.get(URL, params={"code": code}, headers=headers) as r:
                     if r.status == 401:
                         print(
                             f"⚠️ 401 Unauthorized for {code} - Token expired")
                         if attempt < max_retries:
-                            print(f"   🔄 Will re-login and retry...")
-                            return {"code": code, "status": 401, "data": None}
+                            print("   🔄 Waiting for token refresh, then retry...")
+                            await auth.refresh(generation)
+                            continue
                         return None
 
                     elif r.status == 429:
@@ -223,16 +180,17 @@ async def fetch(session, code, headers_ref):
                         print(f"❌ Failed {code} status: {r.status}")
                         return None
 
-                    data = await r.json()
+                    raw = await r.read()
 
-                    if "code" not in data or "buy_side" not in data or "sell_side" not in data:
+                    # Parse sekali langsung ke Snapshot (harga/lot int), tanpa DataFrame per kode
+                    try:
+                        snapshot = parse_bestquote(raw)
+                    except ValueError:
                         print(f"⚠️ Unexpected data format for {code}")
                         return None
 
-                    rows = parse_orderbook(data)
-                    df = pd.DataFrame(rows)
-                    print(f"✅ {code} success - {len(rows)} rows")
-                    return {"code": code, "status": 200, "data": df}
+                    print(f"✅ {code} success - {len(snapshot)} rows")
+                    return {"code": code, "status": 200, "data": snapshot}
 
             except Exception as e:
                 print(f"⚠️ Error fetching {code}: {e}")
@@ -244,61 +202,41 @@ async def fetch(session, code, headers_ref):
         return None
 
 
-async def fetch_batch_with_relogin(playwright, codes, initial_headers):
-    """Fetch dengan auto re-login jika kena 401"""
-    headers_ref = initial_headers.copy()
-
-    async with aiohttp.ClientSession(headers=headers_ref) as session:
-        results = []
-        batch_size = 100  # Process in batches
-
-        # tes 1 code dulu
-        test_result = await fetch(session, codes[0], headers_ref)
-        if test_result and test_result.get("status") == 401:
-            print("❌ Initial token invalid, re-logging in...")
-            new_headers = await login_and_get_headers(playwright)
-            headers_ref.update(new_headers)
-            print("✅ Re-login successful, continuing...")
-
-        for i in range(0, len(codes), batch_size):
-            batch = codes[i:i+batch_size]
-            print(
-                f"\n📦 Processing batch {i//batch_size + 1}/{(len(codes)-1)//batch_size + 1} ({len(batch)} codes)")
-
-            batch_results = await asyncio.gather(*(fetch(session, c, headers_ref) for c in batch))
+async def fetch_batch_with_relogin(playwright, codes, initial_headers=None, login=login_and_get_headers, auth=None):
+    """Fetch semua kode; token di-refresh oleh AuthManager (`login` bisa diganti, mis. oleh bestquote_loadtest.py).
 
-            # Check if need re-login
-            has_401 = any(r and r.get("status") ==
-                          401 for r in batch_results if r)
+    Dengan `auth` (AuthManager yang sudah jalan) token dipakai ulang antar cycle;
+    tanpa itu dibuat AuthManager sementara dari `initial_headers`.
+    """
+    own = auth is None
+    if own:
+        auth = AuthManager(login, playwright, initial_headers).start()
+    refreshes_before = auth.refreshes
 
-            if has_401:
-                print("\n🔄 Detected 401 errors - Re-logging in...")
-                new_headers = await login_and_get_headers(playwright)
-                headers_ref.update(new_headers)
-                print("✅ Re-login successful, continuing...")
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            results = []
+            batch_size = 100  # Process in batches
 
-                # Retry failed codes
-                failed_codes = [r["code"]
-                                for r in batch_results if r and r.get("status") == 401]
+            for i in range(0, len(codes), batch_size):
+                batch = codes[i:i+batch_size]
                 print(
-                    f"🔄 Retrying {len(failed_codes)} codes with new token...")
-                retry_results = await asyncio.gather(*(fetch(session, c, headers_ref) for c in failed_codes))
-
-                # Merge results
-                for i, r in enumerate(batch_results):
-                    if r and r.get("status") == 401:
-                        # Replace with retry result
-                        retry_idx = failed_codes.index(r["code"])
-                        batch_results[i] = retry_results[retry_idx]
+                    f"\n📦 Processing batch {i//batch_size + 1}/{(len(codes)-1)//batch_size + 1} ({len(batch)} codes)")
 
-            results.extend(batch_results)
+                results.extend(await asyncio.gather(*(fetch(session, c, auth) for c in batch)))
 
-            # Small pause between batches
-            if i + batch_size < len(codes):
-                print("⏱️  Pause 2s between batches...")
-                await asyncio.sleep(2)
+                # Small pause between batches
+                if i + batch_size < len(codes):
+                    print("⏱️  Pause 2s between batches...")
+                    await asyncio.sleep(2)
 
-        return results
+            if auth.refreshes > refreshes_before:
+                print(f"🔄 Token refreshed {auth.refreshes - refreshes_before}x during this run")
+            return results
+    finally:
+        if own:
+            await auth.stop()
 
 
 async def main():
@@ -306,50 +244,62 @@ async def main():
         # 1. Initial Login
         print("="*60)
         headers = await login_and_get_headers(p)
+        codes = load_codes()
+        if not headers.get("Authorization"):
+            print("❌ Failed to get Authorization token!")
+            return
 
-        while True:
-            if not headers.get("Authorization"):
-                print("❌ Failed to get Authorization token!")
-                return
-
-            print("\n" + "="*60)
-            print("📋 Using headers:")
-            print(f"   Authorization: {headers['Authorization'][:50]}...")
-            print(
-                f"   X-Device-Signature: {headers.get('X-Device-Signature', 'N/A')}")
-            print("="*60 + "\n")
-
-            # 2. Fetch with auto re-login
-            print(f"🚀 Starting to fetch {len(CODES)} codes...")
+        # Satu AuthManager untuk semua cycle: token tetap di-refresh di background selama menunggu
+        auth = AuthManager(login_and_get_headers, p, headers).start()
+        try:
+            await run_cycles(p, codes, auth)
+        finally:
+            await auth.stop()
+
+
+async def run_cycles(playwright, codes, auth):
+    """Fetch semua kode tiap 15 menit dengan token dari `auth`"""
+    while True:
+        headers, _ = auth.headers()
+        print("\n" + "="*60)
+        print("📋 Using headers:")
+        print(f"   Authorization: {headers['Authorization'][:50]}...")
+        print(
+            f"   X-Device-Signature: {headers.get('X-Device-Signature', 'N/A')}")
+        print("="*60 + "\n")
+
+        # 2. Fetch with auto re-login
+        print(f"🚀 Starting to fetch {len(codes)} codes...")
+        print(
+            f"⚙️  Config: {MAX_CONCURRENT} concurrent, {DELAY_BETWEEN_REQUESTS}s delay\n")
+
+        results = await fetch_batch_with_relogin(playwright, codes, auth=auth)
+
+        # 3. Process results
+        snapshots = [r["data"]
+                     for r in results if r and r.get("data") is not None]
+
+        if snapshots:
+            rows = rows_from_snapshots(snapshots, ask_side="S")
+            final_df = pd.DataFrame(rows, columns=ROW_COLUMNS)
+            # Header only when the file is new, so appended runs stay one readable CSV
+            write_header = not os.path.exists(CSV_FILE) or os.path.getsize(CSV_FILE) == 0
+            final_df.to_csv(CSV_FILE, mode='a', header=write_header, index=False)
+            print(f"\n{'='*60}")
+            print(f"✅ SUCCESS!")
+            try:
+                push_to_database(rows)
+            except Exception as e:
+                print(f"❌ Failed to push data to database: {e}")
+            print(f"📊 Saved {len(final_df)} rows to {CSV_FILE}")
             print(
-                f"⚙️  Config: {MAX_CONCURRENT} concurrent, {DELAY_BETWEEN_REQUESTS}s delay\n")
-
-            results = await fetch_batch_with_relogin(p, CODES, headers)
-
-            # 3. Process results
-            dfs = [r["data"]
-                   for r in results if r and r.get("data") is not None]
-
-            if dfs:
-                final_df = pd.concat(dfs, ignore_index=True)
-                final_df.to_csv("saham_idx.csv", mode='a',
-                                header=False, index=False)
-                print(f"\n{'='*60}")
-                print(f"✅ SUCCESS!")
-                try:
-                    push_to_database(final_df)
-                    print("Successfully pushed data to database.")
-                except Exception as e:
-                    print(f"❌ Failed to push data to database: {e}")
-                print(f"📊 Saved {len(final_df)} rows to saham_idx.csv")
-                print(
-                    f"📈 Success rate: {len(dfs)}/{len(CODES)} ({len(dfs)/len(CODES)*100:.1f}%)")
-                print(f"{'='*60}")
-            else:
-                print("\n❌ No valid data collected")
+                f"📈 Success rate: {len(snapshots)}/{len(codes)} ({len(snapshots)/len(codes)*100:.1f}%)")
+            print(f"{'='*60}")
+        else:
+            print("\n❌ No valid data collected")
 
-            print("\n⏱️  Waiting 15 Minute before next run...\n")
-            time.sleep(900)  # 15 minutes
+        print("\n⏱️  Waiting 15 Minute before next run...\n")
+        await asyncio.sleep(900)  # 15 menit; non-blocking supaya refresh token di background tetap jalan
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+import argparse
+import os
+from datetime import date, datetime, time, timedelta, timezone
+
+WIB = timezone(timedelta(hours=7), "WIB")  # Asia/Jakarta, no DST
+IDX_HOLIDAY_FILE = os.getenv(
+    "IDX_HOLIDAY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "idx_holidays.txt"))
+# Outside trading hours run a cycle every N seconds (0 = skip idle cycles entirely)
+MARKET_IDLE_INTERVAL = float(os.getenv("MARKET_IDLE_INTERVAL", "0"))
+
+# (phase, start, end) per weekday, end exclusive
+_MON_THU = [
+    ("pre_opening", time(8, 45), time(9, 0)),
+    ("session_1", time(9, 0), time(12, 0)),
+    ("break", time(12, 0), time(13, 30)),
+    ("session_2", time(13, 30), time(15, 50)),
+    ("pre_closing", time(15, 50), time(16, 1)),
+    ("post_trading", time(16, 1), time(16, 15)),
+]
+_FRI = [
+    ("pre_opening", time(8, 45), time(9, 0)),
+    ("session_1", time(9, 0), time(11, 30)),
+    ("break", time(11, 30), time(14, 0)),
+    ("session_2", time(14, 0), time(15, 50)),
+    ("pre_closing", time(15, 50), time(16, 1)),
+    ("post_trading", time(16, 1), time(16, 15)),
+]
+# Phases in which books move and every cycle runs
+ACTIVE_PHASES = {"pre_opening", "session_1", "session_2", "pre_closing", "post_trading"}
+CLOSING_SNAPSHOT_AT = time(16, 15)
+
+
+def now_wib():
+    return datetime.now(WIB)
+
+
+def load_holidays(path=IDX_HOLIDAY_FILE):
+    """Exchange holidays from a local file: one YYYY-MM-DD per line, '#' comments"""
+    holidays = set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    holidays.add(date.fromisoformat(line))
+    except FileNotFoundError:
+        print(f"[WARN] Holiday file {path} not found, only weekends are treated as closed")
+    return holidays
+
+
+HOLIDAYS = load_holidays()
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in HOLIDAYS
+
+
+def sessions(day):
+    if not is_trading_day(day):
+        return []
+    return _FRI if day.weekday() == 4 else _MON_THU
+
+
+def market_phase(moment=None):
+    """IDX phase at `moment` (WIB): one of the session phases, 'closed', 'weekend' or 'holiday'"""
+    moment = (moment or now_wib()).astimezone(WIB)
+    day = moment.date()
+    if day.weekday() >= 5:
+        return "weekend"
+    if day in HOLIDAYS:
+        return "holiday"
+    clock = moment.time()
+    for phase, start, end in sessions(day):
+        if start <= clock < end:
+            return phase
+    return "closed"
+
+
+def next_open(moment=None):
+    """Start of the next active phase (pre-opening or session after the break) at or after `moment`"""
+    moment = (moment or now_wib()).astimezone(WIB)
+    day = moment.date()
+    for _ in range(30):
+        for phase, start, _end in sessions(day):
+            opening = datetime.combine(day, start, WIB)
+            if phase in ACTIVE_PHASES and opening >= moment:
+                return opening
+        day += timedelta(days=1)
+    return None
+
+
+# ============================================================
+# CYCLE DECISION
+# ============================================================
+def cycle_kind(moment=None, closing_done_on=None, idle_interval=MARKET_IDLE_INTERVAL):
+    """What the scheduler should do at `moment`.
+
+    'trade'   - market is moving, run the normal cycle
+    'closing' - first cycle after post-trading on a trading day: the final snapshot
+    'idle'    - thinned cycle outside trading (only with MARKET_IDLE_INTERVAL)
+    None      - skip, every book is frozen
+    """
+    moment = (moment or now_wib()).astimezone(WIB)
+    phase = market_phase(moment)
+    if phase in ACTIVE_PHASES:
+        return "trade"
+    day = moment.date()
+    if is_trading_day(day) and moment.time() >= CLOSING_SNAPSHOT_AT and closing_done_on != day:
+        return "closing"
+    if idle_interval and int(moment.timestamp()) % int(idle_interval) < 60:
+        return "idle"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the IDX market phase (WIB) for a moment.")
+    parser.add_argument("moment", nargs="?", help="ISO datetime in WIB, e.g. 2026-10-19T12:30 (default: now)")
+    args = parser.parse_args()
+    moment = datetime.fromisoformat(args.moment).replace(tzinfo=WIB) if args.moment else now_wib()
+    opening = next_open(moment)
+    print(f"{moment:%a %Y-%m-%d %H:%M:%S} WIB: {market_phase(moment)} -> cycle: {cycle_kind(moment)}")
+    if opening:
+        print(f"Next open: {opening:%a %Y-%m-%d %H:%M} WIB")
+
+
+if __name__ == "__main__":
+    main()
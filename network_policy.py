@@ -0,0 +1,248 @@
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+# ============================================================
+# POLICY DEFINITIONS
+# ============================================================
+HEAVY_TYPES = frozenset({"image", "font", "media"})
+
+ANALYTICS_PATTERNS = (
+    r"google-analytics\.com", r"googletagmanager\.com", r"doubleclick\.net",
+    r"connect\.facebook\.net", r"hotjar\.", r"clarity\.ms", r"segment\.(io|com)",
+    r"mixpanel\.com", r"amplitude\.com", r"sentry\.io", r"nr-data\.net", r"newrelic\.com",
+    r"datadoghq\.", r"appsflyer\.com", r"branch\.io", r"moengage\.com", r"onesignal\.com",
+)
+CHAT_WIDGET_PATTERNS = (
+    r"intercom(cdn)?\.(io|com)", r"zdassets\.com", r"zendesk\.com", r"freshchat\.com",
+    r"livechatinc\.com", r"crisp\.chat", r"tawk\.to", r"qiscus\.com",
+)
+CHART_PATTERNS = (
+    r"tradingview", r"charting_library", r"highcharts", r"amcharts", r"chart\.js",
+)
+
+
+@dataclass(frozen=True)
+class ResourcePolicy:
+    """What a page may load: resource types, URL patterns and third-party hosts to abort"""
+    name: str
+    block_types: frozenset = frozenset()
+    block_patterns: tuple = ()
+    first_party: tuple = ()  # host suffixes that are never treated as third-party
+    block_third_party: bool = False
+    _compiled: re.Pattern = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        if self.block_patterns:
+            object.__setattr__(self, "_compiled", re.compile("|".join(self.block_patterns), re.I))
+
+    def is_third_party(self, url):
+        host = urlsplit(url).hostname or ""
+        return not any(host == d or host.endswith("." + d) for d in self.first_party)
+
+    def block_reason(self, url, resource_type):
+        """Why a request should be aborted, or None to let it through"""
+        if resource_type in self.block_types:
+            return f"type:{resource_type}"
+        if self._compiled is not None and self._compiled.search(url):
+            return "pattern"
+        if self.block_third_party and resource_type != "document" and self.is_third_party(url):
+            return "third-party"
+        return None
+
+
+def _policies(site_domains, legacy_types):
+    trackers = ANALYTICS_PATTERNS + CHAT_WIDGET_PATTERNS
+    return {
+        "baseline": ResourcePolicy("baseline"),
+        "current": ResourcePolicy("current", block_types=legacy_types),
+        "lean": ResourcePolicy("lean", block_types=legacy_types, block_patterns=trackers),
+        "first-party": ResourcePolicy(
+            "first-party", block_types=legacy_types, block_patterns=trackers,
+            first_party=site_domains, block_third_party=True,
+        ),
+        "strict": ResourcePolicy(
+            "strict", block_types=legacy_types | {"stylesheet"},
+            block_patterns=trackers + CHART_PATTERNS,
+            first_party=site_domains, block_third_party=True,
+        ),
+    }
+
+
+# "current" reproduces what each scraper blocked before policies existed
+SITE_POLICIES = {
+    "ajaib": _policies(("ajaib.co.id",), HEAVY_TYPES),
+    "ipot": _policies(("indopremier.com", "ipot.id"), HEAVY_TYPES | {"stylesheet"}),
+}
+DEFAULT_POLICY = "current"
+
+
+def get_policy(site, name=None):
+    """Policy for `site`, chosen by name or the NETWORK_POLICY env var"""
+    name = name or os.getenv("NETWORK_POLICY", DEFAULT_POLICY)
+    try:
+        return SITE_POLICIES[site][name]
+    except KeyError:
+        raise ValueError(f"Unknown network policy '{name}' for {site}, "
+                         f"expected one of {list(SITE_POLICIES.get(site, {}))}") from None
+
+
+# ============================================================
+# BANDWIDTH ACCOUNTING
+# ============================================================
+class BandwidthMeter:
+    """Counts requests, bytes and blocked requests for the pages it is attached to"""
+
+    def __init__(self):
+        self.requests = 0
+        self.failed = 0
+        self.blocked = 0
+        self.blocked_by = {}
+        self.bytes = 0
+        self.bytes_by_type = {}
+        self._pending = set()
+
+    def attach(self, page):
+        page.on("requestfinished", self._on_finished)
+        page.on("requestfailed", self._on_failed)
+
+    def record_block(self, reason):
+        self.blocked += 1
+        self.blocked_by[reason] = self.blocked_by.get(reason, 0) + 1
+
+    def _on_failed(self, request):
+        # Aborted requests surface here too; they are already counted as blocked
+        self.failed += 1
+
+    def _on_finished(self, request):
+        self.requests += 1
+        task = asyncio.ensure_future(self._add_sizes(request))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _add_sizes(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        size = sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0)
+        self.bytes += size
+        rtype = request.resource_type
+        self.bytes_by_type[rtype] = self.bytes_by_type.get(rtype, 0) + size
+
+    async def settle(self):
+        """Wait for outstanding size lookups (call before the page closes)"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+
+async def install_policy(page, policy, meter=None, keep_cache=False):
+    """Route every request of `page` (or a whole browser context) through `policy`.
+
+    Playwright routing turns off the HTTP cache, so with `keep_cache` the
+    policy is enforced via CDP Fetch interception on the page instead.
+    """
+    if keep_cache:
+        await _install_policy_cdp(page, policy, meter)
+        return
+
+    async def handle(route):
+        request = route.request
+        reason = policy.block_reason(request.url, request.resource_type)
+        if reason:
+            if meter:
+                meter.record_block(reason)
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await page.route("**/*", handle)
+    if meter:
+        meter.attach(page)
+
+
+async def _install_policy_cdp(page, policy, meter=None):
+    if not (policy.block_types or policy.block_patterns or policy.block_third_party):
+        if meter:
+            meter.attach(page)
+        return
+    if policy.block_patterns or policy.block_third_party:
+        patterns = [{"urlPattern": "*"}]
+    else:
+        # Type-only policies pause just the types they block; scripts never wait on us
+        patterns = [{"urlPattern": "*", "resourceType": t.capitalize()} for t in sorted(policy.block_types)]
+    cdp = await page.context.new_cdp_session(page)
+
+    async def on_paused(event):
+        request_id = event["requestId"]
+        reason = policy.block_reason(event["request"]["url"], event["resourceType"].lower())
+        try:
+            if reason:
+                if meter:
+                    meter.record_block(reason)
+                await cdp.send("Fetch.failRequest", {"requestId": request_id, "errorReason": "BlockedByClient"})
+            else:
+                await cdp.send("Fetch.continueRequest", {"requestId": request_id})
+        except Exception:
+            pass  # page closed while the request was paused
+
+    cdp.on("Fetch.requestPaused", lambda event: asyncio.ensure_future(on_paused(event)))
+    await cdp.send("Fetch.enable", {"patterns": patterns})
+    if meter:
+        meter.attach(page)
+
+
+# ============================================================
+# POLICY MEASUREMENT
+# ============================================================
+async def measure_policies(browser, site, codes, scrape_fn, context_kwargs=None, policy_names=None):
+    """Load each ticker under each policy and report bytes/requests per page.
+
+    `scrape_fn(page, kode)` must raise when the orderbook does not render, so a
+    policy that is too aggressive shows up as failed pages rather than savings.
+    """
+    policy_names = policy_names or list(SITE_POLICIES[site])
+    report = []
+    for name in policy_names:
+        policy = SITE_POLICIES[site][name]
+        stats = {"policy": name, "pages": 0, "ok": 0, "bytes": 0, "requests": 0, "blocked": 0, "seconds": 0.0}
+        for kode in codes:
+            context = await browser.new_context(**(context_kwargs or {}))
+            meter = BandwidthMeter()
+            start = time.perf_counter()
+            try:
+                page = await context.new_page()
+                await install_policy(page, policy, meter)
+                await scrape_fn(page, kode)
+                stats["ok"] += 1
+            except Exception as e:
+                print(f"[POLICY] {name} {kode} failed: {e}")
+            finally:
+                stats["seconds"] += time.perf_counter() - start
+                await meter.settle()
+                await context.close()
+            stats["pages"] += 1
+            stats["bytes"] += meter.bytes
+            stats["requests"] += meter.requests
+            stats["blocked"] += meter.blocked
+        report.append(stats)
+
+    print(f"\n{'='*60}")
+    print(f"NETWORK POLICY REPORT - {site} ({len(codes)} tickers)")
+    print(f"{'policy':<12}{'ok':>8}{'KB/page':>12}{'req/page':>10}{'blocked':>10}{'s/page':>8}")
+    for s in report:
+        n = max(s["pages"], 1)
+        print(f"{s['policy']:<12}{s['ok']:>4}/{s['pages']:<3}{s['bytes']/n/1024:>12.1f}"
+              f"{s['requests']/n:>10.1f}{s['blocked']/n:>10.1f}{s['seconds']/n:>8.2f}")
+
+    best_ok = max(s["ok"] for s in report) if report else 0
+    rendering = [s for s in report if s["ok"] == best_ok]
+    if rendering:
+        cheapest = min(rendering, key=lambda s: s["bytes"])
+        print(f"[POLICY] Cheapest policy that still renders: {cheapest['policy']} "
+              f"(set NETWORK_POLICY={cheapest['policy']})")
+    print(f"{'='*60}\n")
+    return report
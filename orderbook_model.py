@@ -0,0 +1,271 @@
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from array import array
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib parser is the fallback
+    orjson = None
+
+from orderbook_summary import summarize
+
+MISSING = -1  # lot/num that did not parse; stored in the arrays, read back as None
+_STRIDE = 3  # (price, lot, num) per level
+
+
+def parse_int(value):
+    """'1,250' / '1.250' / 1250 / 1250.0 -> 1250; None when there is no number"""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    cleaned = value.replace(',', '').replace('.', '').strip()
+    if not cleaned:
+        return None
+    try:
+        return int(cleaned)
+    except ValueError:
+        return None
+
+
+def _pack(levels):
+    """Iterable of (price, lot, num) -> flat int64 array; levels without a price are dropped"""
+    out = array("q")
+    for price, lot, num in levels:
+        if price is None:
+            continue
+        out.append(price)
+        out.append(MISSING if lot is None else lot)
+        out.append(MISSING if num is None else num)
+    return out
+
+
+# ============================================================
+# MODEL
+# ============================================================
+class Level:
+    """One price level: integer price and lots, `num` as the source defines it (or None)"""
+
+    __slots__ = ("price", "lot", "num")
+
+    def __init__(self, price, lot, num=None):
+        self.price = price
+        self.lot = lot
+        self.num = num
+
+    def __iter__(self):
+        return iter((self.price, self.lot, self.num))
+
+    def __repr__(self):
+        return f"Level({self.price}, {self.lot}, {self.num})"
+
+
+class Snapshot:
+    """One ticker's book at one moment, parsed once into integer arrays.
+
+    Each side is a single array('q') of (price, lot, num) triples, so a
+    10x10 book costs two small buffers instead of dozens of dicts/strings.
+    `bids`/`asks` build Level objects on demand; the hot paths (`rows`,
+    `summary`) read the arrays directly.
+    """
+
+    __slots__ = ("kode", "timestamp", "_bids", "_asks", "reported_bid_lot", "reported_ask_lot")
+
+    def __init__(self, kode, timestamp, bids=(), asks=(), reported_bid_lot=None, reported_ask_lot=None):
+        self.kode = kode
+        self.timestamp = timestamp
+        self._bids = _pack(bids)
+        self._asks = _pack(asks)
+        self.reported_bid_lot = reported_bid_lot
+        self.reported_ask_lot = reported_ask_lot
+
+    @staticmethod
+    def _levels(packed):
+        for i in range(0, len(packed), _STRIDE):
+            lot, num = packed[i + 1], packed[i + 2]
+            yield packed[i], None if lot == MISSING else lot, None if num == MISSING else num
+
+    @property
+    def bids(self):
+        return [Level(*lvl) for lvl in self._levels(self._bids)]
+
+    @property
+    def asks(self):
+        return [Level(*lvl) for lvl in self._levels(self._asks)]
+
+    def __len__(self):
+        return (len(self._bids) + len(self._asks)) // _STRIDE
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __repr__(self):
+        return f"Snapshot({self.kode}, {self.timestamp}, {len(self._bids) // _STRIDE}x{len(self._asks) // _STRIDE})"
+
+    def rows(self, ask_side="A"):
+        """DB rows (kode, side, price, lot, num, timestamp) for orderbook_ajaib/orderbook_ipot"""
+        out = [(self.kode, "B", p, l, n, self.timestamp) for p, l, n in self._levels(self._bids)]
+        out.extend((self.kode, ask_side, p, l, n, self.timestamp) for p, l, n in self._levels(self._asks))
+        return out
+
+    def summary(self, source):
+        """orderbook_summary row, straight from the arrays"""
+        return summarize(
+            source, self.kode, self.timestamp,
+            [(p, l) for p, l, _ in self._levels(self._bids)],
+            [(p, l) for p, l, _ in self._levels(self._asks)],
+            self.reported_bid_lot, self.reported_ask_lot,
+        )
+
+
+def rows_from_snapshots(snapshots, ask_side="A"):
+    rows = []
+    for snap in snapshots:
+        rows.extend(snap.rows(ask_side))
+    return rows
+
+
+def summaries_from_snapshots(snapshots, source):
+    return [snap.summary(source) for snap in snapshots if snap]
+
+
+# ============================================================
+# PARSERS
+# ============================================================
+def _loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def parse_bestquote(raw):
+    """Ajaib bestquote response body (bytes/str) -> Snapshot; ValueError if it is not a book"""
+    data = _loads(raw)
+    try:
+        kode = data["code"]
+        buy, sell = data["buy_side"], data["sell_side"]
+        ts = datetime.fromtimestamp(buy["unix_time"] / 1000)
+        return Snapshot(
+            kode, ts,
+            ((int(i["price"]), int(i["lot"]), int(i["num"])) for i in buy["items"]),
+            ((int(i["price"]), int(i["lot"]), int(i["num"])) for i in sell["items"]),
+        )
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Unexpected bestquote format: {e}") from None
+
+
+def snapshot_from_text(kode, timestamp, bids, asks, numbered=True, reported_bid_lot=None, reported_ask_lot=None):
+    """DOM/websocket text levels [(price, lot), ...] -> Snapshot.
+
+    `numbered` stores the 1-based level position as `num` (IPOT); otherwise num is None (Ajaib).
+    """
+    return Snapshot(
+        kode, timestamp,
+        ((parse_int(p), parse_int(l), i if numbered else None) for i, (p, l) in enumerate(bids, start=1)),
+        ((parse_int(p), parse_int(l), i if numbered else None) for i, (p, l) in enumerate(asks, start=1)),
+        parse_int(reported_bid_lot), parse_int(reported_ask_lot),
+    )
+
+
+def snapshot_from_ipot(book):
+    """scrape_orderbook()-shaped dict (ipot_ws decoder) -> Snapshot"""
+    return snapshot_from_text(
+        book["stock_code"], datetime.fromisoformat(book["timestamp"]),
+        [(b.get("price"), b.get("volume")) for b in book.get("bids", [])],
+        [(a.get("price"), a.get("volume")) for a in book.get("asks", [])],
+        reported_bid_lot=book.get("total_bid_lot"), reported_ask_lot=book.get("total_ask_lot"),
+    )
+
+
+# ============================================================
+# MEMORY BENCHMARK
+# ============================================================
+def _fake_book(kode, levels, rng):
+    mid = rng.choice([50, 150, 420, 1800, 4500, 9000])
+    bids = [(f"{mid - i:,}", f"{rng.randint(1, 500000):,}") for i in range(1, levels + 1)]
+    asks = [(f"{mid + i:,}", f"{rng.randint(1, 500000):,}") for i in range(1, levels + 1)]
+    return kode, bids, asks
+
+
+def _measure(label, build, books):
+    tracemalloc.start()
+    start = time.perf_counter()
+    held = build(books)
+    built = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    payload = json.dumps(held["rows"](), default=str)
+    serialize = time.perf_counter() - start
+    print(f"{label:<22} held {current / 1024:>9.1f} KB  peak {peak / 1024:>9.1f} KB  "
+          f"build {built * 1000:>7.1f} ms  rows+json {serialize * 1000:>7.1f} ms ({len(payload) / 1024:.0f} KB)")
+
+
+def benchmark(tickers=955, levels=10, seed=1):
+    """Compare what one cycle's results cost to hold: text dicts, DataFrames and Snapshots"""
+    rng = random.Random(seed)
+    books = [_fake_book(f"T{i:04d}", levels, rng) for i in range(tickers)]
+    ts = datetime.now().isoformat()
+    print(f"Orderbook memory benchmark: {tickers} tickers x {levels} levels per side")
+
+    def as_dicts(books):
+        held = [{"stock_code": k, "timestamp": ts, "market_info": {},
+                 "bids": [{"price": p, "volume": v} for p, v in b],
+                 "asks": [{"price": p, "volume": v} for p, v in a]} for k, b, a in books]
+
+        def rows():
+            out = []
+            for d in held:
+                t = datetime.fromisoformat(d["timestamp"])
+                out += [(d["stock_code"], "B", parse_int(x["price"]), parse_int(x["volume"]), i, t)
+                        for i, x in enumerate(d["bids"], 1)]
+                out += [(d["stock_code"], "A", parse_int(x["price"]), parse_int(x["volume"]), i, t)
+                        for i, x in enumerate(d["asks"], 1)]
+            return out
+        return {"held": held, "rows": rows}
+
+    def as_snapshots(books):
+        t = datetime.fromisoformat(ts)
+        held = [snapshot_from_text(k, t, b, a) for k, b, a in books]
+        return {"held": held, "rows": lambda: rows_from_snapshots(held)}
+
+    _measure("dicts of strings", as_dicts, books)
+    try:
+        import pandas as pd
+    except ImportError:
+        print(f"{'DataFrame per ticker':<22} skipped (pandas not installed)")
+    else:
+        def as_frames(books):
+            held = [pd.DataFrame({"kode": k, "bid_price": [p for p, _ in b], "bid_lot": [v for _, v in b],
+                                  "ask_price": [p for p, _ in a], "ask_lot": [v for _, v in a], "timestamp": ts})
+                    for k, b, a in books]
+
+            def rows():
+                out = []
+                for df in held:
+                    for r in df.itertuples(index=False):
+                        t = pd.to_datetime(r.timestamp)
+                        out.append((r.kode, "B", parse_int(r.bid_price), parse_int(r.bid_lot), None, t))
+                        out.append((r.kode, "A", parse_int(r.ask_price), parse_int(r.ask_lot), None, t))
+                return out
+            return {"held": held, "rows": rows}
+        _measure("DataFrame per ticker", as_frames, books)
+    _measure("Snapshot (array)", as_snapshots, books)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory/serialization benchmark for the orderbook model.")
+    parser.add_argument("-n", "--tickers", type=int, default=955)
+    parser.add_argument("-l", "--levels", type=int, default=10, help="Levels per side")
+    args = parser.parse_args()
+    benchmark(args.tickers, args.levels)
+
+
+if __name__ == "__main__":
+    main()
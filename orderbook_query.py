@@ -0,0 +1,250 @@
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+
+from db_pool import get_pool
+from orderbook_summary import ASK_SIDES
+
+SOURCES = ("ajaib", "ipot")
+LATEST_TTL = 60.0  # seconds a cached latest snapshot is trusted for "now" lookups
+INDEX_NAME = "idx_kode_ts"
+
+
+def _table(source):
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source '{source}', expected one of {SOURCES}")
+    return f"orderbook_{source}"
+
+
+def _build_snapshots(source, rows):
+    """Group (kode, side, price, lot, num, timestamp) rows into snapshot dicts keyed by kode"""
+    books = {}
+    for kode, side, price, lot, num, ts in rows:
+        snap = books.get(kode)
+        if snap is None:
+            snap = books[kode] = {"source": source, "kode": kode, "timestamp": ts, "bids": [], "asks": []}
+        level = (price, lot, num)
+        if side == "B":
+            snap["bids"].append(level)
+        elif side in ASK_SIDES:
+            snap["asks"].append(level)
+    for snap in books.values():
+        snap["bids"].sort(key=lambda lvl: lvl[0], reverse=True)
+        snap["asks"].sort(key=lambda lvl: lvl[0])
+    return books
+
+
+def _valid_until(ts):
+    """Cache validity for a lookup at `ts`: None means "latest as of now" """
+    return None if ts >= datetime.now() - timedelta(seconds=1) else ts
+
+
+# ============================================================
+# INDEXES
+# ============================================================
+def ensure_indexes(conn=None):
+    """Create the (kode, timestamp) index on both raw tables if it is missing"""
+    pool = get_pool()
+    own = conn is None
+    conn = conn or pool.acquire()
+    try:
+        cur = conn.cursor()
+        for source in SOURCES:
+            table = _table(source)
+            cur.execute(
+                "SELECT COUNT(*) FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+                (table, INDEX_NAME),
+            )
+            if cur.fetchone()[0] == 0:
+                print(f"[INFO] Creating index {INDEX_NAME} on {table}")
+                cur.execute(f"ALTER TABLE {table} ADD INDEX {INDEX_NAME} (kode, timestamp)")
+        cur.close()
+    finally:
+        if own:
+            pool.release(conn)
+
+
+# ============================================================
+# LATEST SNAPSHOT CACHE
+# ============================================================
+class LatestSnapshotCache:
+    """In-memory latest snapshot per (source, kode).
+
+    Each entry remembers up to when it is known to be the latest. A snapshot
+    taken at T and known-latest up to L answers any as-of query for ts in
+    [T, L] exactly; beyond L it is only trusted for `ttl` seconds after load.
+    """
+
+    def __init__(self, ttl=LATEST_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, snapshot, valid_until=None):
+        """Cache a snapshot known to be the latest up to `valid_until` (default: now)"""
+        key = (snapshot["source"], snapshot["kode"])
+        is_latest = valid_until is None
+        valid_until = valid_until or datetime.now()
+        loaded_mono = time.monotonic() if is_latest else None
+        with self._lock:
+            current = self._entries.get(key)
+            if (current is None
+                    or current[0]["timestamp"] < snapshot["timestamp"]
+                    or (current[0]["timestamp"] == snapshot["timestamp"] and current[1] <= valid_until)):
+                self._entries[key] = (snapshot, valid_until, loaded_mono)
+
+    def get(self, source, kode, ts):
+        """Cached snapshot valid as of `ts`, or None"""
+        with self._lock:
+            entry = self._entries.get((source, kode))
+        if entry is not None:
+            snapshot, valid_until, loaded_mono = entry
+            # Past the known-valid window, only trust entries loaded as "latest" within the TTL
+            fresh = loaded_mono is not None and time.monotonic() - loaded_mono <= self.ttl
+            if snapshot["timestamp"] <= ts and (ts <= valid_until or fresh):
+                self.hits += 1
+                return snapshot
+        self.misses += 1
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+latest_cache = LatestSnapshotCache()
+
+
+# ============================================================
+# AS-OF LOOKUPS
+# ============================================================
+def as_of(source, kode, ts, use_cache=True):
+    """Full book for `kode` as of `ts` (latest snapshot with timestamp <= ts), or None"""
+    if use_cache:
+        cached = latest_cache.get(source, kode, ts)
+        if cached is not None:
+            return cached
+
+    table = _table(source)
+    valid_until = _valid_until(ts)
+    with get_pool().connection() as conn:
+        cur = conn.cursor()
+        try:
+            # The subquery is a single backwards seek on (kode, timestamp)
+            cur.execute(
+                f"SELECT kode, side, price, lot, num, timestamp FROM {table} "
+                f"WHERE kode = %s AND timestamp = ("
+                f"SELECT MAX(timestamp) FROM {table} WHERE kode = %s AND timestamp <= %s)",
+                (kode, kode, ts),
+            )
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+
+    snapshot = _build_snapshots(source, rows).get(kode)
+    if snapshot is not None and use_cache:
+        latest_cache.put(snapshot, valid_until=valid_until)
+    return snapshot
+
+
+def as_of_batch(source, kodes, ts, use_cache=True):
+    """As-of books for many tickers in one round trip; returns {kode: snapshot}"""
+    result = {}
+    pending = []
+    for kode in dict.fromkeys(kodes):
+        cached = latest_cache.get(source, kode, ts) if use_cache else None
+        if cached is not None:
+            result[kode] = cached
+        else:
+            pending.append(kode)
+    if not pending:
+        return result
+
+    table = _table(source)
+    placeholders = ", ".join(["%s"] * len(pending))
+    valid_until = _valid_until(ts)
+    with get_pool().connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"SELECT o.kode, o.side, o.price, o.lot, o.num, o.timestamp FROM {table} o "
+                f"JOIN (SELECT kode, MAX(timestamp) AS ts FROM {table} "
+                f"WHERE kode IN ({placeholders}) AND timestamp <= %s GROUP BY kode) m "
+                f"ON o.kode = m.kode AND o.timestamp = m.ts",
+                (*pending, ts),
+            )
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+
+    fetched = _build_snapshots(source, rows)
+    for kode, snapshot in fetched.items():
+        if use_cache:
+            latest_cache.put(snapshot, valid_until=valid_until)
+        result[kode] = snapshot
+    return result
+
+
+def latest(source, kode):
+    """Most recent snapshot for `kode`"""
+    return as_of(source, kode, datetime.now())
+
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+def benchmark(source, kodes, ts, repeat=3):
+    """Compare per-ticker lookups, one batch lookup, and cached lookups"""
+    print(f"[BENCH] source={source} tickers={len(kodes)} as_of={ts} repeat={repeat}")
+    for run in range(1, repeat + 1):
+        latest_cache.clear()
+        _, single = _timed(lambda: [as_of(source, k, ts, use_cache=False) for k in kodes])
+        _, batch = _timed(as_of_batch, source, kodes, ts, use_cache=False)
+        latest_cache.clear()
+        as_of_batch(source, kodes, ts)
+        _, cached = _timed(lambda: [as_of(source, k, ts) for k in kodes])
+        print(f"[BENCH] run {run}: single={single*1000:.1f}ms "
+              f"({single/len(kodes)*1000:.2f}ms/ticker) batch={batch*1000:.1f}ms "
+              f"cached={cached*1000:.2f}ms")
+    print(f"[BENCH] cache hits={latest_cache.hits} misses={latest_cache.misses}")
+    print(f"[INFO] DB pool: {get_pool().format_stats()}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Point-in-time orderbook lookups.")
+    parser.add_argument("command", choices=["get", "bench", "ensure-index"])
+    parser.add_argument("-s", "--source", choices=SOURCES, default="ajaib")
+    parser.add_argument("-c", "--codes", default="BBRI", help="Comma separated stock codes")
+    parser.add_argument("-t", "--ts", default=None, help="As-of time 'YYYY-MM-DD HH:MM:SS' (default: now)")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    ts = datetime.fromisoformat(args.ts) if args.ts else datetime.now()
+    codes = [c.strip().upper() for c in args.codes.split(",") if c.strip()]
+
+    if args.command == "ensure-index":
+        ensure_indexes()
+    elif args.command == "bench":
+        benchmark(args.source, codes, ts, repeat=args.repeat)
+    else:
+        for kode, snap in as_of_batch(args.source, codes, ts).items():
+            print(f"{kode} @ {snap['timestamp']}")
+            for (bp, bl, _), (ap, al, _) in zip(snap["bids"], snap["asks"]):
+                print(f"   {bl:>10} {bp:>10} | {ap:<10} {al:<10}")
+
+
+if __name__ == "__main__":
+    main()
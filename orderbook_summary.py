@@ -0,0 +1,108 @@
+from collections import defaultdict
+
+# IDX equity tick-size bands: (from price, up to price (exclusive), tick)
+TICK_BANDS = [
+    (0, 200, 1),
+    (200, 500, 2),
+    (500, 2000, 5),
+    (2000, 5000, 10),
+    (5000, None, 25),
+]
+TOP_N_IMBALANCE = 5
+ASK_SIDES = ("A", "S")  # Ajaib/IPOT scrapers write "A", the bestquote API writes "S"
+
+SUMMARY_COLUMNS = (
+    "source", "kode", "timestamp", "best_bid", "best_ask", "spread", "spread_ticks",
+    "bid_levels", "ask_levels", "bid_lot_total", "ask_lot_total", "imbalance_top5",
+    "reported_bid_lot", "reported_ask_lot",
+)
+
+
+def tick_size(price):
+    """Tick size for a given price"""
+    for start, end, tick in TICK_BANDS:
+        if end is None or price < end:
+            return tick
+    return TICK_BANDS[-1][2]
+
+
+def ticks_between(low, high):
+    """Number of ticks from `low` to `high`, crossing tick bands if needed (negative if crossed)"""
+    if low is None or high is None:
+        return None
+    sign = 1
+    if high < low:
+        low, high, sign = high, low, -1
+    ticks = 0.0
+    for start, end, tick in TICK_BANDS:
+        a = max(low, start)
+        b = high if end is None else min(high, end)
+        if b > a:
+            ticks += (b - a) / tick
+    return sign * int(round(ticks))
+
+
+def summarize(source, kode, timestamp, bids, asks, reported_bid_lot=None, reported_ask_lot=None):
+    """Build one summary row from (price, lot) levels of a single snapshot"""
+    bids = sorted((lvl for lvl in bids if lvl[0] is not None), key=lambda lvl: lvl[0], reverse=True)
+    asks = sorted((lvl for lvl in asks if lvl[0] is not None), key=lambda lvl: lvl[0])
+
+    best_bid = bids[0][0] if bids else None
+    best_ask = asks[0][0] if asks else None
+    spread = best_ask - best_bid if best_bid is not None and best_ask is not None else None
+
+    bid_top = sum(lot or 0 for _, lot in bids[:TOP_N_IMBALANCE])
+    ask_top = sum(lot or 0 for _, lot in asks[:TOP_N_IMBALANCE])
+    imbalance = (bid_top - ask_top) / (bid_top + ask_top) if bid_top + ask_top else None
+
+    return (
+        source,
+        kode,
+        timestamp,
+        best_bid,
+        best_ask,
+        spread,
+        ticks_between(best_bid, best_ask),
+        len(bids),
+        len(asks),
+        sum(lot or 0 for _, lot in bids),
+        sum(lot or 0 for _, lot in asks),
+        imbalance,
+        reported_bid_lot,
+        reported_ask_lot,
+    )
+
+
+def summaries_from_rows(rows, source, totals=None):
+    """Group flattened (kode, side, price, lot, num, timestamp) rows into summary rows.
+
+    `totals` optionally maps (kode, timestamp) -> (reported_bid_lot, reported_ask_lot).
+    """
+    books = defaultdict(lambda: ([], []))
+    for kode, side, price, lot, _num, ts in rows:
+        bids, asks = books[(kode, ts)]
+        if side == "B":
+            bids.append((price, lot))
+        elif side in ASK_SIDES:
+            asks.append((price, lot))
+
+    totals = totals or {}
+    summaries = []
+    for (kode, ts), (bids, asks) in books.items():
+        reported_bid, reported_ask = totals.get((kode, ts), (None, None))
+        summaries.append(summarize(source, kode, ts, bids, asks, reported_bid, reported_ask))
+    return summaries
+
+
+def insert_summaries(cursor, summaries):
+    """Upsert summary rows; replays of the same snapshot overwrite instead of duplicating"""
+    if not summaries:
+        return
+    cols = ", ".join(SUMMARY_COLUMNS)
+    placeholders = ", ".join(["%s"] * len(SUMMARY_COLUMNS))
+    updates = ", ".join(f"{c} = VALUES({c})" for c in SUMMARY_COLUMNS[3:])
+    cursor.executemany(
+        f"INSERT INTO orderbook_summary ({cols}) VALUES ({placeholders}) "
+        f"ON DUPLICATE KEY UPDATE {updates}",
+        summaries,
+    )
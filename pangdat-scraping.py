@@ -2,22 +2,21 @@ import asyncio
 import os
 import time
 import pandas as pd
-import mysql.connector
 from dotenv import load_dotenv
 from playwright.async_api import async_playwright
 from itertools import zip_longest
 from datetime import datetime
 
-load_dotenv()
-
-EMAIL = os.getenv("EMAIL")
-PASSWORD = os.getenv("PASSWORD")
-PIN_CODE = os.getenv("PINCODE")
+import engine
+from network_policy import get_policy, install_policy, measure_policies
+from readiness import wait_for_book_ready
+from live_stream import BookStreamer, parse_watchlist
+from orderbook_model import rows_from_snapshots, snapshot_from_text, summaries_from_snapshots
+from source_ajaib import (ASK_SELECTOR, BASE_SAHAM_URL, BID_SELECTOR, BOOK_SELECTOR, MAX_RETRIES, TIMEOUT,
+                          AjaibSource, ensure_logged_in, login_once_and_get_storage_state, scrape_stock)
 
-LOGIN_URL = "https://login.ajaib.co.id/login"
-BASE_SAHAM_URL = "https://invest.ajaib.co.id/home/saham"
+load_dotenv()
 
-PIN_CHECK_INTERVAL = 5000
 CSV_FILE = "scrap_result.csv"
 FAILED_LOG_FILE = "failed_emiten.csv"
 
@@ -29,365 +28,48 @@ list_kode = df_saham["Kode"].tolist()
 # Config - Conservative for Stability
 NUM_BROWSERS = 2
 MAX_CONCURRENT_PER_BROWSER = 5  # Reduced to prevent timeouts
-MAX_RETRIES = 5
-TIMEOUT = 90000  # Increased to 60 seconds
-
-csv_lock = asyncio.Lock()
 
+# Network resource policy (see network_policy.py); NETWORK_POLICY_MEASURE=1 compares them all
+NETWORK_POLICY = get_policy("ajaib")
+POLICY_MEASURE = os.getenv("NETWORK_POLICY_MEASURE") == "1"
+POLICY_MEASURE_SAMPLE = int(os.getenv("NETWORK_POLICY_SAMPLE", "5"))
 
-# ============================================================
-# HELPER FUNCTIONS
-# ============================================================
-def _to_int(text: str | None):
-    """Convert text to int, handling commas and dots"""
-    if not text:
-        return None
-    cleaned = text.replace(',', '').replace('.', '').strip()
-    if not cleaned:
-        return None
-    try:
-        return int(cleaned)
-    except ValueError:
-        return None
-
-
-def flatten_rows_ajaib(results):
-    """Convert scraped DataFrames to database rows format"""
-    rows = []
-    for df in results:
-        if df.empty:
-            continue
-        for _, row in df.iterrows():
-            kode = row.get("kode")
-            timestamp = pd.to_datetime(row.get("timestamp"))
-            
-            # Bid data
-            if pd.notna(row.get("bid_price")) and pd.notna(row.get("bid_lot")):
-                rows.append((
-                    kode,
-                    "B",
-                    _to_int(row.get("bid_price")),
-                    _to_int(row.get("bid_lot")),
-                    None,  # num - position/level not tracked in Ajaib scraper
-                    timestamp
-                ))
-            
-            # Ask data
-            if pd.notna(row.get("ask_price")) and pd.notna(row.get("ask_lot")):
-                rows.append((
-                    kode,
-                    "A",
-                    _to_int(row.get("ask_price")),
-                    _to_int(row.get("ask_lot")),
-                    None,  # num
-                    timestamp
-                ))
-    return rows
-
-
-def push_to_database(rows, table_name="orderbook_ajaib"):
-    """Insert rows into MySQL database"""
-    if not rows:
-        print("[WARN] No rows to insert")
-        return
-    
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-    )
-    try:
-        cur = conn.cursor()
-        cur.executemany(
-            f"INSERT INTO {table_name} (kode, side, price, lot, num, timestamp) VALUES (%s, %s, %s, %s, %s, %s)",
-            rows,
-        )
-        conn.commit()
-        print(f"[SUCCESS]Inserted {len(rows)} rows into DB table '{table_name}'")
-    except Exception as e:
-        print(f"[ERROR] Database insertion failed: {e}")
-        raise
-    finally:
-        cur.close()
-        conn.close()
+# Live streaming mode: keep these tickers open and write on every book change
+STREAM_WATCHLIST = parse_watchlist(os.getenv("STREAM_WATCHLIST"))
 
-
-# ============================================================
-# LOGIN FUNCTION
-# ============================================================
-async def login_once_and_get_storage_state(playwright):
-    """Login 1x untuk semua browser"""
-    print(f"[LOGIN] Login...")
-
-    browser = await playwright.chromium.launch(headless=False)
-    context = await browser.new_context()
-    page = await context.new_page()
-
-    try:
-        await page.goto(LOGIN_URL)
-        await page.fill('input[name=email]', EMAIL)
-        await page.fill('input[name=password]', PASSWORD)
-        await page.click('button[type=submit]')
-        await page.wait_for_selector('.pincode-input-container', timeout=15000)
-
-        await page.locator('.pincode-input-text').first.click()
-        await page.keyboard.type(PIN_CODE, delay=150)
-        await page.wait_for_timeout(PIN_CHECK_INTERVAL)
-        await page.wait_for_url('**/home')
-
-        try:
-            await page.get_by_role("button", name="Mengerti").click()
-        except:
-            pass
-
-        storage_state = await context.storage_state()
-        print(f"[SUCCESS]Login sukses! Session shared ke {NUM_BROWSERS} browsers")
-        return storage_state
-
-    finally:
-        await context.close()
-        await browser.close()
+csv_lock = asyncio.Lock()
 
 
 # ============================================================
-# ENSURE LOGGED IN
+# MAIN SCRAPING FUNCTION
 # ============================================================
-async def ensure_logged_in(page):
-    """Check session validity"""
-    try:
-        current_url = page.url
-    except Exception:
-        raise Exception("Page is closed")
-
-    if "/pin" in current_url:
-        print(f"[WARN] PIN diminta ulang")
-        await page.locator('.pincode-input-text').first.click()
-        await page.keyboard.type(PIN_CODE, delay=150)
-        await page.wait_for_timeout(PIN_CHECK_INTERVAL)
-
-    if "/login" in current_url:
-        raise Exception("Session expired")
+async def scrape_all_with_multiple_browsers(playwright, list_kode, write=True):
+    """Phase 1: Main scraping dengan all browsers"""
+    # Login, browsers, retries and the DB write are owned by the engine (see engine.py)
+    outcome = await engine.run(playwright, [AjaibSource()], list_kode,
+                               NUM_BROWSERS, MAX_CONCURRENT_PER_BROWSER, write=write)
+    return outcome["ajaib"]
 
 
 # ============================================================
-# SCRAPE 1 EMITEN
+# CSV LAYOUT
 # ============================================================
-async def scrape_stock(page, kode):
-    """Scrape single stock"""
-    await ensure_logged_in(page)
-
-    url = f"{BASE_SAHAM_URL}/{kode}"
-    # Wait domcontentloaded instead of load (faster)
-    await page.goto(url, timeout=TIMEOUT, wait_until="domcontentloaded")
-    await page.wait_for_url(f"**/{kode}", timeout=TIMEOUT)
-
-    curr_time = time.strftime('%Y-%m-%d %H:%M:%S')
-
-    # Wait for the orderbook container or price items to appear
-    try:
-        # Wait specifically for the item-price class which indicates data loaded
-        # Timeout slightly less than function timeout to allow for capture
-        await page.wait_for_selector(".item-price", timeout=10000)
-    except Exception:
-        # If timeout, it means data didn't load -> Raise error to trigger retry
-        raise Exception("Timeout waiting for orderbook data (selector .item-price not found)")
-
-    # BID
-    # Using specific class selectors as before, but wrapped in try-catch logic above implicitly
-    bid_lots = await page.locator("div.css-jw5rjj:nth-child(1) .item-lot").all_inner_texts()
-    bid_prices = await page.locator("div.css-jw5rjj:nth-child(1) .item-price").all_inner_texts()
-
-    # ASK
-    ask_prices = await page.locator("div.css-jw5rjj:nth-child(2) .item-price").all_inner_texts()
-    ask_lots = await page.locator("div.css-jw5rjj:nth-child(2) .item-lot").all_inner_texts()
-
-    max_len = max(len(bid_lots), len(bid_prices),
-                  len(ask_prices), len(ask_lots))
-
-    if max_len == 0:
-        # Raise exception so it counts as a failure and triggers retry
-        raise Exception("Data found but empty rows (possible DOM change or empty market)")
-
+def snapshots_to_frame(snapshots):
+    """Snapshots -> the wide bid/ask CSV layout scrap_result.csv has always used"""
     rows = []
-    for b_lot, b_price, a_price, a_lot in zip_longest(bid_lots, bid_prices, ask_prices, ask_lots, fillvalue=None):
-        rows.append({
-            "kode": kode,
-            "bid_lot": b_lot,
-            "bid_price": b_price,
-            "ask_price": a_price,
-            "ask_lot": a_lot,
-            "timestamp": curr_time,
-        })
-
+    for snap in snapshots:
+        for bid, ask in zip_longest(snap.bids, snap.asks):
+            rows.append({
+                "kode": snap.kode,
+                "bid_lot": bid.lot if bid else None,
+                "bid_price": bid.price if bid else None,
+                "ask_price": ask.price if ask else None,
+                "ask_lot": ask.lot if ask else None,
+                "timestamp": snap.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            })
     return pd.DataFrame(rows)
 
 
-# ============================================================
-# SCRAPE WITH CONTEXT (SINGLE ATTEMPT)
-# ============================================================
-async def scrape_stock_with_context(browser, kode, browser_id, storage_state):
-    """Single scrape attempt"""
-    context = None
-    page = None
-    try:
-        context = await browser.new_context(storage_state=storage_state)
-        page = await context.new_page()
-
-        # Block unnecessary resources untuk speed up
-        # We cannot block 'script' because Ajaib is a React App (needs JS to render)
-        # await page.route("**/*", lambda route: route.abort()
-        #                  if route.request.resource_type in ["image", "font", "stylesheet", "media"]
-        #                  else route.continue_())
-        await page.route("**/*", lambda route: route.continue_()
-            if route.request.resource_type in ["script", "xhr", "fetch", "document"]
-            else route.abort() if route.request.resource_type in ["image","font","media"] else route.continue_())
-        df = await scrape_stock(page, kode)
-        return {"success": True, "kode": kode, "data": df, "error": None}
-    except Exception as e:
-        # Capture screenshot on failure
-        try:
-            if page:
-                if not os.path.exists("error_screenshots"):
-                    os.makedirs("error_screenshots")
-                
-                # Format: error_KODE_HHMMSS.png
-                ts = datetime.now().strftime('%H%M%S')
-                await page.screenshot(path=f"error_screenshots/{kode}_{ts}.png")
-        except Exception as scr_err:
-            print(f"[WARN] Failed to save screenshot: {scr_err}")
-
-        return {"success": False, "kode": kode, "data": pd.DataFrame(), "error": str(e)}
-    finally:
-        if context:
-            try:
-                await context.close()
-            except:
-                pass
-
-
-# ============================================================
-# SCRAPE WITH RETRY
-# ============================================================
-async def scrape_with_retry(browser, kode, browser_id, storage_state, semaphore, max_retries=MAX_RETRIES):
-    """Scrape dengan retry mechanism"""
-    async with semaphore:
-        for attempt in range(1, max_retries + 1):
-            result = await scrape_stock_with_context(browser, kode, browser_id, storage_state)
-
-            if result["success"] and not result["data"].empty:
-                if attempt > 1:
-                    print(f"[SUCCESS]{kode} berhasil (attempt {attempt})")
-                return result
-
-            if attempt < max_retries:
-                wait_time = attempt * 2  # Exponential backoff
-                await asyncio.sleep(wait_time)
-
-        # All attempts failed
-        print(
-            f"[ERROR] {kode} gagal setelah {max_retries} attempts: {result['error']}")
-        return result
-
-
-# ============================================================
-# SCRAPE WITH ONE BROWSER
-# ============================================================
-async def scrape_with_one_browser(playwright, browser_id, kode_list, storage_state):
-    """1 Browser handle batch kode"""
-    print(f"[BROWSER] Browser-{browser_id} starting with {len(kode_list)} emiten")
-
-    browser = None
-    try:
-        browser = await playwright.chromium.launch(headless=True)
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_PER_BROWSER)
-
-        # Create tasks with retry
-        tasks = [
-            scrape_with_retry(browser, kode, browser_id,
-                              storage_state, semaphore)
-            for kode in kode_list
-        ]
-
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Separate success and failed
-        success_data = []
-        failed_list = []
-
-        for result in results:
-            if isinstance(result, Exception):
-                failed_list.append({"kode": "unknown", "error": str(result)})
-            elif result["success"] and not result["data"].empty:
-                success_data.append(result["data"])
-            else:
-                failed_list.append(
-                    {"kode": result["kode"], "error": result["error"]})
-
-        print(
-            f"[SUCCESS]Browser-{browser_id} done: {len(success_data)}/{len(kode_list)} success")
-        return {"success": success_data, "failed": failed_list}
-
-    except Exception as e:
-        print(f"[ERROR] Browser-{browser_id} fatal error: {e}")
-        return {"success": [], "failed": [{"kode": k, "error": str(e)} for k in kode_list]}
-    finally:
-        if browser:
-            try:
-                await asyncio.sleep(0.5)
-                await browser.close()
-            except Exception as e:
-                print(f"[WARN] Error closing browser-{browser_id}: {e}")
-
-
-# ============================================================
-# SPLIT LIST
-# ============================================================
-def split_list(lst, n):
-    """Split list into n chunks"""
-    k, m = divmod(len(lst), n)
-    return [lst[i*k+min(i, m):(i+1)*k+min(i+1, m)] for i in range(n)]
-
-
-# ============================================================
-# MAIN SCRAPING FUNCTION
-# ============================================================
-async def scrape_all_with_multiple_browsers(playwright, list_kode):
-    """Phase 1: Main scraping dengan all browsers"""
-
-    # Login fresh
-    storage_state = await login_once_and_get_storage_state(playwright)
-
-    # Split work
-    chunks = split_list(list_kode, NUM_BROWSERS)
-
-    print(f"\n[INFO] Pembagian Kerja:")
-    for i, chunk in enumerate(chunks, 1):
-        print(f"   Browser-{i}: {len(chunk)} emiten")
-    print()
-
-    # Run all browsers parallel
-    tasks = [
-        scrape_with_one_browser(playwright, i+1, chunk, storage_state)
-        for i, chunk in enumerate(chunks)
-    ]
-
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # Combine results
-    all_success = []
-    all_failed = []
-
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            print(f"[ERROR] Browser-{i+1} completely failed: {result}")
-        else:
-            all_success.extend(result["success"])
-            all_failed.extend(result["failed"])
-
-    return all_success, all_failed
-
-
 # ============================================================
 # LOG FAILED EMITEN
 # ============================================================
@@ -433,7 +115,7 @@ async def scrape_every_15_minutes(playwright, list_kode):
         start_time = time.time()
 
         # Main scraping
-        all_success, all_failed = await scrape_all_with_multiple_browsers(playwright, list_kode)
+        all_success, all_failed = await scrape_all_with_multiple_browsers(playwright, list_kode, write=False)
 
         elapsed = time.time() - start_time
 
@@ -453,7 +135,7 @@ async def scrape_every_15_minutes(playwright, list_kode):
 
         # Save results
         if all_success:
-            final_df = pd.concat(all_success, ignore_index=True)
+            final_df = snapshots_to_frame(all_success)
             async with csv_lock:
                 write_header = not os.path.exists(
                     CSV_FILE) or os.path.getsize(CSV_FILE) == 0
@@ -506,19 +188,13 @@ async def scrape_once(playwright, list_kode):
     # Save to CSV
     # NOTE: no need to save to CSV since we use MySQL now
     # if all_success:
-    #     final_df = pd.concat(all_success, ignore_index=True)
+    #     final_df = snapshots_to_frame(all_success)
     #     async with csv_lock:
     #         write_header = not os.path.exists(CSV_FILE) or os.path.getsize(CSV_FILE) == 0
     #         final_df.to_csv(CSV_FILE, mode='a', index=False, header=write_header)
     #         print(f"[SAVED] CSV saved: {len(final_df)} rows to {CSV_FILE}")
 
-    # Insert to Database
-    if all_success:
-        try:
-            rows = flatten_rows_ajaib(all_success)
-            push_to_database(rows, table_name="orderbook_ajaib")
-        except Exception as e:
-            print(f"[ERROR] DB insert failed: {e}")
+    # Database insert already happened in engine.run()
 
     # Log failed
     if all_failed:
@@ -527,12 +203,84 @@ async def scrape_once(playwright, list_kode):
         print(f"   Failed emiten: {', '.join([f['kode'] for f in all_failed[:10]])}"
               f"{' ...' if len(all_failed) > 10 else ''}")
 
+# ============================================================
+# NETWORK POLICY MEASUREMENT
+# ============================================================
+async def measure_network_policies(playwright, list_kode):
+    """Compare bytes/requests per ticker load under every Ajaib network policy"""
+    storage_state = await login_once_and_get_storage_state(playwright)
+    browser = await playwright.chromium.launch(headless=True)
+    try:
+        await measure_policies(browser, "ajaib", list_kode[:POLICY_MEASURE_SAMPLE], scrape_stock,
+                               context_kwargs={"storage_state": storage_state})
+    finally:
+        await browser.close()
+
+
+# ============================================================
+# LIVE STREAMING
+# ============================================================
+STREAM_SELECTORS = {
+    "bid_price": f"{BID_SELECTOR} .item-price",
+    "bid_lot": f"{BID_SELECTOR} .item-lot",
+    "ask_price": f"{ASK_SELECTOR} .item-price",
+    "ask_lot": f"{ASK_SELECTOR} .item-lot",
+}
+
+
+def write_stream_batch(snapshots):
+    """Writer path for streamed snapshots (runs in a worker thread)"""
+    books = [snapshot_from_text(s["kode"], s["timestamp"], s["bids"], s["asks"], numbered=False) for s in snapshots]
+    engine.push_rows("orderbook_ajaib", rows_from_snapshots(books), summaries_from_snapshots(books, "ajaib"),
+                     spool_name="ajaib-stream")
+
+
+async def open_stream_page(page, kode):
+    await page.goto(f"{BASE_SAHAM_URL}/{kode}", timeout=TIMEOUT, wait_until="domcontentloaded")
+    await ensure_logged_in(page)
+    await wait_for_book_ready(
+        page,
+        bid_selector=STREAM_SELECTORS["bid_price"],
+        ask_selector=STREAM_SELECTORS["ask_price"],
+        container_selector=BOOK_SELECTOR,
+    )
+
+
+async def stream_watchlist(playwright, watchlist):
+    """Pin the watchlist across NUM_BROWSERS browsers and stream book changes"""
+    print(f"[STREAM] Ajaib watchlist ({len(watchlist)}): {', '.join(watchlist)}")
+    storage_state = await login_once_and_get_storage_state(playwright)
+    browsers = []
+    try:
+        contexts = []
+        for _ in range(min(NUM_BROWSERS, len(watchlist))):
+            browser = await playwright.chromium.launch(headless=True)
+            browsers.append(browser)
+            context = await browser.new_context(storage_state=storage_state)
+            await install_policy(context, NETWORK_POLICY)
+            contexts.append(context)
+        streamer = BookStreamer("ajaib", STREAM_SELECTORS, open_stream_page, write_stream_batch)
+        await streamer.run(contexts, watchlist)
+    finally:
+        for browser in browsers:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+
 # ============================================================
 # MAIN
 # ============================================================
 async def main():
     async with async_playwright() as p:
         try:
+            if POLICY_MEASURE:
+                await measure_network_policies(p, list_kode)
+                return
+            if STREAM_WATCHLIST:
+                await stream_watchlist(p, STREAM_WATCHLIST)
+                return
             await scrape_once(p, list_kode)
         except KeyboardInterrupt:
             print("\n[WARN] Keyboard interrupt detected")
@@ -0,0 +1,213 @@
+import asyncio
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+# PROFILE=1 (or engine.py --profile) wraps every engine run; off by default
+PROFILE = os.getenv("PROFILE") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))  # stack sampling period
+PROFILE_LAG_WARN_MS = float(os.getenv("PROFILE_LAG_WARN_MS", "200"))
+PROFILE_TRACE_SAMPLE = float(os.getenv("PROFILE_TRACE_SAMPLE", "0.02"))  # share of tickers traced
+PROFILE_TRACE_MAX = int(os.getenv("PROFILE_TRACE_MAX", "10"))  # traces per run
+PROFILE_TRACE_CODES = {c.strip().upper() for c in os.getenv("PROFILE_TRACE_CODES", "").split(",") if c.strip()}
+LAG_PROBE_SECONDS = 0.1
+IDLE_FRAMES = {"select", "poll", "epoll", "kqueue", "_poll"}  # the loop blocked waiting for I/O
+
+_enabled = PROFILE
+_session = None
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+# ============================================================
+# STACK SAMPLER
+# ============================================================
+class StackSampler(threading.Thread):
+    """Samples the event-loop thread's stack and aggregates folded stacks.
+
+    Each sample is rooted at the asyncio task that was running, or at
+    "[waiting on I/O]" when the loop sat in select(), so one flame graph
+    shows both where Python burns CPU and how much of the run is waiting.
+    """
+
+    def __init__(self, loop, thread_id, interval_ms=PROFILE_INTERVAL_MS):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.loop = loop
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            idle = False
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                idle = idle or (code.co_name in IDLE_FRAMES and "selector" in code.co_filename)
+                frame = frame.f_back
+            names.reverse()
+            if idle:
+                root = "[waiting on I/O]"
+                self.idle += 1
+            else:
+                root = self._task_name()
+            self.samples += 1
+            self.stacks[";".join([root] + names)] += 1
+
+    def _task_name(self):
+        try:
+            task = asyncio.current_task(self.loop)
+        except Exception:
+            task = None
+        return f"task:{task.get_name()}" if task else "[loop callbacks]"
+
+    def stop(self):
+        self._halt.set()
+        self.join(timeout=1)
+
+    def write(self, path):
+        """Brendan Gregg's folded format: flamegraph.pl, speedscope and inferno all read it"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# ============================================================
+# EVENT-LOOP LAG
+# ============================================================
+class LoopLagMonitor:
+    """How late a short sleep wakes up: time the loop was blocked by synchronous work"""
+
+    def __init__(self, warn_ms=PROFILE_LAG_WARN_MS):
+        self.warn_ms = warn_ms
+        self.lags_ms = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_PROBE_SECONDS)
+            lag = (loop.time() - start - LAG_PROBE_SECONDS) * 1000
+            self.lags_ms.append(lag)
+            if lag >= self.warn_ms:
+                print(f"[PROFILE] event loop blocked for {lag:.0f}ms")
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def format_stats(self):
+        if not self.lags_ms:
+            return "no samples"
+        lags = sorted(self.lags_ms)
+        p95 = lags[min(len(lags) - 1, int(len(lags) * 0.95))]
+        return (f"p50 {statistics.median(lags):.1f}ms, p95 {p95:.1f}ms, max {lags[-1]:.1f}ms, "
+                f"{sum(lag >= self.warn_ms for lag in lags)} stalls >= {self.warn_ms:.0f}ms")
+
+
+# ============================================================
+# SESSION
+# ============================================================
+class ProfileSession:
+    def __init__(self, name):
+        self.name = name
+        self.stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.root = PROFILE_DIR
+        self.sampler = StackSampler(asyncio.get_running_loop(), threading.get_ident())
+        self.lag = LoopLagMonitor()
+        self.traces = []
+        self._trace_budget = PROFILE_TRACE_MAX
+        os.makedirs(os.path.join(self.root, "traces"), exist_ok=True)
+
+    def wants_trace(self, kode):
+        if self._trace_budget <= 0:
+            return False
+        if PROFILE_TRACE_CODES:
+            take = kode.upper() in PROFILE_TRACE_CODES
+        else:
+            take = random.random() < PROFILE_TRACE_SAMPLE
+        if take:
+            self._trace_budget -= 1
+        return take
+
+    def trace_path(self, kode, ok):
+        return os.path.join(self.root, "traces", f"{self.name}_{self.stamp}_{kode}_{'ok' if ok else 'fail'}.zip")
+
+
+@asynccontextmanager
+async def profile_run(name):
+    """Profile everything inside the block when profiling is on; a no-op otherwise"""
+    global _session
+    if not _enabled:
+        yield None
+        return
+    session = ProfileSession(name.replace("+", "-"))
+    session.sampler.start()
+    session.lag.start()
+    _session = session
+    start = time.perf_counter()
+    try:
+        yield session
+    finally:
+        _session = None
+        await session.lag.stop()
+        session.sampler.stop()
+        elapsed = time.perf_counter() - start
+        path = os.path.join(session.root, f"{session.name}_{session.stamp}.folded")
+        session.sampler.write(path)
+        s = session.sampler
+        busy = 1 - s.idle / s.samples if s.samples else 0.0
+        print(f"[PROFILE] {session.name}: {elapsed:.1f}s, {s.samples} samples, loop busy {busy:.0%} "
+              f"(rest waiting on the browser/network)")
+        print(f"[PROFILE] loop lag: {session.lag.format_stats()}")
+        print(f"[PROFILE] flame graph stacks: {path}"
+              + (f", {len(session.traces)} Playwright traces in {os.path.join(session.root, 'traces')}"
+                 if session.traces else ""))
+
+
+async def start_trace(context, kode):
+    """Start a Playwright trace on `context` if this ticker is sampled; returns whether it did"""
+    if _session is None or not _session.wants_trace(kode):
+        return False
+    try:
+        await context.tracing.start(screenshots=True, snapshots=True)
+    except Exception as e:
+        print(f"[PROFILE] {kode} could not start trace: {e}")
+        return False
+    return True
+
+
+async def stop_trace(context, kode, ok):
+    if _session is None:
+        return
+    path = _session.trace_path(kode, ok)
+    try:
+        await context.tracing.stop(path=path)
+        _session.traces.append(path)
+    except Exception as e:
+        print(f"[PROFILE] {kode} could not save trace: {e}")
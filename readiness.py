@@ -0,0 +1,66 @@
+DEBOUNCE_MS = 250
+MAX_STABLE_MS = 1500
+READY_TIMEOUT_MS = 10000
+
+# Resolves once both sides have rows and the DOM has been quiet for `debounceMs`.
+# A live book keeps mutating, so after `maxStableMs` of being populated it resolves anyway.
+# On timeout the state says *why* it is not ready:
+#   partial  - only one side has rows
+#   empty    - the orderbook container rendered but has no rows
+#   missing  - the container itself never appeared (login wall, DOM change, ...)
+_READY_JS = """
+([bidSel, askSel, containerSel, debounceMs, maxStableMs, timeoutMs]) => new Promise((resolve) => {
+    const start = performance.now();
+    let done = false;
+    let stableTimer = null;
+    let populatedSince = null;
+    const count = () => [
+        document.querySelectorAll(bidSel).length,
+        document.querySelectorAll(askSel).length,
+    ];
+    const finish = (state) => {
+        if (done) return;
+        done = true;
+        observer.disconnect();
+        clearTimeout(stableTimer);
+        clearTimeout(deadline);
+        const [bids, asks] = count();
+        resolve({state, bids, asks, elapsed_ms: performance.now() - start});
+    };
+    const check = () => {
+        const [bids, asks] = count();
+        if (bids > 0 && asks > 0) {
+            const now = performance.now();
+            if (populatedSince === null) populatedSince = now;
+            clearTimeout(stableTimer);
+            if (now - populatedSince >= maxStableMs) return finish("ready");
+            stableTimer = setTimeout(() => finish("ready"), debounceMs);
+        } else {
+            populatedSince = null;
+            clearTimeout(stableTimer);
+        }
+    };
+    const observer = new MutationObserver(check);
+    observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+    const deadline = setTimeout(() => {
+        const [bids, asks] = count();
+        if (bids + asks > 0) finish("partial");
+        else finish(document.querySelector(containerSel) ? "empty" : "missing");
+    }, timeoutMs);
+    check();
+})
+"""
+
+
+async def wait_for_book_ready(page, bid_selector, ask_selector, container_selector,
+                              debounce_ms=DEBOUNCE_MS, max_stable_ms=MAX_STABLE_MS,
+                              timeout_ms=READY_TIMEOUT_MS):
+    """Wait in-page for the orderbook to be populated and stable.
+
+    Returns {"state", "bids", "asks", "elapsed_ms"} where state is one of
+    ready / partial / empty / missing.
+    """
+    return await page.evaluate(
+        _READY_JS,
+        [bid_selector, ask_selector, container_selector, debounce_ms, max_stable_ms, timeout_ms],
+    )
@@ -0,0 +1,199 @@
+import asyncio
+import time
+from collections import deque
+
+BREAKER_WINDOW = 20  # most recent attempts considered
+BREAKER_MIN_CALLS = 10
+BREAKER_ERROR_RATE = 0.8
+BREAKER_COOLDOWN = 30.0  # seconds a tripped source stays paused
+MAX_REQUEUES = 3  # free requeues per item before a lost attempt counts as a failure
+DEFER = "defer"  # attempt_fn verdict: finish the item now, it is picked up next cycle
+
+
+def default_backoff(attempt):
+    return attempt * 2
+
+
+# ============================================================
+# CIRCUIT BREAKER
+# ============================================================
+class CircuitBreaker:
+    """Per-source breaker: pauses every worker when the recent error rate spikes.
+
+    closed    - attempts flow normally
+    open      - nobody starts an attempt until the cooldown has passed
+    half_open - a single probe attempt decides between closed and open again
+    """
+
+    def __init__(self, name, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 error_rate=BREAKER_ERROR_RATE, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.trips = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._open_for = cooldown
+        self._probe_running = False
+        self._probe_id = 0  # token of the current half-open probe
+        self._changed = asyncio.Condition()
+
+    def _open(self, reason, cooldown=None):
+        self.state = "open"
+        self.trips += 1
+        self._opened_at = time.monotonic()
+        self._open_for = cooldown or self.cooldown
+        self._probe_running = False
+        self._outcomes.clear()
+        print(f"[BREAKER] {self.name} OPEN for {self._open_for:.0f}s: {reason}")
+
+    def trip(self, reason, cooldown=None):
+        """Open the breaker immediately (e.g. the session expired)"""
+        if self.state != "open":
+            self._open(reason, cooldown)
+
+    async def record(self, success, error=None, probe=False):
+        """Outcome of an attempt; `probe` is the token acquire() returned for it.
+
+        Only the current probe moves a half-open breaker. Attempts that started
+        before the breaker opened are ignored until it is closed again.
+        """
+        async with self._changed:
+            if probe:
+                if self.state != "half_open" or probe != self._probe_id:
+                    return  # tripped again meanwhile (e.g. session expired); the next probe decides
+                self._probe_running = False
+                if success:
+                    self.state = "closed"
+                    print(f"[BREAKER] {self.name} closed (probe succeeded)")
+                else:
+                    self._open(f"probe failed: {error}")
+                self._changed.notify_all()
+                return
+            if self.state != "closed":
+                # Started before the breaker opened: says nothing about the probe or the next window
+                return
+            self._outcomes.append(bool(success))
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._open(f"{failures}/{len(self._outcomes)} recent attempts failed, last: {error}")
+
+    async def release(self, probe=False):
+        """Give back an acquired slot without recording an outcome"""
+        async with self._changed:
+            if probe and self.state == "half_open" and probe == self._probe_id:
+                self._probe_running = False
+                self._changed.notify_all()
+
+    async def acquire(self):
+        """Wait until an attempt may start.
+
+        Returns a probe token (truthy) when this attempt is the half-open probe,
+        0 otherwise; pass it back to record()/release().
+        """
+        async with self._changed:
+            while True:
+                if self.state == "closed":
+                    return 0
+                if self.state == "open":
+                    remaining = self._opened_at + self._open_for - time.monotonic()
+                    if remaining <= 0:
+                        self.state = "half_open"
+                        print(f"[BREAKER] {self.name} half-open, probing")
+                        continue
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                # half_open: exactly one probe at a time
+                if not self._probe_running:
+                    self._probe_running = True
+                    self._probe_id += 1
+                    return self._probe_id
+                await self._changed.wait()
+
+
+# ============================================================
+# DEFERRED RETRY QUEUE
+# ============================================================
+async def run_queue(items, attempt_fn, concurrency, max_retries, breaker=None,
+                    backoff=default_backoff, label=""):
+    """Run `attempt_fn(item, attempt)` for every item with at most `concurrency` in flight.
+
+    `attempt_fn` returns (ok, result). A failed item is put back on the queue
+    after `backoff(attempt)` seconds instead of sleeping inside its slot, so the
+    slot immediately goes to the next ticker. ok=None means the attempt never
+    really ran (e.g. its browser crashed underneath it): the item is requeued
+    at once without using up a retry. ok=DEFER finishes the item with its
+    result without retrying or counting against the breaker (e.g. the cycle
+    ran out of time). Returns results in input order.
+    """
+    items = list(items)
+    if not items:
+        return []
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    results = [None] * len(items)
+    remaining = len(items)
+    requeues = [0] * len(items)
+    done = asyncio.Event()
+
+    for idx in range(len(items)):
+        queue.put_nowait((idx, 1))
+
+    async def worker():
+        nonlocal remaining
+        while True:
+            idx, attempt = await queue.get()
+            probe = 0
+            if breaker:
+                probe = await breaker.acquire()
+            try:
+                ok, result = await attempt_fn(items[idx], attempt)
+            except Exception as e:
+                ok, result = False, e
+            if ok is None and requeues[idx] < MAX_REQUEUES:
+                requeues[idx] += 1
+                if breaker:
+                    await breaker.release(probe)
+                queue.put_nowait((idx, attempt))
+                continue
+            if ok == DEFER:
+                if breaker:
+                    await breaker.release(probe)
+                results[idx] = result
+                remaining -= 1
+                if remaining == 0:
+                    done.set()
+                continue
+            ok = bool(ok)
+            if breaker:
+                await breaker.record(ok, None if ok else _error_text(result), probe)
+
+            if ok or attempt >= max_retries:
+                results[idx] = result
+                remaining -= 1
+                if remaining == 0:
+                    done.set()
+            else:
+                loop.call_later(backoff(attempt), queue.put_nowait, (idx, attempt + 1))
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        await done.wait()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    if label and breaker and breaker.trips:
+        print(f"[BREAKER] {label}: breaker tripped {breaker.trips}x during this run")
+    return results
+
+
+def _error_text(result):
+    if isinstance(result, dict):
+        return result.get("error")
+    return str(result)
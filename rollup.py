@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import market_calendar
+from consolidate import SOURCES, load_books, normalize, synthetic_day
+from db_pool import get_pool
+
+ROLLUP_TABLE = "orderbook_rollup"
+ROLLUP_STATE_FILE = os.getenv("ROLLUP_STATE_FILE", "rollup_state.json")  # last day rolled up per source
+ROLLUP_MAX_DAYS = int(os.getenv("ROLLUP_MAX_DAYS", "7"))  # days rolled up per run while catching up
+# resolution -> pandas frequency of its buckets
+ROLLUP_RESOLUTIONS = {"15m": "15min", "1h": "1h", "1d": "1D"}
+ROLLUP_COLUMNS = (
+    "source", "kode", "resolution", "bucket",
+    "bid_open", "bid_high", "bid_low", "bid_close",
+    "ask_open", "ask_high", "ask_low", "ask_close",
+    "spread_avg", "bid_depth_avg", "ask_depth_avg", "samples",
+)
+
+# Days of raw history kept; only days that are already rolled up are ever removed
+RETENTION_RAW_DAYS = int(os.getenv("RETENTION_RAW_DAYS", "14"))
+RETENTION_SUMMARY_DAYS = int(os.getenv("RETENTION_SUMMARY_DAYS", "90"))
+# Spool batch ids only have to outlive the oldest segment that could still be replayed
+RETENTION_INGEST_DAYS = int(os.getenv("RETENTION_INGEST_DAYS", "30"))
+# table -> (days kept, sources that must be rolled up first, timestamp column)
+RETENTION = {
+    "orderbook_ajaib": (RETENTION_RAW_DAYS, ("ajaib",), "timestamp"),
+    "orderbook_ipot": (RETENTION_RAW_DAYS, ("ipot",), "timestamp"),
+    "orderbook_summary": (RETENTION_SUMMARY_DAYS, SOURCES, "timestamp"),
+    "ingest_batches": (RETENTION_INGEST_DAYS, (), "ingested_at"),
+}
+DELETE_CHUNK = int(os.getenv("RETENTION_DELETE_CHUNK", "20000"))
+DELETE_PAUSE = 0.05  # seconds between chunks so ingest keeps its share of the server
+PARTITION_AHEAD_DAYS = 7  # daily partitions kept created ahead of today
+PARTITION_NAME = re.compile(r"^p(\d{8})$")  # one partition per day: p20261019
+
+
+# ============================================================
+# BARS
+# ============================================================
+def build_bars(books, source, resolution):
+    """Per ticker per bucket: OHLC of best bid/ask, average spread and average depth.
+
+    `books` must be normalized (sorted by timestamp), so first/last are open/close.
+    """
+    df = books.assign(
+        spread=books["best_ask"] - books["best_bid"],
+        bucket=books["timestamp"].dt.floor(ROLLUP_RESOLUTIONS[resolution]),
+    )
+    bars = df.groupby(["kode", "bucket"], sort=True).agg(
+        bid_open=("best_bid", "first"),
+        bid_high=("best_bid", "max"),
+        bid_low=("best_bid", "min"),
+        bid_close=("best_bid", "last"),
+        ask_open=("best_ask", "first"),
+        ask_high=("best_ask", "max"),
+        ask_low=("best_ask", "min"),
+        ask_close=("best_ask", "last"),
+        spread_avg=("spread", "mean"),
+        bid_depth_avg=("bid_lot_total", "mean"),
+        ask_depth_avg=("ask_lot_total", "mean"),
+        samples=("timestamp", "size"),
+    ).reset_index()
+    bars["source"] = source
+    bars["resolution"] = resolution
+    return bars[list(ROLLUP_COLUMNS)]
+
+
+def bars_for_day(books, source):
+    books = normalize(books)
+    return pd.concat([build_bars(books, source, r) for r in ROLLUP_RESOLUTIONS], ignore_index=True)
+
+
+def _to_params(bars):
+    """DataFrame -> tuples of plain Python values (mysql-connector does not take numpy types)"""
+    columns = []
+    for col in ROLLUP_COLUMNS:
+        values = bars[col].dt.to_pydatetime().tolist() if col == "bucket" else bars[col].tolist()
+        columns.append([None if pd.isna(v) else v for v in values])
+    return list(zip(*columns))
+
+
+def write_bars(bars):
+    """Upsert bars, so re-rolling a day replaces its bars instead of duplicating them"""
+    placeholders = ", ".join(["%s"] * len(ROLLUP_COLUMNS))
+    updates = ", ".join(f"{c} = VALUES({c})" for c in ROLLUP_COLUMNS[4:])
+    with get_pool().connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.executemany(
+                f"INSERT INTO {ROLLUP_TABLE} ({', '.join(ROLLUP_COLUMNS)}) VALUES ({placeholders}) "
+                f"ON DUPLICATE KEY UPDATE {updates}",
+                _to_params(bars),
+            )
+            conn.commit()
+        finally:
+            cur.close()
+
+
+# ============================================================
+# ROLLUP
+# ============================================================
+def load_state(path=ROLLUP_STATE_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {source: date.fromisoformat(day) for source, day in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=ROLLUP_STATE_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({source: day.isoformat() for source, day in state.items()}, f)
+
+
+def _scalar(query, params=()):
+    with get_pool().connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(query, params)
+            row = cur.fetchone()
+        finally:
+            cur.close()
+    return row[0] if row else None
+
+
+def first_day(source):
+    """Oldest day with data for `source` (a full scan of the raw table only if there is no summary)"""
+    ts = _scalar("SELECT MIN(timestamp) FROM orderbook_summary WHERE source = %s", (source,))
+    if ts is None:
+        ts = _scalar(f"SELECT MIN(timestamp) FROM orderbook_{source}")
+    return ts.date() if ts else None
+
+
+def pending_days(source, rolled_through, today, limit=ROLLUP_MAX_DAYS):
+    """Complete days after `rolled_through` (oldest first, at most `limit`).
+
+    Weekends and holidays are included: retention deletes every day up to the
+    rolled-up one, so a day with data (a holiday missing from the calendar,
+    a weekend run) must never be skipped here.
+    """
+    if rolled_through is None:
+        last = _scalar(f"SELECT MAX(bucket) FROM {ROLLUP_TABLE} WHERE source = %s AND resolution = '1d'", (source,))
+        if last is not None:
+            rolled_through = last.date()
+        else:
+            start = first_day(source)
+            if start is None:
+                return []
+            rolled_through = start - timedelta(days=1)
+    days = []
+    day = rolled_through + timedelta(days=1)
+    while day < today and len(days) < limit:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def rollup_day(source, day):
+    """Bars for every resolution of one day; returns how many were written"""
+    start = time.perf_counter()
+    books = load_books(source, day)
+    if books.empty:
+        print(f"[ROLLUP] {source} {day}: no snapshots")
+        return 0
+    bars = bars_for_day(books, source)
+    write_bars(bars)
+    print(f"[ROLLUP] {source} {day}: {len(books)} snapshots -> {len(bars)} bars "
+          f"({time.perf_counter() - start:.1f}s)")
+    return len(bars)
+
+
+def rollup(sources=SOURCES, today=None, state_path=ROLLUP_STATE_FILE):
+    """Roll up every complete day not done yet; returns {source: last day rolled up}"""
+    today = today or market_calendar.now_wib().date()
+    state = load_state(state_path)
+    for source in sources:
+        days = pending_days(source, state.get(source), today)
+        if not days:
+            print(f"[ROLLUP] {source}: up to date" + (f" (through {state[source]})" if source in state else ""))
+            continue
+        for day in days:
+            rollup_day(source, day)
+            # Empty days count as done too, otherwise the raw-table fallback rescans them every run
+            state[source] = day
+            save_state(state, state_path)
+        if days[-1] < today - timedelta(days=1) and len(days) == ROLLUP_MAX_DAYS:
+            print(f"[ROLLUP] {source}: still catching up, continuing next run")
+    return state
+
+
+# ============================================================
+# RETENTION
+# ============================================================
+def retention_cutoff(table, state, today):
+    """First day kept in `table`: its retention age, but never past a day that is not rolled up"""
+    keep_days, sources, _ = RETENTION[table]
+    cutoff = today - timedelta(days=keep_days)
+    if not sources:
+        return cutoff
+    if any(source not in state for source in sources):
+        return None
+    return min(cutoff, min(state[s] for s in sources) + timedelta(days=1))
+
+
+def _partitions(cur, table):
+    cur.execute(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        (table,),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def _partition_day(name):
+    m = PARTITION_NAME.match(name)
+    return datetime.strptime(m.group(1), "%Y%m%d").date() if m else None
+
+
+def add_partitions(cur, table, names, today, ahead=PARTITION_AHEAD_DAYS):
+    """Split the catch-all `pmax` into daily partitions up to `ahead` days from today"""
+    if "pmax" not in names:
+        return
+    existing = {_partition_day(n) for n in names}
+    last = max((d for d in existing if d), default=today - timedelta(days=1))
+    days = [last + timedelta(days=i) for i in range(1, (today + timedelta(days=ahead) - last).days + 1)]
+    if not days:
+        return
+    parts = ", ".join(
+        f"PARTITION p{d:%Y%m%d} VALUES LESS THAN (UNIX_TIMESTAMP('{d + timedelta(days=1)} 00:00:00'))"
+        for d in days
+    )
+    cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO "
+                f"({parts}, PARTITION pmax VALUES LESS THAN MAXVALUE)")
+    print(f"[RETENTION] {table}: added {len(days)} daily partitions through {days[-1]}")
+
+
+def drop_partitions(cur, table, names, cutoff, dry_run=False):
+    """Metadata-only removal of whole days before `cutoff`"""
+    expired = [n for n in names if _partition_day(n) and _partition_day(n) < cutoff]
+    if expired and not dry_run:
+        cur.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}")
+    print(f"[RETENTION] {table}: {'would drop' if dry_run else 'dropped'} {len(expired)} partitions before {cutoff}")
+    return len(expired)
+
+
+def delete_chunked(conn, cur, table, cutoff, dry_run=False, column="timestamp"):
+    """DELETE in small committed chunks so neither the undo log nor ingest locks pile up.
+
+    The raw tables have no primary key, so InnoDB keeps rows in insertion order
+    and each chunk finds the oldest rows at the start of its scan; ingest_batches
+    is keyed by a random batch_id and finds them through idx_ingested_at instead.
+    """
+    cutoff_ts = datetime.combine(cutoff, datetime.min.time())
+    if dry_run:
+        cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} < %s", (cutoff_ts,))
+        count = cur.fetchone()[0]
+        print(f"[RETENTION] {table}: would delete {count} rows before {cutoff}")
+        return count
+    total = 0
+    start = time.perf_counter()
+    while True:
+        cur.execute(f"DELETE FROM {table} WHERE {column} < %s LIMIT {DELETE_CHUNK}", (cutoff_ts,))
+        conn.commit()
+        total += cur.rowcount
+        if cur.rowcount < DELETE_CHUNK:
+            break
+        time.sleep(DELETE_PAUSE)
+    print(f"[RETENTION] {table}: deleted {total} rows before {cutoff} ({time.perf_counter() - start:.1f}s)")
+    return total
+
+
+def apply_retention(state, today=None, dry_run=False):
+    today = today or market_calendar.now_wib().date()
+    for table in RETENTION:
+        cutoff = retention_cutoff(table, state, today)
+        if cutoff is None:
+            print(f"[RETENTION] {table}: skipped, not every source is rolled up yet")
+            continue
+        with get_pool().connection() as conn:
+            cur = conn.cursor()
+            try:
+                names = _partitions(cur, table)
+                if names:
+                    drop_partitions(cur, table, names, cutoff, dry_run)
+                    if not dry_run:
+                        add_partitions(cur, table, _partitions(cur, table), today)
+                else:
+                    delete_chunked(conn, cur, table, cutoff, dry_run, column=RETENTION[table][2])
+            finally:
+                cur.close()
+
+
+# ============================================================
+# MAIN
+# ============================================================
+def parse_args():
+    parser = argparse.ArgumentParser(description="Roll old orderbook snapshots up into 15m/1h/1d bars "
+                                                 "and drop expired raw history.")
+    parser.add_argument("-s", "--sources", default=",".join(SOURCES), help="Comma separated sources")
+    parser.add_argument("-d", "--date", default=None,
+                        help="Re-roll one day YYYY-MM-DD (upsert) instead of the pending ones; skips retention")
+    parser.add_argument("--no-retention", action="store_true", help="Only roll up, keep all raw rows")
+    parser.add_argument("--dry-run", action="store_true", help="Report what retention would remove")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="Time the bar building on 955 synthetic tickers x N snapshots instead of the DB")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.synthetic:
+        books, _ = synthetic_day(955, args.synthetic)
+        start = time.perf_counter()
+        bars = bars_for_day(books, "synthetic")
+        print(f"[ROLLUP] {len(books)} snapshots -> {len(bars)} bars in {time.perf_counter() - start:.2f}s")
+        print(bars.groupby("resolution").size().to_string())
+        return
+
+    sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+    unknown = [s for s in sources if s not in SOURCES]
+    if unknown:
+        raise SystemExit(f"Unknown source(s) {unknown}, expected some of {list(SOURCES)}")
+
+    if args.date:
+        day = date.fromisoformat(args.date)
+        for source in sources:
+            rollup_day(source, day)
+        return
+
+    state = rollup(sources)
+    if not args.no_retention:
+        apply_retention(state, dry_run=args.dry_run)
+    print(f"[INFO] DB pool: {get_pool().format_stats()}")
+
+
+if __name__ == "__main__":
+    main()
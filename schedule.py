@@ -0,0 +1,108 @@
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+SCHEDULE_STATE_FILE = os.getenv("SCHEDULE_STATE_FILE", "schedule_state.json")
+SCHEDULE_REPORT_FILE = os.getenv("SCHEDULE_REPORT_FILE", "schedule_report.jsonl")
+SCHEDULE_DEADLINE_MARGIN = float(os.getenv("SCHEDULE_DEADLINE_MARGIN", "30"))  # seconds kept free before the next boundary
+SCHEDULE_DEFER_SECONDS = float(os.getenv("SCHEDULE_DEFER_SECONDS", "60"))  # low priority stops this long before the deadline
+SCHEDULE_MUST_PRIORITY = int(os.getenv("SCHEDULE_MUST_PRIORITY", "2"))  # at or above: only deferred once the deadline passed
+DEFAULT_PRIORITY = 1
+
+
+def next_boundary(now, interval):
+    """First wall-clock multiple of `interval` strictly after `now` (e.g. :00/:15/:30/:45)"""
+    return (math.floor(now / interval) + 1) * interval
+
+
+def cycle_deadline(now, interval, margin=SCHEDULE_DEADLINE_MARGIN):
+    """Deadline for a cycle started at `now`: just before the next boundary"""
+    return next_boundary(now, interval) - margin
+
+
+def _fmt(ts):
+    return datetime.fromtimestamp(ts).strftime("%H:%M:%S")
+
+
+# ============================================================
+# CYCLE PLAN
+# ============================================================
+class CyclePlan:
+    """Orders one cycle's tickers and defers what will not fit before the deadline.
+
+    Tickers go highest priority first and, within a priority, least recently
+    scraped first, so whatever a late cycle defers is at the front of the next.
+    """
+
+    def __init__(self, deadline=None, priorities=None, state_path=SCHEDULE_STATE_FILE):
+        self.deadline = deadline
+        self.priorities = priorities or {}
+        self.state_path = state_path
+        self.started = time.time()
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                self.last_success = json.load(f)
+        except (OSError, ValueError):
+            self.last_success = {}  # source -> {kode: epoch seconds}
+
+    def priority(self, kode):
+        return self.priorities.get(kode, DEFAULT_PRIORITY)
+
+    def order(self, source, codes):
+        seen = self.last_success.get(source, {})
+        return sorted(codes, key=lambda k: (-self.priority(k), seen.get(k, 0.0)))
+
+    def should_defer(self, kode):
+        """Why `kode` should wait for the next cycle, or None to scrape it now"""
+        if self.deadline is None:
+            return None
+        remaining = self.deadline - time.time()
+        if remaining <= 0:
+            return "Deferred: cycle deadline passed"
+        if remaining < SCHEDULE_DEFER_SECONDS and self.priority(kode) < SCHEDULE_MUST_PRIORITY:
+            return f"Deferred: low priority with {remaining:.0f}s to deadline"
+        return None
+
+    def record_success(self, source, kode):
+        self.last_success.setdefault(source, {})[kode] = time.time()
+
+    def report(self, outcome):
+        """Print and log coverage per source and how the run finished against its deadline"""
+        finished = time.time()
+        entry = {
+            "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "finished": datetime.fromtimestamp(finished).isoformat(timespec="seconds"),
+            "deadline": datetime.fromtimestamp(self.deadline).isoformat(timespec="seconds") if self.deadline else None,
+            "lateness_s": round(finished - self.deadline, 1) if self.deadline else None,
+            "sources": {},
+        }
+        print(f"\n[SCHEDULE] Cycle {_fmt(self.started)} -> {_fmt(finished)}"
+              + (f", deadline {_fmt(self.deadline)} ({finished - self.deadline:+.0f}s)" if self.deadline else ""))
+        for name, (success, failed) in outcome.items():
+            deferred = [f["kode"] for f in failed if f.get("deferred")]
+            empty = sum(1 for f in failed if f.get("empty"))
+            aborted = sum(1 for f in failed if f.get("aborted"))
+            errors = len(failed) - len(deferred) - empty - aborted
+            total = len(success) + len(failed)
+            coverage = len(success) / total if total else 0.0
+            entry["sources"][name] = {
+                "coverage": round(coverage, 4),
+                "success": len(success),
+                "failed": errors,
+                "deferred": len(deferred),
+                "empty": empty,
+                "aborted": aborted,
+            }
+            print(f"[SCHEDULE] {name}: coverage {coverage:.1%} ({len(success)}/{total}), "
+                  f"failed {errors}, empty {empty}"
+                  + (f", aborted {aborted}" if aborted else "")
+                  + f", deferred {len(deferred)}"
+                  + (f" ({', '.join(deferred[:10])}{' ...' if len(deferred) > 10 else ''})" if deferred else ""))
+
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(self.last_success, f)
+        with open(SCHEDULE_REPORT_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        return entry
@@ -0,0 +1,156 @@
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from engine import EmptyMarket, Source, StructuralChange
+from readiness import wait_for_book_ready
+from orderbook_model import rows_from_snapshots, snapshot_from_text, summaries_from_snapshots
+
+load_dotenv()
+
+EMAIL = os.getenv("EMAIL")
+PASSWORD = os.getenv("PASSWORD")
+PIN_CODE = os.getenv("PINCODE")
+
+LOGIN_URL = "https://login.ajaib.co.id/login"
+BASE_SAHAM_URL = "https://invest.ajaib.co.id/home/saham"
+
+PIN_TIMEOUT = 15000  # max wait for the app to leave the PIN screen
+TIMEOUT = 90000  # Increased to 60 seconds
+MAX_RETRIES = 5
+
+# Orderbook DOM (class hash comes from the app's CSS-in-JS build)
+BOOK_SELECTOR = "div.css-jw5rjj"
+BID_SELECTOR = f"{BOOK_SELECTOR}:nth-child(1)"
+ASK_SELECTOR = f"{BOOK_SELECTOR}:nth-child(2)"
+
+
+# ============================================================
+# LOGIN FUNCTION
+# ============================================================
+async def login_once_and_get_storage_state(playwright):
+    """Login 1x untuk semua browser"""
+    print("[LOGIN] Login...")
+
+    browser = await playwright.chromium.launch(headless=False)
+    context = await browser.new_context()
+    page = await context.new_page()
+
+    try:
+        await page.goto(LOGIN_URL)
+        await page.fill('input[name=email]', EMAIL)
+        await page.fill('input[name=password]', PASSWORD)
+        await page.click('button[type=submit]')
+        await page.wait_for_selector('.pincode-input-container', timeout=15000)
+
+        await page.locator('.pincode-input-text').first.click()
+        await page.keyboard.type(PIN_CODE, delay=150)
+        await page.wait_for_url('**/home', timeout=PIN_TIMEOUT)
+
+        try:
+            await page.get_by_role("button", name="Mengerti").click()
+        except:
+            pass
+
+        storage_state = await context.storage_state()
+        print("[SUCCESS]Login sukses! Session shared ke semua browser")
+        return storage_state
+
+    finally:
+        await context.close()
+        await browser.close()
+
+
+# ============================================================
+# ENSURE LOGGED IN
+# ============================================================
+async def ensure_logged_in(page):
+    """Check session validity"""
+    try:
+        current_url = page.url
+    except Exception:
+        raise Exception("Page is closed")
+
+    if "/pin" in current_url:
+        print("[WARN] PIN diminta ulang")
+        await page.locator('.pincode-input-text').first.click()
+        await page.keyboard.type(PIN_CODE, delay=150)
+        await page.wait_for_url(lambda url: "/pin" not in url, timeout=PIN_TIMEOUT)
+
+    if "/login" in current_url:
+        raise Exception("Session expired")
+
+
+# ============================================================
+# SCRAPE 1 EMITEN
+# ============================================================
+async def scrape_stock(page, kode):
+    """Scrape single stock"""
+    url = f"{BASE_SAHAM_URL}/{kode}"
+    # Wait domcontentloaded instead of load (faster)
+    await page.goto(url, timeout=TIMEOUT, wait_until="domcontentloaded")
+    await ensure_logged_in(page)
+
+    # Resolves as soon as both sides are rendered and stable instead of a fixed wait.
+    # A slow page looks like a missing or empty book, so reload once before judging it.
+    for attempt in range(2):
+        ready = await wait_for_book_ready(
+            page,
+            bid_selector=f"{BID_SELECTOR} .item-price",
+            ask_selector=f"{ASK_SELECTOR} .item-price",
+            container_selector=BOOK_SELECTOR,
+        )
+        if ready["state"] in ("ready", "partial"):
+            break
+        # The SPA redirects client-side, so re-check the session before blaming the DOM
+        await ensure_logged_in(page)
+        if attempt == 0:
+            await page.reload(timeout=TIMEOUT, wait_until="domcontentloaded")
+            await ensure_logged_in(page)
+    curr_time = datetime.now().replace(microsecond=0)
+
+    if ready["state"] not in ("ready", "partial"):
+        if ready["state"] == "empty":
+            raise EmptyMarket("Orderbook rendered but empty rows after reload (possible empty market)")
+        raise StructuralChange("Orderbook container not found after reload (possible DOM change)", BOOK_SELECTOR)
+
+    # BID
+    # Using specific class selectors as before, but wrapped in try-catch logic above implicitly
+    bid_lots = await page.locator(f"{BID_SELECTOR} .item-lot").all_inner_texts()
+    bid_prices = await page.locator(f"{BID_SELECTOR} .item-price").all_inner_texts()
+
+    # ASK
+    ask_prices = await page.locator(f"{ASK_SELECTOR} .item-price").all_inner_texts()
+    ask_lots = await page.locator(f"{ASK_SELECTOR} .item-lot").all_inner_texts()
+
+    # Parsed once into integer arrays; a level needs both its price and its lot
+    snapshot = snapshot_from_text(kode, curr_time, zip(bid_prices, bid_lots), zip(ask_prices, ask_lots),
+                                  numbered=False)
+    if not snapshot:
+        if (bid_prices or ask_prices) and not (bid_lots or ask_lots):
+            raise StructuralChange("Price cells found but no lots (possible DOM change)", f"{BOOK_SELECTOR} .item-lot")
+        # Rows are there but none carries a price (e.g. '-' on a suspended stock)
+        raise EmptyMarket("Data found but empty rows (no priced levels)")
+    return snapshot
+
+
+# ============================================================
+# PLUGIN
+# ============================================================
+class AjaibSource(Source):
+    name = "ajaib"
+    table = "orderbook_ajaib"
+    max_retries = MAX_RETRIES
+
+    async def login(self, playwright):
+        self.context_kwargs = {"storage_state": await login_once_and_get_storage_state(playwright)}
+
+    async def extract(self, page, kode):
+        return await scrape_stock(page, kode)
+
+    def session_lost(self, error):
+        return "Session expired" in (error or "")
+
+    def to_rows(self, results):
+        return rows_from_snapshots(results), summaries_from_snapshots(results, "ajaib")
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+from engine import EmptyMarket, Source, StructuralChange
+from readiness import wait_for_book_ready
+from orderbook_model import rows_from_snapshots, snapshot_from_text, summaries_from_snapshots
+
+MAX_RETRIES = 3
+PAGE_TIMEOUT = 30000  # ms
+BOOK_URL = "https://indopremier.com/#ipot/app/ipotbuzz/home/{}"
+
+BID_SIDE = ".bidoff .col-50:first-child"
+ASK_SIDE = ".bidoff .col-50:last-child"
+STREAM_SELECTORS = {
+    "bid_price": f"{BID_SIDE} .ob-price",
+    "bid_lot": f"{BID_SIDE} .ob-value.padding-right-half-half",
+    "ask_price": f"{ASK_SIDE} .ob-price",
+    "ask_lot": f"{ASK_SIDE} .ob-value.padding-right-half-half",
+}
+
+async def scrape_orderbook(page, stock_code):
+    url = BOOK_URL.format(stock_code)
+    page.set_default_timeout(PAGE_TIMEOUT)
+    await page.goto(url, wait_until="domcontentloaded")
+
+    # Wait in-page until both sides are populated; reload once if the book is missing or still empty
+    for attempt in range(2):
+        ready = await wait_for_book_ready(
+            page,
+            bid_selector=STREAM_SELECTORS["bid_price"],
+            ask_selector=STREAM_SELECTORS["ask_price"],
+            container_selector=".bidoff",
+        )
+        if ready["state"] in ("ready", "partial"):
+            break
+        if attempt == 0:
+            await page.reload(wait_until="domcontentloaded")
+    if ready["state"] == "missing":
+        raise StructuralChange(".bidoff not found after reload (possible DOM change)", ".bidoff")
+    if ready["state"] == "empty":
+        raise EmptyMarket("No bid/ask rows found after reload (.bidoff rendered empty)")
+
+    bids, asks = [], []
+    reported = (None, None)
+
+    # Bids
+    try:
+        bid_container = await page.query_selector(BID_SIDE)
+        if bid_container:
+            bid_prices = await bid_container.query_selector_all(".ob-price")
+            bid_vols = await bid_container.query_selector_all(".ob-value.padding-right-half-half")
+            for i in range(len(bid_prices)):
+                price = (await bid_prices[i].inner_text()).strip()
+                volume = (await bid_vols[i].inner_text()).strip() if i < len(bid_vols) else ""
+                bids.append((price, volume))
+    except Exception as e:
+        print(f"[{stock_code}] Bid error: {e}")
+
+    # Asks
+    try:
+        ask_container = await page.query_selector(ASK_SIDE)
+        if ask_container:
+            ask_prices = await ask_container.query_selector_all(".ob-price")
+            ask_vols = await ask_container.query_selector_all(".ob-value.padding-right-half-half")
+            for i in range(len(ask_prices)):
+                price = (await ask_prices[i].inner_text()).strip()
+                volume = (await ask_vols[i].inner_text()).strip() if i < len(ask_vols) else ""
+                asks.append((price, volume))
+    except Exception as e:
+        print(f"[{stock_code}] Ask error: {e}")
+
+    # Totals
+    try:
+        totals = await page.query_selector_all(".ob-mi-value.padding-right-half-half")
+        if len(totals) >= 2:
+            reported = ((await totals[0].inner_text()).strip(), (await totals[1].inner_text()).strip())
+    except Exception as e:
+        print(f"[{stock_code}] Totals error: {e}")
+
+    snapshot = snapshot_from_text(stock_code, datetime.now(), bids, asks,
+                                  reported_bid_lot=reported[0], reported_ask_lot=reported[1])
+    if not snapshot:
+        if (bids or asks) and not any(volume for _, volume in bids + asks):
+            raise StructuralChange("Price cells found without volumes (possible DOM change)",
+                                   STREAM_SELECTORS["bid_lot"])
+        raise EmptyMarket("No priced bid/ask levels found")
+    return snapshot
+
+class IpotSource(Source):
+    name = "ipot"
+    table = "orderbook_ipot"
+    max_retries = MAX_RETRIES
+
+    async def extract(self, page, kode):
+        return await scrape_orderbook(page, kode)
+
+    def to_rows(self, results):
+        return rows_from_snapshots(results), summaries_from_snapshots(results, "ipot")
@@ -0,0 +1,356 @@
+import asyncio
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from db_pool import get_pool
+from orderbook_summary import insert_summaries
+
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+SPOOL_SEGMENT_SECONDS = float(os.getenv("SPOOL_SEGMENT_SECONDS", "5"))  # max age of the open segment
+SPOOL_DRAIN_INTERVAL = float(os.getenv("SPOOL_DRAIN_INTERVAL", "2"))
+METRICS_FILE = "metrics.json"
+QUARANTINE_DIR = "quarantine"  # batches MySQL rejected, one <batch_id>.json each
+
+# Errors about the rows of a batch: replaying it would fail forever
+DATA_ERRORS = (mysql.connector.errors.DataError, mysql.connector.errors.IntegrityError)
+# ...but these say the server is not ready for any batch (missing migration, revoked grant):
+# stop the drain and keep the spool, like a connection error
+NOT_READY_ERRNOS = {
+    errorcode.ER_NO_SUCH_TABLE,
+    errorcode.ER_BAD_FIELD_ERROR,
+    errorcode.ER_BAD_DB_ERROR,
+    errorcode.ER_ACCESS_DENIED_ERROR,
+    errorcode.ER_DBACCESS_DENIED_ERROR,
+    errorcode.ER_TABLEACCESS_DENIED_ERROR,
+    errorcode.ER_COLUMNACCESS_DENIED_ERROR,
+}
+
+
+def is_data_error(error):
+    """True if `error` condemns the batch, not the database; only those batches are quarantined"""
+    return isinstance(error, DATA_ERRORS) and error.errno not in NOT_READY_ERRNOS
+
+ROW_TS = 5  # (kode, side, price, lot, num, timestamp)
+SUMMARY_TS = 2  # (source, kode, timestamp, ...)
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    raise TypeError(f"Cannot spool {type(value).__name__}")
+
+
+def _decode_ts(records, index):
+    out = []
+    for rec in records:
+        rec = list(rec)
+        if isinstance(rec[index], str):
+            rec[index] = datetime.fromisoformat(rec[index])
+        out.append(tuple(rec))
+    return out
+
+
+# ============================================================
+# SPOOL
+# ============================================================
+class Spool:
+    """Append-only, fsync'd JSONL segments holding batches that are not in MySQL yet.
+
+    Writers append to the open segment; once it is big or old enough it is
+    sealed (renamed) and becomes eligible for draining. Every batch carries a
+    batch_id so a replay after a crash is applied at most once. One writer
+    process per directory: a new Spool seals whatever open segment it finds.
+    """
+
+    def __init__(self, root, segment_bytes=SPOOL_SEGMENT_BYTES, segment_seconds=SPOOL_SEGMENT_SECONDS):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self._lock = threading.Lock()
+        # One drain at a time: push_rows and the background Drainer must not apply
+        # (and then both remove) the same sealed segment
+        self.drain_lock = threading.Lock()
+        self._file = None
+        self._opened_at = 0.0
+        os.makedirs(root, exist_ok=True)
+        # A crash leaves an open segment behind; it is complete up to its last full line
+        for path in glob.glob(os.path.join(root, "*.open")):
+            os.replace(path, path[:-len(".open")])
+
+    def _next_segment(self):
+        return os.path.join(self.root, f"seg-{time.time_ns()}.jsonl.open")
+
+    def append(self, table, rows, summaries=None):
+        """Durably spool one batch; returns its batch_id"""
+        batch_id = uuid.uuid4().hex
+        line = json.dumps({
+            "batch_id": batch_id,
+            "table": table,
+            "rows": rows,
+            "summaries": summaries or [],
+            "spooled_at": datetime.now().isoformat(timespec="seconds"),
+        }, default=_encode) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self._next_segment(), "a", encoding="utf-8")
+                self._opened_at = time.monotonic()
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if self._file.tell() >= self.segment_bytes:
+                self._seal_locked()
+        return batch_id
+
+    def _seal_locked(self):
+        if self._file is None:
+            return
+        path = self._file.name
+        self._file.close()
+        self._file = None
+        os.replace(path, path[:-len(".open")])
+
+    def seal(self, force=False):
+        """Close the open segment if it is old enough (or always with `force`)"""
+        with self._lock:
+            if self._file is not None and (force or time.monotonic() - self._opened_at >= self.segment_seconds):
+                self._seal_locked()
+
+    def sealed_segments(self):
+        return sorted(glob.glob(os.path.join(self.root, "seg-*.jsonl")))
+
+    def read_segment(self, path):
+        batches = []
+        with open(path, encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    # Only the tail of a segment can be torn (crash mid-append)
+                    print(f"[SPOOL] {os.path.basename(path)}:{lineno} torn record skipped")
+                    continue
+                batch["rows"] = _decode_ts(batch["rows"], ROW_TS)
+                batch["summaries"] = _decode_ts(batch["summaries"], SUMMARY_TS)
+                batches.append(batch)
+        return batches
+
+    def quarantine(self, path, batch, error):
+        """Park a batch MySQL rejected, with the error, out of the replay path"""
+        qdir = os.path.join(self.root, QUARANTINE_DIR)
+        os.makedirs(qdir, exist_ok=True)
+        # Keyed by batch_id, so quarantining the same batch again on a replay is a no-op
+        target = os.path.join(qdir, f"{batch['batch_id']}.json")
+        tmp = target + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**batch, "segment": os.path.basename(path), "error": error}, f, default=_encode)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+        return target
+
+    def quarantined(self):
+        return len(glob.glob(os.path.join(self.root, QUARANTINE_DIR, "*.json")))
+
+    def backlog(self):
+        """Undrained batches/bytes and the age of the oldest segment"""
+        paths = sorted(glob.glob(os.path.join(self.root, "seg-*.jsonl*")))
+        size = 0
+        batches = 0
+        for path in paths:
+            try:
+                size += os.path.getsize(path)
+                with open(path, "rb") as f:
+                    batches += sum(1 for _ in f)
+            except OSError:
+                pass
+        oldest = None
+        if paths:
+            oldest = time.time() - int(os.path.basename(paths[0]).split("-")[1].split(".")[0]) / 1e9
+        return {"segments": len(paths), "batches": batches, "bytes": size,
+                "oldest_age_s": round(oldest, 1) if oldest is not None else 0.0,
+                "quarantined": self.quarantined()}
+
+    def format_backlog(self):
+        b = self.backlog()
+        text = (f"backlog {b['batches']} batches in {b['segments']} segments "
+                f"({b['bytes'] / 1024:.1f} KB, oldest {b['oldest_age_s']:.0f}s)")
+        if b["quarantined"]:
+            text += f", {b['quarantined']} quarantined"
+        return text
+
+    def write_metrics(self, extra=None):
+        metrics = {**self.backlog(), **(extra or {}), "updated": datetime.now().isoformat(timespec="seconds")}
+        tmp = os.path.join(self.root, METRICS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
+        os.replace(tmp, os.path.join(self.root, METRICS_FILE))
+
+
+# ============================================================
+# DRAIN
+# ============================================================
+def apply_segment(conn, batches):
+    """Apply a segment's batches in one transaction, skipping batch_ids already ingested"""
+    applied = skipped = rows = 0
+    cur = conn.cursor()
+    try:
+        for batch in batches:
+            cur.execute(
+                "INSERT IGNORE INTO ingest_batches (batch_id, table_name, row_count, spooled_at) "
+                "VALUES (%s, %s, %s, %s)",
+                (batch["batch_id"], batch["table"], len(batch["rows"]), batch.get("spooled_at")),
+            )
+            if cur.rowcount == 0:
+                skipped += 1
+                continue
+            if batch["rows"]:
+                cur.executemany(
+                    f"INSERT INTO {batch['table']} (kode, side, price, lot, num, timestamp) "
+                    f"VALUES (%s, %s, %s, %s, %s, %s)",
+                    batch["rows"],
+                )
+            insert_summaries(cur, batch["summaries"])
+            applied += 1
+            rows += len(batch["rows"])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return applied, skipped, rows
+
+
+def apply_each(spool, pool, path, batches):
+    """Apply a segment batch by batch, quarantining the ones MySQL rejects as bad data"""
+    applied = skipped = rows = quarantined = 0
+    with pool.connection() as conn:
+        for batch in batches:
+            try:
+                a, s, r = apply_segment(conn, [batch])
+            except Exception as e:
+                if not is_data_error(e):
+                    raise
+                target = spool.quarantine(path, batch, str(e))
+                print(f"[SPOOL] batch {batch['batch_id']} ({len(batch['rows'])} rows for "
+                      f"'{batch['table']}') rejected, quarantined to {target}: {e}")
+                quarantined += 1
+                continue
+            applied += a
+            skipped += s
+            rows += r
+    return applied, skipped, rows, quarantined
+
+
+def drain(spool, pool=None, seal=False):
+    """Replay sealed segments into MySQL.
+
+    A connection error, or a server that is not ready (missing table or
+    column, access denied), stops the drain and keeps the rest for the next
+    pass. A data error only fails its own batch: the segment is retried batch
+    by batch and the rejected batches are moved to the quarantine directory.
+    """
+    spool.seal(force=seal)
+    pool = pool or get_pool()
+    stats = {"segments": 0, "applied": 0, "replayed": 0, "rows": 0, "quarantined": 0, "error": None}
+    with spool.drain_lock:
+        for path in spool.sealed_segments():
+            try:
+                batches = spool.read_segment(path)
+            except FileNotFoundError:
+                continue  # drained by another process on the same directory
+            quarantined = 0
+            try:
+                try:
+                    with pool.connection() as conn:
+                        applied, skipped, rows = apply_segment(conn, batches)
+                except Exception as e:
+                    if not is_data_error(e):
+                        raise
+                    applied, skipped, rows, quarantined = apply_each(spool, pool, path, batches)
+            except Exception as e:
+                stats["error"] = str(e)
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # already removed; its batch_ids make the replay a no-op either way
+            stats["segments"] += 1
+            stats["applied"] += applied
+            stats["replayed"] += skipped
+            stats["rows"] += rows
+            stats["quarantined"] += quarantined
+    return stats
+
+
+class Drainer:
+    """Background task draining the spool while the scrape keeps running"""
+
+    def __init__(self, spool, interval=SPOOL_DRAIN_INTERVAL):
+        self.spool = spool
+        self.interval = interval
+        self.totals = {"applied": 0, "replayed": 0, "rows": 0, "quarantined": 0, "errors": 0}
+        self._task = None
+        self._last_error = None
+
+    def _pass(self, seal=False):
+        # stop() may race a pass still running in its thread after cancellation; drain() serializes them
+        stats = drain(self.spool, seal=seal)
+        for key in ("applied", "replayed", "rows", "quarantined"):
+            self.totals[key] += stats[key]
+        if stats["error"]:
+            self.totals["errors"] += 1
+            if stats["error"] != self._last_error:
+                print(f"[SPOOL] DB unavailable, keeping data spooled: {stats['error']}")
+        elif self._last_error:
+            print("[SPOOL] DB reachable again, draining backlog")
+        self._last_error = stats["error"]
+        self.spool.write_metrics({"drained": dict(self.totals), "last_error": stats["error"]})
+        return stats
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self._pass)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def stop(self):
+        """Final drain (including the open segment) and a backlog report"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.to_thread(self._pass, True)
+        t = self.totals
+        print(f"[SPOOL] drained {t['applied']} batches ({t['rows']} rows), "
+              f"{t['replayed']} already ingested, {self.spool.format_backlog()}")
+
+
+_spools = {}
+_spools_lock = threading.Lock()
+
+
+def get_spool(name):
+    """Spool under SPOOL_DIR/<name>, one per writer process kind (engine, stream, ...)"""
+    with _spools_lock:
+        if name not in _spools:
+            _spools[name] = Spool(os.path.join(SPOOL_DIR, name))
+        return _spools[name]
@@ -26,7 +26,8 @@ CREATE TABLE IF NOT EXISTS `orderbook_ajaib` (
   `price` decimal(20,6) DEFAULT NULL,
   `lot` int(11) DEFAULT NULL,
   `num` int(11) DEFAULT NULL,
-  `timestamp` timestamp NULL DEFAULT NULL
+  `timestamp` timestamp NULL DEFAULT NULL,
+  KEY `idx_kode_ts` (`kode`,`timestamp`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- Data exporting was unselected.
@@ -38,11 +39,79 @@ CREATE TABLE IF NOT EXISTS `orderbook_ipot` (
   `price` decimal(20,6) DEFAULT NULL,
   `lot` int(11) DEFAULT NULL,
   `num` int(11) DEFAULT NULL,
-  `timestamp` timestamp NULL DEFAULT NULL
+  `timestamp` timestamp NULL DEFAULT NULL,
+  KEY `idx_kode_ts` (`kode`,`timestamp`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- Data exporting was unselected.
 
+-- Dumping structure for table stock_data.orderbook_summary
+CREATE TABLE IF NOT EXISTS `orderbook_summary` (
+  `source` varchar(8) NOT NULL,
+  `kode` char(4) NOT NULL,
+  `timestamp` timestamp NOT NULL DEFAULT '0000-00-00 00:00:00',
+  `best_bid` decimal(20,6) DEFAULT NULL,
+  `best_ask` decimal(20,6) DEFAULT NULL,
+  `spread` decimal(20,6) DEFAULT NULL,
+  `spread_ticks` int(11) DEFAULT NULL,
+  `bid_levels` smallint(6) DEFAULT NULL,
+  `ask_levels` smallint(6) DEFAULT NULL,
+  `bid_lot_total` bigint(20) DEFAULT NULL,
+  `ask_lot_total` bigint(20) DEFAULT NULL,
+  `imbalance_top5` double DEFAULT NULL,
+  `reported_bid_lot` bigint(20) DEFAULT NULL,
+  `reported_ask_lot` bigint(20) DEFAULT NULL,
+  PRIMARY KEY (`source`,`kode`,`timestamp`),
+  KEY `idx_summary_ts` (`timestamp`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Data exporting was unselected.
+
+-- Dumping structure for table stock_data.ingest_batches
+CREATE TABLE IF NOT EXISTS `ingest_batches` (
+  `batch_id` char(32) NOT NULL,
+  `table_name` varchar(32) NOT NULL,
+  `row_count` int(11) NOT NULL DEFAULT 0,
+  `spooled_at` datetime DEFAULT NULL,
+  `ingested_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`batch_id`),
+  KEY `idx_ingested_at` (`ingested_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Data exporting was unselected.
+
+-- Dumping structure for table stock_data.orderbook_rollup
+CREATE TABLE IF NOT EXISTS `orderbook_rollup` (
+  `source` varchar(8) NOT NULL,
+  `kode` char(4) NOT NULL,
+  `resolution` varchar(3) NOT NULL,
+  `bucket` timestamp NOT NULL DEFAULT '0000-00-00 00:00:00',
+  `bid_open` decimal(20,6) DEFAULT NULL,
+  `bid_high` decimal(20,6) DEFAULT NULL,
+  `bid_low` decimal(20,6) DEFAULT NULL,
+  `bid_close` decimal(20,6) DEFAULT NULL,
+  `ask_open` decimal(20,6) DEFAULT NULL,
+  `ask_high` decimal(20,6) DEFAULT NULL,
+  `ask_low` decimal(20,6) DEFAULT NULL,
+  `ask_close` decimal(20,6) DEFAULT NULL,
+  `spread_avg` double DEFAULT NULL,
+  `bid_depth_avg` double DEFAULT NULL,
+  `ask_depth_avg` double DEFAULT NULL,
+  `samples` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`source`,`kode`,`resolution`,`bucket`),
+  KEY `idx_rollup_bucket` (`resolution`,`bucket`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Data exporting was unselected.
+
+-- Optional: daily partitions turn retention (rollup.py) into a metadata-only DROP PARTITION;
+-- rollup.py then keeps a week of partitions created ahead. Without them it uses chunked DELETEs.
+-- Start the first partition at the oldest day still in the table, e.g.:
+-- ALTER TABLE `orderbook_ajaib` PARTITION BY RANGE (UNIX_TIMESTAMP(`timestamp`)) (
+--   PARTITION p20261019 VALUES LESS THAN (UNIX_TIMESTAMP('2026-10-20 00:00:00')),
+--   PARTITION pmax VALUES LESS THAN MAXVALUE
+-- );
+
 /*!40103 SET TIME_ZONE=IFNULL(@OLD_TIME_ZONE, 'system') */;
 /*!40101 SET SQL_MODE=IFNULL(@OLD_SQL_MODE, '') */;
 /*!40014 SET FOREIGN_KEY_CHECKS=IFNULL(@OLD_FOREIGN_KEY_CHECKS, 1) */;
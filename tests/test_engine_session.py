@@ -0,0 +1,79 @@
+import asyncio
+import functools
+
+import pytest
+
+import engine
+import retry_queue
+from engine import Source, run_source
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(engine, "run_queue", functools.partial(retry_queue.run_queue, backoff=lambda attempt: 0))
+
+
+class FakeSource(Source):
+    """Ajaib-like source whose login state is scripted by the test"""
+
+    name = "ajaib"
+    table = "orderbook_ajaib"
+
+    def __init__(self, good_login_from):
+        super().__init__()
+        self.good_login_from = good_login_from  # first login whose session works (None: never)
+        self.breaker.cooldown = 0.01
+
+    async def login(self, playwright):
+        self.context_kwargs = {"storage_state": {"cookies": [], "origins": [], "login": self.logins + 1}}
+
+    def session_lost(self, error):
+        return "Session expired" in (error or "")
+
+
+class FakeFleet:
+    """Answers attempts without a browser: expired until the source's login is a good one"""
+
+    capacity = 2
+
+    def __init__(self, source):
+        self.source = source
+        self.playwright = None
+        self.reseeded = []
+
+    async def reseed(self, storage_state):
+        self.reseeded.append(storage_state)
+
+    async def attempt(self, fn):
+        await asyncio.sleep(0)
+        good = self.source.good_login_from
+        if good is not None and self.source.logins >= good:
+            return {"success": True, "kode": "X", "data": "book", "error": None}, False
+        return {"success": False, "kode": "X", "data": None, "error": "Session expired", "kind": "transient"}, False
+
+
+async def scrape(source, codes):
+    await engine.login_source(None, source)
+    fleet = FakeFleet(source)
+    success, failed = await run_source(fleet, source, codes)
+    return success, failed, fleet
+
+
+def test_session_expired_trips_relogs_in_and_closes():
+    source = FakeSource(good_login_from=2)
+    success, failed, fleet = asyncio.run(scrape(source, ["BBRI", "TLKM", "ASII", "BBCA"]))
+    assert len(success) == 4 and failed == []
+    assert source.logins == 2  # the launch login plus exactly one re-login
+    assert fleet.reseeded == [{"cookies": [], "origins": [], "login": 2}]
+    assert source.breaker.trips == 1 and source.breaker.state == "closed"
+    assert not source.session_expired and source.relogins == 0
+
+
+def test_gives_up_when_relogin_does_not_help():
+    source = FakeSource(good_login_from=None)
+    success, failed, _ = asyncio.run(
+        asyncio.wait_for(scrape(source, ["BBRI", "TLKM", "ASII", "BBCA"]), timeout=5))
+    assert success == []
+    assert source.logins == 1 + engine.SESSION_MAX_RELOGINS
+    assert source.guard.aborted and "re-login" in source.guard.aborted
+    assert any(f["aborted"] for f in failed)
@@ -0,0 +1,65 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from export_stream import stream_query_to_file
+
+COLUMNS = ["kode", "price", "lot", "timestamp"]
+# (name, mysql FieldType): VAR_STRING, NEWDECIMAL, LONGLONG, DATETIME
+DESCRIPTION = [("kode", 253), ("price", 246), ("lot", 8), ("timestamp", 12)]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = DESCRIPTION
+
+    def execute(self, query, params):
+        pass
+
+    def fetchmany(self, size):
+        out, self.conn.rows = self.conn.rows[:size], self.conn.rows[size:]
+        return out
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.closed = False
+
+    def cursor(self, buffered=True):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+def test_empty_parquet_result_still_writes_the_file(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "empty.parquet"
+    total, _ = stream_query_to_file(FakeConn([]), "q", (), str(path), COLUMNS, fmt="parquet")
+    assert total == 0
+    assert pq.read_table(path).schema.names == COLUMNS
+
+
+def test_parquet_schema_survives_an_all_null_first_chunk(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = [("BBRI", None, None, None), ("BBRI", Decimal("4500.00"), 12, datetime(2026, 10, 19, 9, 30))]
+    path = tmp_path / "nulls.parquet"
+    stream_query_to_file(FakeConn(rows), "q", (), str(path), COLUMNS, fmt="parquet", chunk_size=1)
+    assert pq.read_table(path).column("price").to_pylist() == [None, 4500.0]
+
+
+def test_failed_export_closes_the_connection(tmp_path):
+    conn = FakeConn([("BBRI", Decimal("1"), 1, datetime(2026, 10, 19))] * 5)
+
+    def progress(rows_written):
+        raise OSError("No space left on device")
+
+    with pytest.raises(OSError):
+        stream_query_to_file(conn, "q", (), str(tmp_path / "out.csv"), COLUMNS, chunk_size=2, progress=progress)
+    assert conn.closed and conn.rows  # rows were left unread, so the connection must not be reused
@@ -0,0 +1,26 @@
+import os
+
+import failure_artifacts
+from failure_artifacts import INDEX_FILE, ArtifactCollector
+
+
+def test_quota_skips_files_that_vanish_during_the_scan(tmp_path, monkeypatch):
+    collector = ArtifactCollector("ajaib", root=str(tmp_path), quota_mb=0)
+    (tmp_path / "BBRI_093000_0a1b2c3d_timeout.png").write_bytes(b"x" * 100)
+    real_listdir = os.listdir
+
+    def listdir(path):
+        # Rotated out / replaced by the other source's collector between listdir and stat
+        return real_listdir(path) + ["TLKM_093000_ffffffff_timeout.png", INDEX_FILE + ".tmp"]
+
+    monkeypatch.setattr(failure_artifacts.os, "listdir", listdir)
+    assert collector._enforce_quota() == 1
+    assert real_listdir(tmp_path) == []
+
+
+def test_index_forgets_rotated_out_artifacts(tmp_path):
+    collector = ArtifactCollector("ajaib", root=str(tmp_path), quota_mb=0)
+    collector._write({"kode": "BBRI", "class": "timeout"}, b"png", None, [])
+    assert len((tmp_path / INDEX_FILE).read_text().splitlines()) == 1
+    collector._enforce_quota()
+    assert (tmp_path / INDEX_FILE).read_text() == ""
@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+import pytest
+
+import ipot_ws
+from ipot_ws import IpotFrameDecoder, replay
+from orderbook_model import snapshot_from_ipot
+
+FRAMES = os.path.join(os.path.dirname(__file__), "fixtures", "ipot_ws_frames.jsonl")
+
+
+def test_replay_decodes_orderbook_frames_only():
+    snaps = list(replay(FRAMES))
+    # full BBCA book, BBCA bid update, TLKM book, binary BBCA ask update
+    assert [s["stock_code"] for s in snaps] == ["BBCA", "BBCA", "TLKM", "BBCA"]
+
+
+def test_side_only_update_keeps_cached_side():
+    snaps = list(replay(FRAMES, codes=["BBCA"]))
+    full, bid_update, ask_update = snaps
+    assert full["bids"][0] == {"price": "9,800", "volume": "1,200"}
+    assert bid_update["bids"][0] == {"price": "9800", "volume": "1500"}
+    assert bid_update["asks"] == full["asks"]
+    assert ask_update["asks"] == [{"price": "9825", "volume": "400"}]
+    assert ask_update["bids"] == bid_update["bids"]
+
+
+def test_replayed_snapshot_converts_to_model():
+    book = snapshot_from_ipot(next(replay(FRAMES)))
+    assert [(lvl.price, lvl.lot, lvl.num) for lvl in book.bids] == [(9800, 1200, 1), (9775, 850, 2)]
+    assert [lvl.price for lvl in book.asks] == [9825, 9850]
+    assert (book.reported_bid_lot, book.reported_ask_lot) == (120500, 98000)
+
+
+@pytest.mark.parametrize("payload", [
+    '42["trade",{"s":"BBCA","b":[["B",9825]],"p":9825,"v":10}]',  # single-letter keys
+    '42["index",{"code":"COMPOSITE","bids":[[7100,1]]}]',  # not a ticker
+    '42["orderbook",{"stock_code":"BBCA","bids":[["x","y"]]}]',  # levels are not numbers
+    '42["orderbook",{"stock_code":"BBCA","bids":[[1,2,3]]}]',  # not a (price, volume) pair
+    "2",
+])
+def test_non_orderbook_frames_are_ignored(payload):
+    decoder = IpotFrameDecoder()
+    assert decoder.feed(payload, 0) == []
+    assert decoder.undecoded == 1
+
+
+def test_capture_refuses_too_many_pages():
+    codes = [f"T{i:03d}" for i in range(ipot_ws.WS_CAPTURE_MAX_PAGES + 1)]
+    with pytest.raises(ValueError):
+        asyncio.run(ipot_ws.capture([], codes, None, None, seconds=0))
@@ -0,0 +1,56 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+import market_calendar
+from market_calendar import WIB, cycle_kind
+
+MONDAY = date(2026, 10, 19)
+FRIDAY = date(2026, 10, 23)
+HOLIDAY = date(2026, 8, 17)
+
+
+@pytest.fixture(autouse=True)
+def holidays(monkeypatch):
+    monkeypatch.setattr(market_calendar, "HOLIDAYS", {HOLIDAY})
+
+
+def at(day, hour, minute=0, second=0):
+    return datetime(day.year, day.month, day.day, hour, minute, second, tzinfo=WIB)
+
+
+@pytest.mark.parametrize("moment, expected", [
+    (at(MONDAY, 8, 44), None),  # before pre-opening
+    (at(MONDAY, 8, 45), "trade"),  # pre-opening
+    (at(MONDAY, 10, 0), "trade"),
+    (at(MONDAY, 12, 30), None),  # lunch break
+    (at(MONDAY, 16, 10), "trade"),  # post-trading
+    (at(FRIDAY, 11, 45), None),  # Friday's break starts at 11:30
+    (at(FRIDAY, 13, 45), None),
+    (at(FRIDAY, 14, 0), "trade"),
+    (at(date(2026, 10, 24), 10, 0), None),  # Saturday
+    (at(HOLIDAY, 10, 0), None),
+])
+def test_trade_or_skip(moment, expected):
+    assert cycle_kind(moment, idle_interval=0) == expected
+
+
+def test_closing_snapshot_once_per_trading_day():
+    moment = at(MONDAY, 16, 20)
+    assert cycle_kind(moment, idle_interval=0) == "closing"
+    assert cycle_kind(moment, closing_done_on=MONDAY, idle_interval=0) is None
+    assert cycle_kind(at(MONDAY, 23, 0), closing_done_on=MONDAY - timedelta(days=3), idle_interval=0) == "closing"
+
+
+def test_no_closing_snapshot_on_holiday():
+    assert cycle_kind(at(HOLIDAY, 16, 20), idle_interval=0) is None
+
+
+def test_idle_cycles_are_thinned():
+    assert cycle_kind(at(MONDAY, 20, 0, 30), closing_done_on=MONDAY, idle_interval=3600) == "idle"
+    assert cycle_kind(at(MONDAY, 20, 15), closing_done_on=MONDAY, idle_interval=3600) is None
+
+
+def test_moment_in_other_timezone_is_converted_to_wib():
+    utc = datetime(2026, 10, 19, 3, 0, tzinfo=timezone.utc)  # 10:00 WIB
+    assert cycle_kind(utc, idle_interval=0) == "trade"
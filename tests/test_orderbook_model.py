@@ -0,0 +1,58 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from orderbook_model import parse_bestquote, parse_int
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1,250", 1250),
+    ("1.250", 1250),
+    (" 98,000 ", 98000),
+    (1250, 1250),
+    (1250.0, 1250),
+    ("", None),
+    ("  ", None),
+    ("-", None),
+    (None, None),
+])
+def test_parse_int(value, expected):
+    assert parse_int(value) == expected
+
+
+def bestquote(**overrides):
+    body = {
+        "code": "BBRI",
+        "buy_side": {"unix_time": 1760841000000, "items": [
+            {"price": 4500, "lot": 1200, "num": 15},
+            {"price": "4490", "lot": "800", "num": "9"},
+        ]},
+        "sell_side": {"unix_time": 1760841000000, "items": [{"price": 4510, "lot": 300, "num": 4}]},
+    }
+    body.update(overrides)
+    return json.dumps(body).encode()
+
+
+def test_parse_bestquote():
+    snap = parse_bestquote(bestquote())
+    assert snap.kode == "BBRI"
+    assert snap.timestamp == datetime.fromtimestamp(1760841000)
+    assert [(lvl.price, lvl.lot, lvl.num) for lvl in snap.bids] == [(4500, 1200, 15), (4490, 800, 9)]
+    assert [(lvl.price, lvl.lot, lvl.num) for lvl in snap.asks] == [(4510, 300, 4)]
+    assert snap.rows(ask_side="S")[-1] == ("BBRI", "S", 4510, 300, 4, snap.timestamp)
+
+
+def test_parse_bestquote_accepts_str():
+    assert len(parse_bestquote(bestquote().decode())) == 3
+
+
+@pytest.mark.parametrize("body", [
+    bestquote(code=None, buy_side=None),
+    json.dumps({"message": "Unauthorized"}).encode(),
+    json.dumps({"code": "BBRI", "buy_side": {"unix_time": 1, "items": [{"price": 1}]},
+                "sell_side": {"items": []}}).encode(),
+])
+def test_parse_bestquote_rejects_other_payloads(body):
+    with pytest.raises(ValueError):
+        parse_bestquote(body)
@@ -0,0 +1,158 @@
+import asyncio
+
+from retry_queue import DEFER, CircuitBreaker, run_queue
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def no_backoff(attempt):
+    return 0
+
+
+# ---------------- run_queue ----------------
+def test_results_keep_input_order():
+    async def attempt(item, n):
+        await asyncio.sleep(0.01 * (3 - item))
+        return True, item * 10
+
+    assert run(run_queue([0, 1, 2], attempt, concurrency=3, max_retries=1)) == [0, 10, 20]
+
+
+def test_failed_item_is_retried_until_max_retries():
+    calls = []
+
+    async def attempt(item, n):
+        calls.append((item, n))
+        return n == 3, f"{item}@{n}"
+
+    results = run(run_queue(["A", "B"], attempt, concurrency=1, max_retries=3, backoff=no_backoff))
+    assert results == ["A@3", "B@3"]
+    assert [n for item, n in calls if item == "A"] == [1, 2, 3]
+
+
+def test_gives_up_after_max_retries():
+    async def attempt(item, n):
+        return False, {"error": f"fail {n}"}
+
+    assert run(run_queue(["A"], attempt, concurrency=1, max_retries=2, backoff=no_backoff)) == [{"error": "fail 2"}]
+
+
+def test_exception_counts_as_failure():
+    async def attempt(item, n):
+        raise RuntimeError("boom")
+
+    [result] = run(run_queue(["A"], attempt, concurrency=1, max_retries=1))
+    assert isinstance(result, RuntimeError)
+
+
+def test_lost_attempt_is_requeued_without_using_a_retry():
+    calls = []
+
+    async def attempt(item, n):
+        calls.append(n)
+        return (None, "lost") if len(calls) == 1 else (True, "ok")
+
+    assert run(run_queue(["A"], attempt, concurrency=1, max_retries=1)) == ["ok"]
+    assert calls == [1, 1]
+
+
+def test_defer_finishes_without_retrying():
+    calls = []
+
+    async def attempt(item, n):
+        calls.append(n)
+        return DEFER, "deferred"
+
+    assert run(run_queue(["A"], attempt, concurrency=1, max_retries=3)) == ["deferred"]
+    assert calls == [1]
+
+
+# ---------------- CircuitBreaker ----------------
+def test_breaker_opens_on_error_rate():
+    async def scenario():
+        breaker = CircuitBreaker("t", window=4, min_calls=4, error_rate=0.75)
+        for ok in (True, False, False):
+            await breaker.record(ok, "err")
+        assert breaker.state == "closed"  # not enough calls yet
+        await breaker.record(False, "err")
+        return breaker
+
+    breaker = run(scenario())
+    assert breaker.state == "open" and breaker.trips == 1
+
+
+def test_half_open_allows_one_probe_and_closes_on_success():
+    async def scenario():
+        breaker = CircuitBreaker("t", cooldown=0.02)
+        breaker.trip("test")
+        probe = await breaker.acquire()
+        assert probe and breaker.state == "half_open"
+        # A second worker waits while the probe runs
+        waiter = asyncio.ensure_future(breaker.acquire())
+        await asyncio.sleep(0.02)
+        assert not waiter.done()
+        await breaker.record(True, probe=probe)
+        assert await waiter == 0
+        return breaker
+
+    assert run(scenario()).state == "closed"
+
+
+def test_failed_probe_reopens():
+    async def scenario():
+        breaker = CircuitBreaker("t", cooldown=0.01)
+        breaker.trip("test")
+        probe = await breaker.acquire()
+        await breaker.record(False, "still down", probe=probe)
+        return breaker
+
+    breaker = run(scenario())
+    assert breaker.state == "open" and breaker.trips == 2
+
+
+def test_only_the_current_probe_decides():
+    async def scenario():
+        breaker = CircuitBreaker("t", cooldown=0.01)
+        breaker.trip("test")
+        stale = await breaker.acquire()
+        breaker.trip("session expired")  # reopened while the first probe was running
+        await asyncio.sleep(0.02)
+        probe = await breaker.acquire()
+        await breaker.record(True, probe=stale)  # outcome of the stale probe
+        assert breaker.state == "half_open"
+        await breaker.record(False, "down", probe=0)  # attempt started before the trip
+        assert breaker.state == "half_open"
+        await breaker.record(True, probe=probe)
+        return breaker
+
+    assert run(scenario()).state == "closed"
+
+
+def test_released_probe_lets_the_next_one_start():
+    async def scenario():
+        breaker = CircuitBreaker("t", cooldown=0.01)
+        breaker.trip("test")
+        probe = await breaker.acquire()
+        await breaker.release(probe)
+        return await asyncio.wait_for(breaker.acquire(), timeout=1)
+
+    assert run(scenario()) == 2
+
+
+def test_run_queue_pauses_on_open_breaker():
+    async def scenario():
+        breaker = CircuitBreaker("t", window=2, min_calls=2, error_rate=1.0, cooldown=0.05)
+        outcomes = iter([False, False, True, True, True])
+
+        async def attempt(item, n):
+            return next(outcomes), item
+
+        results = await run_queue(["A", "B", "C"], attempt, concurrency=1, max_retries=3,
+                                  breaker=breaker, backoff=no_backoff)
+        return results, breaker
+
+    results, breaker = run(scenario())
+    assert results == ["A", "B", "C"]
+    assert breaker.trips == 1 and breaker.state == "closed"
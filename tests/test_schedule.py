@@ -0,0 +1,25 @@
+from datetime import datetime
+
+import pytest
+
+from schedule import cycle_deadline, next_boundary
+
+
+@pytest.mark.parametrize("now, expected", [
+    (0, 900),
+    (1, 900),
+    (899.9, 900),
+    (900, 1800),  # exactly on a boundary: the next one, never `now` itself
+    (1799, 1800),
+])
+def test_next_boundary(now, expected):
+    assert next_boundary(now, 900) == expected
+
+
+def test_next_boundary_lands_on_quarter_hours():
+    now = datetime(2026, 10, 19, 9, 7, 12).timestamp()
+    assert datetime.fromtimestamp(next_boundary(now, 900)).minute == 15
+
+
+def test_cycle_deadline_keeps_margin():
+    assert cycle_deadline(100, 900, margin=30) == 870
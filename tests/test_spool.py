@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import mysql.connector
+import pytest
+
+import spool as spool_mod
+from spool import Spool, drain
+
+TS = datetime(2026, 10, 19, 9, 30, 0)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+
+    def execute(self, query, params):
+        if self.db.down:
+            raise mysql.connector.errors.OperationalError("Lost connection to MySQL server")
+        if self.db.missing_table:
+            raise mysql.connector.errors.ProgrammingError(
+                f"Table 'stock_data.{self.db.missing_table}' doesn't exist", errno=1146)
+        batch_id = params[0]
+        if batch_id in self.db.batch_ids or batch_id in self.db.pending_ids:
+            self.rowcount = 0
+        else:
+            self.db.pending_ids.add(batch_id)
+            self.rowcount = 1
+
+    def executemany(self, query, rows):
+        if any(row[2] < 0 for row in rows):
+            raise mysql.connector.errors.DataError("Out of range value for column 'price'")
+        self.db.pending_rows.extend(rows)
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    """Just enough of a connection for apply_segment: batch_id dedup plus commit/rollback"""
+
+    def __init__(self):
+        self.down = False
+        self.missing_table = None
+        self.batch_ids = set()
+        self.rows = []
+        self.pending_ids = set()
+        self.pending_rows = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.batch_ids |= self.pending_ids
+        self.rows.extend(self.pending_rows)
+        self.rollback()
+
+    def rollback(self):
+        self.pending_ids = set()
+        self.pending_rows = []
+
+
+class FakePool:
+    def __init__(self, db):
+        self.db = db
+
+    @contextmanager
+    def connection(self):
+        yield self.db
+
+
+@pytest.fixture(autouse=True)
+def no_summaries(monkeypatch):
+    monkeypatch.setattr(spool_mod, "insert_summaries", lambda cur, summaries: None)
+
+
+def row(kode, price=100):
+    return (kode, "B", price, 10, 1, TS)
+
+
+def test_append_seal_and_read_roundtrip(tmp_path):
+    s = Spool(str(tmp_path), segment_seconds=3600)
+    s.append("orderbook_ajaib", [row("BBRI")])
+    assert s.sealed_segments() == []  # still open
+    s.seal()
+    assert s.sealed_segments() == []  # not old enough
+    s.seal(force=True)
+    [path] = s.sealed_segments()
+    [batch] = s.read_segment(path)
+    assert batch["table"] == "orderbook_ajaib"
+    assert batch["rows"] == [row("BBRI")]  # timestamps come back as datetimes
+
+
+def test_segment_seals_when_full(tmp_path):
+    s = Spool(str(tmp_path), segment_bytes=1)
+    s.append("orderbook_ajaib", [row("BBRI")])
+    s.append("orderbook_ajaib", [row("TLKM")])
+    assert len(s.sealed_segments()) == 2
+
+
+def test_torn_tail_is_skipped(tmp_path):
+    s = Spool(str(tmp_path))
+    s.append("orderbook_ajaib", [row("BBRI")])
+    s.seal(force=True)
+    [path] = s.sealed_segments()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"batch_id": "abc", "table": "orderbook_aj')  # crash mid-append
+    assert [b["rows"][0][0] for b in s.read_segment(path)] == ["BBRI"]
+
+
+def test_open_segment_left_by_a_crash_is_sealed_on_restart(tmp_path):
+    s = Spool(str(tmp_path))
+    s.append("orderbook_ajaib", [row("BBRI")])
+    s._file.close()  # process dies without sealing
+    restarted = Spool(str(tmp_path))
+    [path] = restarted.sealed_segments()
+    assert len(restarted.read_segment(path)) == 1
+
+
+def test_drain_keeps_segments_while_db_is_down(tmp_path):
+    s = Spool(str(tmp_path))
+    db = FakeDB()
+    db.down = True
+    s.append("orderbook_ajaib", [row("BBRI")])
+    stats = drain(s, FakePool(db), seal=True)
+    assert stats["error"] and stats["segments"] == 0
+    assert len(s.sealed_segments()) == 1
+
+    db.down = False
+    stats = drain(s, FakePool(db), seal=True)
+    assert stats["error"] is None and stats["applied"] == 1 and stats["rows"] == 1
+    assert s.sealed_segments() == []
+
+
+def test_replay_after_crash_is_applied_once(tmp_path):
+    s = Spool(str(tmp_path))
+    db = FakeDB()
+    s.append("orderbook_ajaib", [row("BBRI")])
+    s.seal(force=True)
+    [path] = s.sealed_segments()
+    with open(path, encoding="utf-8") as f:
+        saved = f.read()
+    drain(s, FakePool(db))
+    # Crash between the commit and removing the segment: the same segment shows up again
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(saved)
+    stats = drain(s, FakePool(db))
+    assert (stats["applied"], stats["replayed"]) == (0, 1)
+    assert len(db.rows) == 1
+
+
+def test_bad_batch_is_quarantined_and_the_rest_drains(tmp_path):
+    s = Spool(str(tmp_path), segment_seconds=3600)
+    db = FakeDB()
+    s.append("orderbook_ajaib", [row("BBRI")])
+    bad_id = s.append("orderbook_ajaib", [row("TLKM", price=-1)])
+    s.append("orderbook_ajaib", [row("ASII")])
+    stats = drain(s, FakePool(db), seal=True)
+    assert stats["error"] is None
+    assert (stats["applied"], stats["quarantined"]) == (2, 1)
+    assert sorted(r[0] for r in db.rows) == ["ASII", "BBRI"]
+    assert os.listdir(tmp_path / "quarantine") == [f"{bad_id}.json"]
+    assert s.sealed_segments() == []
+    assert s.backlog()["quarantined"] == 1
+
+
+def test_missing_table_stops_the_drain_instead_of_quarantining(tmp_path):
+    s = Spool(str(tmp_path))
+    db = FakeDB()
+    db.missing_table = "ingest_batches"  # deployed before the migration
+    s.append("orderbook_ajaib", [row("BBRI")])
+    s.append("orderbook_ajaib", [row("TLKM")])
+    stats = drain(s, FakePool(db), seal=True)
+    assert "doesn't exist" in stats["error"]
+    assert (stats["segments"], stats["quarantined"]) == (0, 0)
+    assert not (tmp_path / "quarantine").exists()
+    assert len(s.sealed_segments()) == 1
+
+    db.missing_table = None  # migrated
+    stats = drain(s, FakePool(db))
+    assert stats["error"] is None and stats["applied"] == 2
+
+
+def test_concurrent_drains_apply_each_segment_once(tmp_path):
+    class SlowPool(FakePool):
+        @contextmanager
+        def connection(self):
+            time.sleep(0.02)  # widen the window between applying and removing a segment
+            yield self.db
+
+    s = Spool(str(tmp_path), segment_bytes=1)
+    db = FakeDB()
+    for kode in ("BBRI", "TLKM", "ASII"):
+        s.append("orderbook_ajaib", [row(kode)])
+    results, errors = [], []
+
+    def push():
+        try:
+            results.append(drain(s, SlowPool(db), seal=True))
+        except Exception as e:  # e.g. FileNotFoundError from a double remove
+            errors.append(e)
+
+    threads = [threading.Thread(target=push) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sum(r["applied"] for r in results) == 3
+    assert sum(r["replayed"] for r in results) == 0
+    assert s.sealed_segments() == []
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import worker
+from schedule import cycle_deadline
+
+INTERVAL = 900
+
+
+class Clock:
+    """Wall clock whose sleeps end `lag` seconds early, like the monotonic clock under NTP slew"""
+
+    def __init__(self, now, lag=0.0):
+        self.now = now
+        self.lag = lag
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += max(seconds - self.lag, 0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock(0)
+    monkeypatch.setattr(worker.time, "time", c.time)
+    monkeypatch.setattr(worker.asyncio, "sleep", c.sleep)
+    return c
+
+
+def wait(*args, **kwargs):
+    return asyncio.run(worker.wait_for_slot("test", INTERVAL, *args, **kwargs))
+
+
+def test_first_cycle_starts_mid_slot_when_most_of_it_is_left(clock):
+    clock.now = 9000 + 100
+    assert wait(first=True) == 9100
+    assert clock.now == 9100
+
+
+def test_first_cycle_waits_when_little_of_the_slot_is_left(clock):
+    clock.now = 9000 + 600
+    assert wait(first=True) == 9900
+
+
+def test_early_wakeup_still_returns_the_boundary(clock):
+    clock.now = 9000 + 10
+    clock.lag = 0.3
+    start = wait()
+    assert start == 9900 and clock.now < 9900
+    # The deadline belongs to the slot just reached, not the one before it
+    assert cycle_deadline(start, INTERVAL) == 9900 + INTERVAL - worker.SCHEDULE_DEADLINE_MARGIN
+
+
+def test_slot_is_not_started_twice_after_an_early_wakeup(clock):
+    clock.now = 9000 + 10
+    clock.lag = 0.3
+    first = wait()
+    assert wait(last=first) == first + INTERVAL
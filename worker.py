@@ -1,49 +1,147 @@
 import argparse
 import asyncio
+import os
 import sys
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 
+import market_calendar
+from schedule import SCHEDULE_DEADLINE_MARGIN, cycle_deadline, next_boundary
+
 SCRIPT_DIR = Path(__file__).parent
+# One engine process scrapes every source on a shared browser fleet
+# (ENGINE_BROWSERS / ENGINE_PAGES_PER_BROWSER); the per-broker scripts still run standalone.
 JOBS = [
-    ("pangdat", SCRIPT_DIR / "pangdat-scraping.py"),
-    ("ipot", SCRIPT_DIR / "ipot_scrapping.py"),
+    ("engine", SCRIPT_DIR / "engine.py"),
+]
+# Once a day, outside market hours (WIB): rollup of old snapshots into bars + raw retention
+DAILY_JOBS = [
+    ("rollup", SCRIPT_DIR / "rollup.py", os.getenv("ROLLUP_AT", "02:00")),
 ]
 
 # FIXME: args not working man
 
-async def run_job(name: str, script: Path, interval: float):
+async def pump(name, proc):
+    while True:
+        line = await proc.stdout.readline()
+        if not line:
+            break
+        print(f"[{name}] {line.decode(errors='replace').rstrip()}")
+
+
+async def wait_for_slot(name, interval, first=False, last=None):
+    """Sleep to the next wall-clock boundary after `last` (the previous slot start); returns the slot start.
+
+    Only the very first cycle may start mid-slot (when most of the slot is
+    left); after a run, even one that finished early, the next one always waits
+    for the boundary so every slot is scraped exactly once.
+
+    The sleep runs on the monotonic clock, so the wall clock may still read a
+    moment before the boundary when it ends (NTP slew/step). Callers derive
+    the deadline and market phase from the returned value, never from a fresh
+    time.time(), and pass it back as `last` so a slot is never started twice.
+    """
+    now = time.time()
+    boundary = next_boundary(max(now, last) if last is not None else now, interval)
+    if not first or boundary - now < interval / 2:
+        print(f"[{name}] sleeping {boundary - now:.0f}s until {datetime.fromtimestamp(boundary):%H:%M:%S}...")
+        await asyncio.sleep(max(boundary - now, 0))
+        return boundary
+    if boundary - now < interval - 5:
+        print(f"[{name}] starting mid-slot, {boundary - now:.0f}s left before {datetime.fromtimestamp(boundary):%H:%M:%S}")
+    return now
+
+
+async def run_job(name: str, script: Path, interval: float, always: bool = False):
+    closing_done_on = None
+    skipping = False
+    first = True
+    slot_start = None
     while True:
+        # Cycles start on :00/:15/:30/:45 (for 900s), so a slow run never shifts the ones after it
+        slot_start = await wait_for_slot(name, interval, first, slot_start)
+        first = False
+        moment = datetime.fromtimestamp(slot_start, market_calendar.WIB)
+        kind = "trade" if always else market_calendar.cycle_kind(moment, closing_done_on)
+        if kind is None:
+            # Books are frozen (night, weekend, holiday, lunch break): no browsers, no duplicate rows
+            if not skipping:
+                opening = market_calendar.next_open(moment)
+                print(f"[{name}] market {market_calendar.market_phase(moment)}, skipping cycles"
+                      + (f" until {opening:%a %H:%M} WIB" if opening else ""))
+                skipping = True
+            # wait_for_slot sleeps to the next boundary
+            continue
+        skipping = False
+        if kind == "closing":
+            closing_done_on = moment.date()
+            print(f"[{name}] session over, taking the closing snapshot")
+        elif kind == "idle":
+            print(f"[{name}] market {market_calendar.market_phase(moment)}, thinned idle cycle")
+        deadline = cycle_deadline(slot_start, interval)
+        # The engine defers what does not fit by `deadline`; this only catches a run that hangs anyway
+        hard_stop = deadline + 2 * SCHEDULE_DEADLINE_MARGIN
         proc = await asyncio.create_subprocess_exec(
-            sys.executable, "-u", str(script),
+            sys.executable, "-u", str(script), "--deadline", str(deadline),
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.STDOUT,
         )
-        print(f"[{name}] started pid={proc.pid}")
+        print(f"[{name}] started pid={proc.pid}, deadline {datetime.fromtimestamp(deadline):%H:%M:%S}")
         try:
-            while True:
-                line = await proc.stdout.readline()
-                if not line:
-                    break
-                print(f"[{name}] {line.decode(errors='replace').rstrip()}")
+            await asyncio.wait_for(pump(name, proc), timeout=max(hard_stop - time.time(), 1))
+        except asyncio.TimeoutError:
+            print(f"[{name}] still running {hard_stop - deadline:.0f}s past its deadline, terminating")
+            proc.terminate()
         finally:
             rc = await proc.wait()
-            print(f"[{name}] finished with code {rc}")
-        print(f"[{name}] sleeping {interval}s before next run...")
-        await asyncio.sleep(interval)
+            print(f"[{name}] finished with code {rc}, {time.time() - deadline:+.0f}s against deadline")
+
+async def run_daily(name: str, script: Path, at: str):
+    hour, minute = (int(part) for part in at.split(":"))
+    while True:
+        now = market_calendar.now_wib()
+        run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if run_at <= now:
+            run_at += timedelta(days=1)
+        print(f"[{name}] next run {run_at:%a %d %b %H:%M} WIB")
+        await asyncio.sleep((run_at - now).total_seconds())
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", str(script),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        print(f"[{name}] started pid={proc.pid}")
+        await pump(name, proc)
+        rc = await proc.wait()
+        print(f"[{name}] finished with code {rc}")
 
 def parse_args():
-    parser = argparse.ArgumentParser(description="Run pangdat and ipot scrapers on a fixed interval.")
+    parser = argparse.ArgumentParser(description="Run the orderbook engine (Ajaib + IPOT) on wall-clock aligned cycles.")
     parser.add_argument(
         "-i", "--interval",
         type=float,
         default=900.0,
-        help="Seconds to wait between runs (default: 900)",
+        help="Cycle length in seconds; runs start on multiples of it (default: 900)",
+    )
+    parser.add_argument(
+        "--always",
+        action="store_true",
+        help="Ignore the IDX calendar and run every cycle",
+    )
+    parser.add_argument(
+        "--no-daily",
+        action="store_true",
+        help="Do not run the daily jobs (rollup/retention)",
     )
     return parser.parse_args()
 
 async def main():
     args = parse_args()
-    await asyncio.gather(*(run_job(name, path, args.interval) for name, path in JOBS))
+    jobs = [run_job(name, path, args.interval, args.always) for name, path in JOBS]
+    if not args.no_daily:
+        jobs += [run_daily(name, path, at) for name, path, at in DAILY_JOBS]
+    await asyncio.gather(*jobs)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file